@@ -0,0 +1,235 @@
+"""Async variant of backend_latest.
+
+Same graph, but the checkpointer (aiosqlite), the LLM calls (`ainvoke`) and the tools
+(`get_stock_price` via httpx) are all non-blocking, so one process can keep many
+conversations in flight on a single event loop.
+
+The event loop lives in a daemon thread owned by this module. Async callers use the
+`a*` functions directly; Streamlit scripts (which are plain threads) use
+`stream_turn` / `retrieve_all_thread_ids` / `delete_thread`, which hop onto that loop.
+"""
+import asyncio
+import os
+import queue
+import threading
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from chat_graph import make_async_chat_node, build_graph
+from chat_worker import TurnManager
+from chat_saver import ChatSaver, AsyncChatSaver
+from chat_tools import tools
+from db import Database, DB_PATH, LoopLock, aconnect
+from history import HistoryManager
+from conversation import load_page, PAGE_SIZE
+from thread_registry import list_threads, count_threads
+from title_worker import placeholder_title, start_title_worker
+from llm_cache import LLMCache, cached_model
+from resilient_llm import FailureLog, resilient_model_from_env
+import rate_limiter
+from rate_limiter import BACKGROUND_MAX_WAIT, rate_limited
+from retention import start_space_reclaimer
+import metrics
+
+# define llm
+load_dotenv()
+llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+llm1 = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+# cheaper model chat_node falls back to once retries on llm are exhausted
+llm_fallback = ChatGoogleGenerativeAI(model=os.getenv("LLM_FALLBACK_MODEL", "gemini-2.0-flash-lite"), temperature=0)
+
+# event loop shared by every session of this process
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, name="chatbot-async-loop", daemon=True).start()
+
+
+def run_sync(coro):
+    """Run a coroutine on the backend loop from a plain (e.g. Streamlit) thread."""
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def iter_sync(agen):
+    """Consume an async generator on the backend loop as a regular iterator."""
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        finally:
+            items.put(done)
+
+    asyncio.run_coroutine_threadsafe(pump(), loop)
+    while (item := items.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+async def _open_checkpointer():
+    conn = await aconnect(DB_PATH)
+    return AsyncChatSaver(conn, message_log=os.getenv("CHECKPOINT_MESSAGE_LOG") == "1")
+
+
+checkpointer = run_sync(_open_checkpointer())
+
+# one writer per process: the async saver's aiosqlite connection. The sync saver writes on that
+# same connection under the async saver's lock (LoopLock, from threads other than the loop), and
+# reads on the reader pool. Its writes: one-shot migrations (registry backfill), the space
+# reclaimer, the LLM cache, the failure log, turn traces and background titles.
+db = Database(DB_PATH, writer=checkpointer.conn._conn, write_lock=LoopLock(checkpointer.lock, loop))
+sync_saver = ChatSaver(db=db)
+sync_saver.migrate()
+run_sync(checkpointer.setup())
+# space freed by deleted chats is reclaimed in the background
+reclaimer = start_space_reclaimer(sync_saver)
+
+# optional response cache (LLM_CACHE=1), its SQLite tier uses the shared Database
+llm_cache = LLMCache.from_env(db)
+
+# process-wide RPM / TPM limits per model (LLM_RATE_LIMITS, see rate_limiter.py): a chat turn queues
+# at most LLM_MAX_QUEUE_WAIT seconds and then fails fast with BusyError, titles / summaries wait longer
+background_llm1 = rate_limited(llm1, max_wait=BACKGROUND_MAX_WAIT)
+
+# retries with backoff, optional hedge on llm1 (LLM_HEDGE_AFTER), fallback model; failures go to
+# the llm_failures table instead of the conversation (see resilient_llm.py)
+llm_failures = FailureLog(db)
+chat_llm = resilient_model_from_env(
+    rate_limited(llm), hedge=rate_limited(llm1), fallback=rate_limited(llm_fallback), failures=llm_failures
+)
+llm_with_tools = cached_model(chat_llm, llm_cache, tools)
+
+history = HistoryManager.from_env(background_llm1)
+chat_node = make_async_chat_node(llm_with_tools, history)
+# optional latency metrics (CHAT_METRICS=1), per-turn traces go through the shared Database
+metrics.from_env(db)
+graph = build_graph(chat_node, tools, history, is_async=True)
+chatbot = graph.compile(checkpointer=metrics.instrument_saver(checkpointer))
+
+# background title generation writes through the sync saver as well
+title_worker = start_title_worker(cached_model(background_llm1, llm_cache), sync_saver.replace_title)
+
+
+async def astream_turn(thread_id, user_input):
+    """Stream one turn as (message_chunk, metadata) pairs, like stream_mode="messages"."""
+    config = {'configurable': {'thread_id': thread_id}}
+    stream = chatbot.astream(
+        {"messages": [HumanMessage(content=user_input)]},
+        config=config,
+        stream_mode="messages",
+    )
+    async for message_chunk, metadata in metrics.atrace_turn(thread_id, stream):
+        yield message_chunk, metadata
+
+
+async def aretrieve_all_thread_ids():
+    async with checkpointer.lock:
+        cur = await checkpointer.conn.execute(
+            "SELECT thread_id FROM thread_registry ORDER BY last_activity"
+        )
+        rows = await cur.fetchall()
+    return [row[0] for row in rows]
+
+
+async def aload_conversation(thread_id):
+    state = await chatbot.aget_state(config={'configurable': {'thread_id': thread_id}})
+    return state.values.get('messages', [])
+
+
+async def adelete_threads(thread_ids):
+    thread_ids = list(thread_ids)
+    deleted = await checkpointer.adelete_threads(thread_ids)
+    if metrics.TRACES is not None:
+        await asyncio.to_thread(metrics.TRACES.forget, *thread_ids)
+    reclaimer.request()
+    return deleted
+
+
+async def adelete_thread(thread_id: str):
+    await adelete_threads([thread_id])
+
+
+async def aget_chat_titles(thread_ids):
+    return await checkpointer.aget_titles(thread_ids)
+
+
+async def aset_chat_title(thread_id, title):
+    await checkpointer.aset_title(thread_id, title)
+
+
+# sync entry points for Streamlit frontends
+def stream_turn(thread_id, user_input):
+    return iter_sync(astream_turn(thread_id, user_input))
+
+
+# background turns with resumable events, like backend_latest (see chat_worker.py)
+turns = TurnManager(stream_turn)
+
+
+def start_turn(thread_id, user_input):
+    return turns.start(thread_id, user_input)
+
+
+def turn_events(thread_id, turn_id, after=0):
+    return turns.events(turn_id, after)
+
+
+def retrieve_all_thread_ids():
+    return run_sync(aretrieve_all_thread_ids())
+
+
+def load_conversation(thread_id):
+    return run_sync(aload_conversation(thread_id))
+
+
+def load_conversation_page(thread_id, limit=PAGE_SIZE, before=None):
+    return load_page(sync_saver, thread_id, limit, before)
+
+
+# sidebar pages are read-only: reader pool, no hop onto the loop
+def list_chat_page(query=None, limit=20, offset=0):
+    with sync_saver.cursor(transaction=False) as cur:
+        return list_threads(cur, limit, offset, query), count_threads(cur, query)
+
+
+def search_messages(query, limit=20):
+    return sync_saver.search(query, limit)
+
+
+def delete_thread(thread_id: str):
+    run_sync(adelete_thread(thread_id))
+
+
+def delete_threads(thread_ids):
+    return run_sync(adelete_threads(thread_ids))
+
+
+def get_chat_titles(thread_ids):
+    return run_sync(aget_chat_titles(thread_ids))
+
+
+def set_chat_title(thread_id, title):
+    run_sync(aset_chat_title(thread_id, title))
+
+
+def request_title(thread_id, user_input, ai_message):
+    # None when the thread already has a title, which is kept
+    placeholder = placeholder_title(user_input)
+    if not run_sync(checkpointer.aset_title_if_missing(thread_id, placeholder)):
+        return None
+    title_worker.submit(thread_id, user_input, ai_message, placeholder)
+    return placeholder
+
+
+def titles_version():
+    return title_worker.version
+
+
+# same entry point as Backend.rate_limit_stats (sidebar, chat_worker's /stats)
+def rate_limit_stats():
+    return rate_limiter.rate_limit_stats()
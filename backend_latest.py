@@ -1,118 +1,259 @@
-from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI 
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import DuckDuckGoSearchResults
-import requests
-from langchain_core.tools import tool
-from dotenv import load_dotenv
-import sqlite3
-
-
-# define llm
-load_dotenv()
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-llm1 = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-# Tools
-
-search_tool = DuckDuckGoSearchResults()
-
-
-@tool
-def calculator(first_num: float, second_num: float, operation: str) -> dict:
-    """
-    Perform a basic arithmetic operation on two numbers.
-    Supported operations: add, sub, mul, div
-    """
-    try:
-        if operation == "add":
-            result = first_num + second_num
-        elif operation == "sub":
-            result = first_num - second_num
-        elif operation == "mul":
-            result = first_num * second_num
-        elif operation == "div":
-            if second_num == 0:
-                return {"error": "Division by zero is not allowed"}
-            result = first_num / second_num
-        else:
-            return {"error": f"Unsupported operation '{operation}'"}
-        
-        return {"first_num": first_num, "second_num": second_num, "operation": operation, "result": result}
-    except Exception as e:
-        return {"error": str(e)}
-
-
-@tool
-def get_stock_price(symbol: str) -> dict:
-    """
-    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA') 
-    using Alpha Vantage with API key in the URL.
-    """
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey=RP2J23DYDVG9996S"
-    r = requests.get(url)
-    return r.json()
-
-tools = [search_tool, get_stock_price, calculator]
-llm_with_tools = llm.bind_tools(tools)
-
-# define state
-
-class ChatState(TypedDict):
-
-    messages: Annotated[list[BaseMessage], add_messages]
-
-# define graph-node
-from google.api_core.exceptions import ServiceUnavailable
-def chat_node(state: ChatState):
-    # take user query from state
-    messages = state['messages']
-    # send to llm
-    try:
-        response = llm_with_tools.invoke(messages)
-        return {'messages': [response]}
-    except ServiceUnavailable:
-        error_msg = "⚠️ Gemini service is temporarily overloaded. Please try again in a few seconds."
-        return {'messages': [HumanMessage(content=error_msg)]}
-    except Exception as e:
-        error_msg = f"❌ Unexpected error: {str(e)}"
-        return {'messages': [HumanMessage(content=error_msg)]}
+import os
+import threading
+import logging
+
+from db import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Nothing heavy happens at import any more: the Gemini clients, tools, checkpointer and graph
+# are built on first use, once per process, and shared by every Streamlit session / rerun
+# (get_backend(), cached with st.cache_resource in the frontend). Two stages:
+# - storage (Database, checkpointer, retention): needed for the sidebar on the first render
+# - chat (models, tools, graph, title worker): needed for the first message, warm_up() builds
+#   it in the background meanwhile
+# `backend_latest.chatbot`, `from backend_latest import stream_turn`, ... still work (module __getattr__).
+
+# attribute -> stage that builds it
+STAGES = {
+    **dict.fromkeys((
+        "db", "conn", "checkpointer", "retention_policy", "retention_worker", "reclaimer",
+    ), "_build_storage"),
+    **dict.fromkeys((
+        "llm", "llm1", "llm_fallback", "llm_cache", "background_llm1", "llm_failures", "chat_llm",
+        "llm_with_tools", "history", "tools", "chat_node", "graph", "chatbot",
+    ), "_build_chat"),
+    "title_worker": "_build_title_worker",
+    "turns": "_build_turns",
+}
+
+
+class Backend:
+    def __init__(self, db_path=DB_PATH):
+        from dotenv import load_dotenv
+        load_dotenv()
+        self.db_path = db_path
+        self._locks = {stage: threading.Lock() for stage in set(STAGES.values())}
+        self._warm_up = None
+        self._warm_up_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        stage = STAGES.get(name)
+        if stage is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        with self._locks[stage]:
+            if name not in self.__dict__:
+                getattr(self, stage)()
+        return self.__dict__[name]
+
+    def built(self, name):
+        return name in self.__dict__
+
+    def _build_storage(self):
+        import metrics
+        from chat_saver import ChatSaver
+        from db import Database
+        from retention import RetentionPolicy, start_retention_worker, start_space_reclaimer
+
+        # one writer connection + pooled readers (WAL, tuned pragmas), see db.py
+        db = Database(self.db_path)
+        # optional latency metrics (CHAT_METRICS=1): nodes, tools, checkpointer calls, per-turn traces, see metrics.py
+        metrics.from_env(db)
+
+        # Checkpointer (writes through db.writer, reads from the reader pool)
+        # CHECKPOINT_MESSAGE_LOG=1 stores each message once instead of in every checkpoint
+        checkpointer = ChatSaver(db=db, message_log=os.getenv("CHECKPOINT_MESSAGE_LOG") == "1")
+        checkpointer.migrate()  # backfills thread_registry on first run against an old chatbot.db
+        metrics.instrument_saver(checkpointer)
+
+        # optional background pruning of old checkpoints (CHECKPOINT_KEEP_LAST / CHECKPOINT_MAX_AGE_DAYS)
+        self.retention_policy = RetentionPolicy.from_env()
+        self.retention_worker = start_retention_worker(checkpointer, self.retention_policy) if self.retention_policy else None
+        # space freed by deleted chats is reclaimed in the background, after the delete has returned
+        self.reclaimer = start_space_reclaimer(checkpointer)
+        self.db, self.conn = db, db.writer
+        self.checkpointer = checkpointer
+
+    def _build_chat(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from chat_graph import make_chat_node, build_graph
+        from chat_tools import tools
+        from history import HistoryManager
+        from llm_cache import LLMCache, cached_model
+        from resilient_llm import FailureLog, resilient_model_from_env
+        from rate_limiter import BACKGROUND_MAX_WAIT, rate_limited
+
+        # define llm
+        self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+        self.llm1 = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+        # cheaper model chat_node falls back to once retries on llm are exhausted
+        self.llm_fallback = ChatGoogleGenerativeAI(model=os.getenv("LLM_FALLBACK_MODEL", "gemini-2.0-flash-lite"), temperature=0)
+
+        # optional response cache for both models (LLM_CACHE=1), memory + llm_cache table in chatbot.db
+        self.llm_cache = LLMCache.from_env(self.db)
+
+        # process-wide RPM / TPM limits per model (LLM_RATE_LIMITS, see rate_limiter.py): a chat turn queues
+        # at most LLM_MAX_QUEUE_WAIT seconds and then fails fast with BusyError, titles / summaries wait longer
+        self.background_llm1 = rate_limited(self.llm1, max_wait=BACKGROUND_MAX_WAIT)
+
+        # retries with backoff, optional hedge on llm1 (LLM_HEDGE_AFTER), fallback model; failures go to
+        # the llm_failures table instead of the conversation (see resilient_llm.py)
+        self.llm_failures = FailureLog(self.db)
+        self.chat_llm = resilient_model_from_env(
+            rate_limited(self.llm), hedge=rate_limited(self.llm1), fallback=rate_limited(self.llm_fallback),
+            failures=self.llm_failures,
+        )
+        # Tools live in chat_tools.py
+        self.tools = tools
+        self.llm_with_tools = cached_model(self.chat_llm, self.llm_cache, tools)
+
+        # optional token-budgeted history + rolling summary on llm1 (HISTORY_TOKEN_BUDGET)
+        self.history = HistoryManager.from_env(self.background_llm1)
+
+        # define graph-node
+        self.chat_node = make_chat_node(self.llm_with_tools, self.history)
+
+        # define graph (START -> chat_node -> tools? -> chat_node, see chat_graph.py)
+        self.graph = build_graph(self.chat_node, tools, self.history)
+        self.chatbot = self.graph.compile(checkpointer=self.checkpointer)
 
-tool_node = ToolNode(tools)
+    def _build_title_worker(self):
+        from llm_cache import cached_model
+        from title_worker import start_title_worker
 
+        # chat titles are generated in the background, in batches, on llm1
+        self.title_worker = start_title_worker(cached_model(self.background_llm1, self.llm_cache), self.checkpointer.replace_title)
 
-conn=sqlite3.connect(database='chatbot.db',check_same_thread=False)
-# Checkpointer
-checkpointer = SqliteSaver(conn=conn)
+    def _build_turns(self):
+        from chat_worker import TurnManager
 
-# define graph
+        # turns run in their own thread: a rerun / closed tab mid-stream doesn't abandon them (chat_worker.py)
+        self.turns = TurnManager(self.stream_turn)
 
-graph = StateGraph(ChatState)
+    def warm_up(self):
+        """Build the chat stage (and title worker) in a background thread, ahead of the first message.
 
-# add nodes
-graph.add_node('chat_node', chat_node)
-graph.add_node("tools", tool_node)
-graph.add_edge(START, 'chat_node')
-graph.add_conditional_edges("chat_node",tools_condition)
-graph.add_edge('tools', 'chat_node')
+        Only the first call starts the thread."""
+        def build():
+            try:
+                self.chatbot
+                self.title_worker
+            except Exception:
+                logger.exception("backend warm-up failed, it will be retried on first use")
 
+        with self._warm_up_lock:
+            if self._warm_up is None:
+                self._warm_up = threading.Thread(target=build, name="backend-warm-up", daemon=True)
+                self._warm_up.start()
+        return self._warm_up
 
-chatbot = graph.compile(checkpointer=checkpointer)
+    # stream one turn as (message_chunk, metadata) pairs (same signature as backend_async.stream_turn)
+    def stream_turn(self, thread_id, user_input):
+        import metrics
+        from langchain_core.messages import HumanMessage
 
-# function to retrieve all unique thread IDs
-def retrieve_all_thread_ids():
-    unique_threads=set() # to store unique thread IDs
-    for checkpoint in checkpointer.list(None):  # iterate through all checkpoints
-        unique_threads.add(checkpoint.config['configurable']['thread_id'])
-    return list(unique_threads)
+        return metrics.trace_turn(thread_id, self.chatbot.stream(
+            {"messages": [HumanMessage(content=user_input)]},
+            config={'configurable': {'thread_id': thread_id}},
+            stream_mode="messages",
+        ))
 
+    # start a turn in the background -> turn id; its events (token / tool_call / tool / done) can be
+    # followed, and followed again from the start after a rerun, with turn_events
+    def start_turn(self, thread_id, user_input):
+        return self.turns.start(thread_id, user_input)
 
+    def turn_events(self, thread_id, turn_id, after=0):
+        return self.turns.events(turn_id, after)
 
-# 🔥 delete thread completely (DB cleanup)
-def delete_thread(thread_id: str):
-    conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
-    conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
-    conn.commit()
\ No newline at end of file
+    # last `limit` user/assistant messages + cursor for the previous page (None when at the start)
+    def load_conversation_page(self, thread_id, limit=None, before=None):
+        from conversation import load_page, PAGE_SIZE
+
+        return load_page(self.checkpointer, thread_id, limit or PAGE_SIZE, before)
+
+    # function to retrieve all unique thread IDs
+    # (oldest -> newest activity, the sidebar shows them reversed)
+    def retrieve_all_thread_ids(self):
+        from thread_registry import list_threads
+
+        with self.checkpointer.cursor(transaction=False) as cur:
+            threads = list_threads(cur)
+        return [t['thread_id'] for t in reversed(threads)]
+
+    # one sidebar page (most recent first, optional server-side title search) + number of matches
+    def list_chat_page(self, query=None, limit=20, offset=0):
+        from thread_registry import list_threads, count_threads
+
+        with self.checkpointer.cursor(transaction=False) as cur:
+            return list_threads(cur, limit, offset, query), count_threads(cur, query)
+
+    # full-text search over every chat's messages (FTS5, see message_search.py): best hit per thread
+    def search_messages(self, query, limit=20):
+        return self.checkpointer.search(query, limit)
+
+    # 🔥 delete threads completely (DB cleanup, titles included) in one transaction; returns the
+    # number of rows deleted, freed pages are reclaimed in the background
+    def delete_threads(self, thread_ids):
+        import metrics
+
+        thread_ids = list(thread_ids)
+        deleted = self.checkpointer.delete_threads(thread_ids)
+        if metrics.TRACES is not None:
+            metrics.TRACES.forget(*thread_ids)
+        self.reclaimer.request()
+        return deleted
+
+    def delete_thread(self, thread_id: str):
+        self.delete_threads([thread_id])
+
+    # titles live in thread_registry (one-row upserts, bulk fetch for the visible sidebar page)
+    def get_chat_titles(self, thread_ids):
+        return self.checkpointer.get_titles(thread_ids)
+
+    def set_chat_title(self, thread_id, title):
+        self.checkpointer.set_title(thread_id, title)
+
+    # instant keyword placeholder now, LLM title later (written back by title_worker); None when
+    # the thread already has a title (e.g. renamed, or opened from search), which is kept
+    def request_title(self, thread_id, user_input, ai_message):
+        from title_worker import placeholder_title
+
+        placeholder = placeholder_title(user_input)
+        if not self.checkpointer.set_title_if_missing(thread_id, placeholder):
+            return None
+        self.title_worker.submit(thread_id, user_input, ai_message, placeholder)
+        return placeholder
+
+    # bumped whenever the worker has written new titles (0 until the worker has started)
+    def titles_version(self):
+        return self.title_worker.version if self.built("title_worker") else 0
+
+    # limiters only exist once the models are built
+    def rate_limit_stats(self):
+        if not self.built("chat_llm"):
+            return {}
+        from rate_limiter import rate_limit_stats
+        return rate_limit_stats()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The process-wide Backend; its stages are built on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = Backend()
+        return _backend
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    try:
+        return getattr(get_backend(), name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -1,11 +1,13 @@
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict, Annotated
-from langgraph.checkpoint.sqlite import SqliteSaver
+from chat_saver import ChatSaver
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI 
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
 import sqlite3
+from thread_registry import list_threads
+from conversation import load_page, PAGE_SIZE
 # define state
 
 class ChatState(TypedDict):
@@ -28,7 +30,8 @@ def chat_node(state: ChatState):
 
 conn=sqlite3.connect(database='chatbot.db',check_same_thread=False)
 # Checkpointer
-checkpointer = SqliteSaver(conn=conn)
+checkpointer = ChatSaver(conn=conn)
+checkpointer.migrate()  # backfills thread_registry on first run against an old chatbot.db
 
 # define graph
 
@@ -44,13 +47,22 @@ chatbot = graph.compile(checkpointer=checkpointer)
 
 # function to retrieve all unique thread IDs
 def retrieve_all_thread_ids():
-    unique_threads=set() # to store unique thread IDs
-    for checkpoint in checkpointer.list(None):  # iterate through all checkpoints
-        unique_threads.add(checkpoint.config['configurable']['thread_id'])
-    return list(unique_threads)
+    with checkpointer.cursor(transaction=False) as cur:
+        threads = list_threads(cur)
+    return [t['thread_id'] for t in reversed(threads)]
+
+# last `limit` user/assistant messages + cursor for the previous page
+def load_conversation_page(thread_id, limit=PAGE_SIZE, before=None):
+    return load_page(checkpointer, thread_id, limit, before)
 
 # 🔥 delete thread completely (DB cleanup)
 def delete_thread(thread_id: str):
-    conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
-    conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
-    conn.commit()
+    checkpointer.delete_thread(thread_id)
+
+
+# titles live in thread_registry (one-row upserts, bulk fetch for the visible sidebar page)
+def get_chat_titles(thread_ids):
+    return checkpointer.get_titles(thread_ids)
+
+def set_chat_title(thread_id, title):
+    checkpointer.set_title(thread_id, title)
@@ -1,11 +1,12 @@
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict, Annotated
-from langgraph.checkpoint.sqlite import SqliteSaver
+from chat_saver import ChatSaver
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI 
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
 import sqlite3
+from thread_registry import list_threads
 # define state
 
 class ChatState(TypedDict):
@@ -28,7 +29,8 @@ def chat_node(state: ChatState):
 
 conn=sqlite3.connect(database='chatbot.db',check_same_thread=False)
 # Checkpointer
-checkpointer = SqliteSaver(conn=conn)
+checkpointer = ChatSaver(conn=conn)
+checkpointer.migrate()  # backfills thread_registry on first run against an old chatbot.db
 
 # define graph
 
@@ -44,9 +46,14 @@ chatbot = graph.compile(checkpointer=checkpointer)
 
 # function to retrieve all unique thread IDs
 def retrieve_all_thread_ids():
-    unique_threads=set() # to store unique thread IDs
-    for checkpoint in checkpointer.list(None):  # iterate through all checkpoints
-        unique_threads.add(checkpoint.config['configurable']['thread_id'])
-    return list(unique_threads)
+    with checkpointer.cursor(transaction=False) as cur:
+        threads = list_threads(cur)
+    return [t['thread_id'] for t in reversed(threads)]
 
 
+# titles live in thread_registry (one-row upserts, bulk fetch for the visible sidebar page)
+def get_chat_titles(thread_ids):
+    return checkpointer.get_titles(thread_ids)
+
+def set_chat_title(thread_id, title):
+    checkpointer.set_title(thread_id, title)
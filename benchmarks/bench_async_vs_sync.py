@@ -0,0 +1,90 @@
+"""Concurrent-turn throughput: sync backend (threads) vs async backend (one event loop).
+
+Both sides run the real chatbot graph and checkpointer against a temporary SQLite
+file; only the LLM is replaced by the scripted fake model with a fixed latency.
+
+    python -m benchmarks.bench_async_vs_sync --users 50 --turns 4 --latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiosqlite
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_llm import ScriptedChatModel
+from chat_graph import build_graph, make_chat_node, make_async_chat_node
+from chat_saver import ChatSaver, AsyncChatSaver
+from chat_tools import calculator
+
+
+def run_sync(db_path, users, turns, model):
+    conn = sqlite3.connect(database=db_path, check_same_thread=False)
+    chatbot = build_graph(make_chat_node(model), [calculator]).compile(checkpointer=ChatSaver(conn=conn))
+
+    def user(i):
+        config = {'configurable': {'thread_id': f"sync-{i}"}}
+        for t in range(turns):
+            chatbot.invoke({'messages': [HumanMessage(content=f"question {t}")]}, config=config)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return elapsed
+
+
+async def run_async(db_path, users, turns, model):
+    conn = await aiosqlite.connect(db_path)
+    saver = AsyncChatSaver(conn)
+    chatbot = build_graph(make_async_chat_node(model), [calculator]).compile(checkpointer=saver)
+
+    async def user(i):
+        config = {'configurable': {'thread_id': f"async-{i}"}}
+        for t in range(turns):
+            await chatbot.ainvoke({'messages': [HumanMessage(content=f"question {t}")]}, config=config)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(users)))
+        return time.perf_counter() - started
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency (s)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("sync", "async"):
+            model = ScriptedChatModel(latency=args.latency)
+            db_path = os.path.join(tmp, f"{mode}.db")
+            if mode == "sync":
+                elapsed = run_sync(db_path, args.users, args.turns, model)
+            else:
+                elapsed = asyncio.run(run_async(db_path, args.users, args.turns, model))
+            total = args.users * args.turns
+            results.append({
+                "mode": mode,
+                "users": args.users,
+                "turns": total,
+                "seconds": round(elapsed, 3),
+                "turns_per_sec": round(total / elapsed, 2),
+            })
+    for r in results:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Graph super-steps per math question: two-number calculator vs expression calculator.
+
+Question: "10 shares bought at 150.25 plus 4.95 fees, now at 165.10: % gain?"
+
+- legacy calculator (first_num, second_num, operation): the model has to chain
+  dependent calls, one chat_node -> tools -> chat_node loop per step
+- expression calculator: one tool call with a batch of expressions
+
+The scripted model replays what each tool forces the model to do, with `--latency`
+per model call, and the run reports super-steps, model calls, checkpoints and time.
+
+    python -m benchmarks.bench_calculator_steps --latency 0.5
+"""
+import argparse
+import json
+import time
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fake_llm import ScriptedChatModel
+from chat_graph import build_graph, make_chat_node
+from chat_tools import calculator
+
+QUESTION = "I bought 10 shares at 150.25 plus 4.95 in fees, they trade at 165.10 now. What's my % gain?"
+
+
+@tool("calculator")
+def legacy_calculator(first_num: float, second_num: float, operation: str) -> dict:
+    """Perform a basic arithmetic operation on two numbers (add, sub, mul, div)."""
+    ops = {"add": first_num + second_num, "sub": first_num - second_num, "mul": first_num * second_num}
+    if operation == "div":
+        return {"result": first_num / second_num}
+    return {"result": ops[operation]}
+
+
+def call(**args):
+    return {"name": "calculator", "args": args}
+
+
+LEGACY_SCRIPT = [
+    # independent products can share one turn, everything after depends on the previous result
+    {"tool_calls": [call(first_num=150.25, second_num=10, operation="mul"), call(first_num=165.1, second_num=10, operation="mul")]},
+    {"tool_calls": [call(first_num=1502.5, second_num=4.95, operation="add")]},
+    {"tool_calls": [call(first_num=1651, second_num=1507.45, operation="sub")]},
+    {"tool_calls": [call(first_num=143.55, second_num=1507.45, operation="div")]},
+    {"tool_calls": [call(first_num=0.0952270390, second_num=100, operation="mul")]},
+    "Your gain is about 9.52%.",
+]
+
+EXPRESSION_SCRIPT = [
+    {"tool_calls": [call(expressions=[
+        "cost = 150.25 * 10 + 4.95",
+        "value = 165.10 * 10",
+        "round((value - cost) / cost * 100, 2)",
+    ])]},
+    "Your gain is about 9.52%.",
+]
+
+
+def run(tool_, script, latency):
+    model = ScriptedChatModel(script=script, latency=latency)
+    saver = InMemorySaver()
+    chatbot = build_graph(make_chat_node(model), [tool_]).compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    started = time.perf_counter()
+    steps = sum(1 for _ in chatbot.stream({"messages": [HumanMessage(content=QUESTION)]}, config, stream_mode="updates"))
+    elapsed = time.perf_counter() - started
+    messages = chatbot.get_state(config).values["messages"]
+    return {
+        "super_steps": steps,
+        "model_calls": model.calls,
+        "tool_messages": sum(1 for m in messages if m.type == "tool"),
+        "checkpoints": len(list(saver.list(config))),
+        "seconds": round(elapsed, 2),
+        "last_tool_result": next(m.content for m in reversed(messages) if m.type == "tool")[:120],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per model call")
+    args = parser.parse_args()
+    print(json.dumps({"calculator": "two-number", **run(legacy_calculator, LEGACY_SCRIPT, args.latency)}))
+    print(json.dumps({"calculator": "expression", **run(calculator, EXPRESSION_SCRIPT, args.latency)}))
+
+
+if __name__ == "__main__":
+    main()
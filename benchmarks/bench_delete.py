@@ -0,0 +1,117 @@
+"""Deleting many chats: one transaction per chat vs `ChatSaver.delete_threads` (no Gemini calls).
+
+Fills a temporary database with `--threads` chats of `--checkpoints` checkpoints each
+(plus their writes, registry rows and titles), then deletes `--delete` of them:
+
+- one_by_one: `delete_thread` per chat, each its own transaction (what the sidebar did)
+- bulk: one `delete_threads` call, one transaction
+
+and reports how long the caller was blocked (median of `--repeat` fresh databases),
+then how long the background `SpaceReclaimer` took and how many bytes it gave back.
+`--incremental` switches the database to auto_vacuum=INCREMENTAL first, otherwise only
+the WAL shrinks.
+
+With the app's `synchronous=NORMAL` a WAL commit doesn't fsync, so bulk only saves the
+per-chat commits and statements: about 10% (59 vs 64 ms median over 5 runs here) and
+within run-to-run noise on other machines. Once commits are durable (`--synchronous FULL`,
+one WAL fsync per commit) it is about 20% (59 vs 74 ms), more on disks with slow fsync.
+The main point of one transaction is that a multi-chat delete is all or nothing.
+
+    python -m benchmarks.bench_delete --threads 2000 --delete 200 --incremental
+    python -m benchmarks.bench_delete --synchronous FULL
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from chat_saver import ChatSaver
+from db import Database
+from retention import RetentionPolicy, SpaceReclaimer, enable_incremental_vacuum
+from thread_registry import set_title, touch_thread
+
+
+def fill(path, args):
+    conn = sqlite3.connect(path)
+    saver = ChatSaver(conn=conn)
+    saver.setup()
+    if args.incremental:
+        enable_incremental_vacuum(conn)
+    rng = random.Random(0)
+    with saver.cursor() as cur:
+        for t in range(args.threads):
+            tid = f"thread-{t:06d}"
+            for c in range(args.checkpoints):
+                cid = f"1ef00000-0000-6000-8000-{t:06d}{c:06d}"
+                blob = rng.randbytes(args.blob)
+                cur.execute(
+                    "INSERT INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, type, checkpoint, metadata) VALUES (?, '', ?, 'msgpack', ?, '{}')",
+                    (tid, cid, blob),
+                )
+                cur.execute(
+                    "INSERT INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, '', ?, 'task', 0, 'messages', 'msgpack', ?)",
+                    (tid, cid, blob[: args.blob // 4]),
+                )
+            ts = f"2024-01-01T00:00:00.{t:06d}"
+            touch_thread(cur, tid, ts, args.checkpoints)
+            set_title(cur, tid, f"Chat {t}", ts)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "delete.db")
+        fill(path, args)
+        db = Database(path)
+        db.writer.execute(f"PRAGMA synchronous = {args.synchronous}")
+        saver = ChatSaver(db=db)
+        saver.setup()
+        victims = [f"thread-{t:06d}" for t in random.Random(1).sample(range(args.threads), args.delete)]
+
+        started = time.perf_counter()
+        if mode == "bulk":
+            saver.delete_threads(victims)
+        else:
+            for tid in victims:
+                saver.delete_thread(tid)
+        blocked = time.perf_counter() - started
+
+        with saver.cursor(transaction=False) as cur:
+            left = cur.execute("SELECT COUNT(*) FROM thread_registry").fetchone()[0]
+        report = SpaceReclaimer(saver, RetentionPolicy(pause=0)).reclaim()
+        db.close()
+        return {
+            "mode": mode,
+            "deleted": args.delete,
+            "blocked_ms": round(blocked * 1000, 1),
+            "per_chat_ms": round(blocked * 1000 / args.delete, 2),
+            "threads_left": left,
+            "reclaim_ms": round(report["seconds"] * 1000, 1),
+            "bytes_reclaimed": report["bytes_reclaimed"],
+            "free_bytes": report["free_bytes"],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=2000)
+    parser.add_argument("--checkpoints", type=int, default=20, help="checkpoints per chat")
+    parser.add_argument("--blob", type=int, default=2000, help="bytes per checkpoint")
+    parser.add_argument("--delete", type=int, default=200)
+    parser.add_argument("--incremental", action="store_true", help="auto_vacuum=INCREMENTAL")
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode, the median blocked time is reported")
+    args = parser.parse_args()
+
+    for mode in ("one_by_one", "bulk"):
+        runs = sorted((run(mode, args) for _ in range(args.repeat)), key=lambda r: r["blocked_ms"])
+        print(json.dumps({**runs[len(runs) // 2], "synchronous": args.synchronous,
+                          "blocked_ms_runs": [r["blocked_ms"] for r in runs]}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Offline benchmark suite for the chatbot graph (no Gemini / DuckDuckGo / Alpha Vantage).
+
+The graph is built like backend_latest (chat_graph.build_graph + make_chat_node),
+with the scripted fake model (`benchmarks.fake_llm`) and fake search / quote tools
+with fixed latency (`benchmarks.fake_tools`, the real calculator). Turns cycle through
+a plain answer, a search, a stock quote and a calculation.
+
+One thread is grown to the largest `--lengths` value per checkpointer (InMemorySaver,
+ChatSaver on SQLite, ChatSaver with the message log); at every length it reports, for
+the turns since the previous length:
+
+- turn latency and time to first token (stream_mode="messages", like the frontend)
+- overhead: turn latency minus the simulated model / tool time
+- checkpoint put / get_tuple latency and number of puts per turn
+- get_state latency at that length, database size on disk (+ WAL) and bytes per turn
+
+1000 turns take a few minutes, and plain ChatSaver writes the whole history into every
+checkpoint: ~3.5 GB of temporary database at 1000 turns (vs ~40 MB with the message log).
+
+Every result is one JSON line (with the git commit), so runs can be compared:
+
+    python -m benchmarks.bench_graph --lengths 1 10 100 1000 --out before.jsonl
+    python -m benchmarks.bench_graph --lengths 1 10 100 1000 --out after.jsonl
+    python -m benchmarks.bench_graph --compare before.jsonl after.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_tools import FakeTools
+from chat_graph import build_graph, make_chat_node
+from chat_saver import ChatSaver
+from db import Database
+
+ANSWER = "Here is a detailed answer to your question. " * 8
+
+SCRIPT = [
+    ANSWER,
+    {"tool_calls": [{"name": "duckduckgo_results_json", "args": {"query": "langgraph checkpoints"}}]},
+    "According to the search results, " + ANSWER,
+    {"tool_calls": [{"name": "get_stock_price", "args": {"symbols": ["AAPL", "MSFT"]}}]},
+    "AAPL and MSFT are both up today. " + ANSWER,
+    {"tool_calls": [{"name": "calculator", "args": {"expression": "(165.1 - 150.25) / 150.25 * 100"}}]},
+    "That is a gain of about 9.9%. " + ANSWER,
+]
+
+SAVERS = ("memory", "sqlite", "sqlite_message_log")
+
+# metrics compared by --compare (lower is better)
+METRICS = (
+    "turn_ms_p50", "turn_ms_p95", "ttft_ms_p50", "overhead_ms_p50", "overhead_ms_p95",
+    "put_ms_p50", "put_ms_p95", "get_tuple_ms_p50", "get_state_ms", "db_bytes",
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000, 3)
+
+
+def instrument(saver):
+    """Time the checkpointer calls the graph makes (wrapped on the instance)."""
+    timings = {"put": [], "put_writes": [], "get_tuple": []}
+    for name, samples in timings.items():
+        method = getattr(saver, name)
+
+        def timed(*args, _method=method, _samples=samples, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                _samples.append(time.perf_counter() - started)
+
+        setattr(saver, name, timed)
+    return timings
+
+
+def make_saver(kind, tmp):
+    if kind == "memory":
+        return InMemorySaver(), None
+    path = os.path.join(tmp, f"{kind}.db")
+    db = Database(path)
+    saver = ChatSaver(db=db, message_log=kind == "sqlite_message_log")
+    saver.setup()
+    return saver, db
+
+
+def db_bytes(db):
+    if db is None:
+        return None
+    return sum(os.path.getsize(db.path + s) for s in ("", "-wal") if os.path.exists(db.path + s))
+
+
+def run(kind, lengths, args, tmp):
+    model = ScriptedChatModel(script=SCRIPT, latency=args.latency, token_delay=args.token_delay)
+    tools = FakeTools(latency=args.tool_latency)
+    saver, db = make_saver(kind, tmp)
+    timings = instrument(saver)
+    chatbot = build_graph(make_chat_node(model), tools.tools).compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": f"bench-{kind}"}}
+
+    turns, previous = [], 0
+    for t in range(1, max(lengths) + 1):
+        simulated = model.seconds + tools.seconds
+        marks = {name: len(samples) for name, samples in timings.items()}
+        first = None
+        started = time.perf_counter()
+        user = HumanMessage(content=f"question {t}: " + "some context for the question " * 5)
+        for chunk, metadata in chatbot.stream({"messages": [user]}, config, stream_mode="messages"):
+            if first is None and isinstance(chunk, AIMessage) and chunk.content and metadata.get("langgraph_node") == "chat_node":
+                first = time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        turns.append({
+            "turn": elapsed,
+            "ttft": first,
+            "overhead": elapsed - (model.seconds + tools.seconds - simulated),
+            **{name: samples[marks[name]:] for name, samples in timings.items()},
+        })
+        if t not in lengths:
+            continue
+
+        window = turns[previous:]
+        started = time.perf_counter()
+        messages = chatbot.get_state(config).values["messages"]
+        get_state = time.perf_counter() - started
+        puts = [s for turn in window for s in turn["put"]]
+        size = db_bytes(db)
+        yield {
+            "bench": "graph",
+            "saver": kind,
+            "turns": t,
+            "messages": len(messages),
+            "turn_ms_p50": percentile([w["turn"] for w in window], 50),
+            "turn_ms_p95": percentile([w["turn"] for w in window], 95),
+            "ttft_ms_p50": percentile([w["ttft"] for w in window if w["ttft"] is not None], 50),
+            "overhead_ms_p50": percentile([w["overhead"] for w in window], 50),
+            "overhead_ms_p95": percentile([w["overhead"] for w in window], 95),
+            "put_ms_p50": percentile(puts, 50),
+            "put_ms_p95": percentile(puts, 95),
+            "puts_per_turn": round(len(puts) / len(window), 2),
+            "put_writes_ms_p50": percentile([s for w in window for s in w["put_writes"]], 50),
+            "get_tuple_ms_p50": percentile([s for w in window for s in w["get_tuple"]], 50),
+            "get_state_ms": round(get_state * 1000, 3),
+            "db_bytes": size,
+            "db_bytes_per_turn": round(size / t) if size is not None else None,
+        }
+        previous = t
+    if db is not None:
+        db.close()
+
+
+def warm_up():
+    """One throwaway turn of each kind, so lazy imports don't land in the first measured turn."""
+    tools = FakeTools(latency=0)
+    chatbot = build_graph(make_chat_node(ScriptedChatModel(script=SCRIPT)), tools.tools).compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "warm-up"}}
+    for _ in range(4):
+        for _ in chatbot.stream({"messages": [HumanMessage(content="hi")]}, config, stream_mode="messages"):
+            pass
+
+
+def compare(base_path, new_path):
+    def load(path):
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return {(r["saver"], r["turns"]): r for r in rows if r.get("bench") == "graph"}
+
+    base, new = load(base_path), load(new_path)
+    for key in sorted(base.keys() & new.keys()):
+        row = {"saver": key[0], "turns": key[1], "base": base[key].get("commit"), "new": new[key].get("commit")}
+        for metric in METRICS:
+            a, b = base[key].get(metric), new[key].get(metric)
+            if a and b is not None:
+                row[metric] = f"{a} -> {b} ({(b - a) / a * 100:+.1f}%)"
+        print(json.dumps(row))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1, 10, 100], help="conversation lengths in turns")
+    parser.add_argument("--savers", nargs="+", default=list(SAVERS), choices=SAVERS)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="simulated seconds between tokens")
+    parser.add_argument("--tool-latency", type=float, default=0.01, help="simulated seconds per tool call")
+    parser.add_argument("--out", help="append the JSON lines to this file as well")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    meta = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "latency": args.latency,
+        "token_delay": args.token_delay,
+        "tool_latency": args.tool_latency,
+    }
+    lengths = sorted(set(args.lengths))
+    warm_up()
+    out = open(args.out, "a") if args.out else None
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for kind in args.savers:
+                for row in run(kind, lengths, args, tmp):
+                    line = json.dumps({**row, **meta})
+                    print(line, flush=True)
+                    if out:
+                        out.write(line + "\n")
+    finally:
+        if out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
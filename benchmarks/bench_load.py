@@ -0,0 +1,246 @@
+"""Headless multi-user load test of the frontend_latest chat flow (no Streamlit, no Gemini).
+
+Wires the pieces backend_latest uses (ChatSaver, chat_graph, load_page, thread
+registry titles, title worker) on a temporary database, with the scripted fake model
+and fake tools, then lets N simulated users do what frontend_latest does:
+
+- sidebar: `retrieve_all_thread_ids` + `get_chat_titles` on every rerun
+- open one of their chats (`load_conversation_page`) or start a new one
+- send a few messages with exponential think times, each one streamed with
+  `chatbot.stream(..., stream_mode="messages")` and consumed chunk by chunk
+- first answer of a new chat -> `request_title` (background title worker)
+- now and then delete an old chat (`delete_thread`)
+
+Each concurrency level runs for `--duration` seconds on a fresh database and prints
+one JSON line: throughput, p50/p95/p99 turn latency, time to first token, page and
+sidebar load times, "database is locked" and other errors, titles written.
+
+`--storage pool` is backend_latest (db.Database: one writer + reader pool);
+`--storage single` is the older backends' single shared sqlite3 connection.
+
+    python -m benchmarks.bench_load --users 1 10 50 --duration 15 --think 1
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from benchmarks.bench_graph import SCRIPT
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_tools import FakeTools
+from chat_graph import build_graph, make_chat_node
+from chat_saver import ChatSaver
+from conversation import load_page
+from db import Database
+from thread_registry import list_threads
+from title_worker import placeholder_title, start_title_worker
+
+# the title model answers any batch of up to 16 chats
+TITLES = json.dumps({str(i): f"Load test chat {i}" for i in range(1, 17)})
+
+
+class Backend:
+    """backend_latest's functions on a temporary database with fake model and tools."""
+
+    def __init__(self, path, storage, args):
+        if storage == "pool":
+            self.db = Database(path)
+            self.saver = ChatSaver(db=self.db)
+        else:
+            self.db = None
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.saver = ChatSaver(conn=self.conn)
+        self.saver.setup()
+        model = ScriptedChatModel(script=SCRIPT, latency=args.latency, token_delay=args.token_delay)
+        tools = FakeTools(latency=args.tool_latency)
+        self.chatbot = build_graph(make_chat_node(model), tools.tools).compile(checkpointer=self.saver)
+        self.title_worker = start_title_worker(ScriptedChatModel(script=[TITLES], latency=args.latency), self.saver.replace_title)
+
+    def stream_turn(self, thread_id, user_input):
+        return self.chatbot.stream(
+            {"messages": [HumanMessage(content=user_input)]},
+            config={"configurable": {"thread_id": thread_id}},
+            stream_mode="messages",
+        )
+
+    def load_conversation_page(self, thread_id):
+        return load_page(self.saver, thread_id)
+
+    def retrieve_all_thread_ids(self):
+        with self.saver.cursor(transaction=False) as cur:
+            threads = list_threads(cur)
+        return [t["thread_id"] for t in reversed(threads)]
+
+    def get_chat_titles(self, thread_ids):
+        return self.saver.get_titles(thread_ids)
+
+    def request_title(self, thread_id, user_input, ai_message):
+        placeholder = placeholder_title(user_input)
+        if self.saver.set_title_if_missing(thread_id, placeholder):
+            self.title_worker.submit(thread_id, user_input, ai_message, placeholder)
+
+    def delete_thread(self, thread_id):
+        self.saver.delete_thread(thread_id)
+
+    def close(self):
+        self.title_worker.stop()
+        self.title_worker.join(timeout=2)
+        if self.db is not None:
+            self.db.close()
+        else:
+            self.conn.close()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {"turn": [], "ttft": [], "page": [], "sidebar": []}
+        self.errors = Counter()
+        self.counts = Counter()
+
+    def add(self, kind, seconds):
+        with self.lock:
+            self.samples[kind].append(seconds)
+
+    def error(self, e):
+        kind = "database_locked" if "database is locked" in str(e) else type(e).__name__
+        with self.lock:
+            self.errors[kind] += 1
+
+    def timed(self, kind, fn, *args):
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.error(e)
+            return None
+        self.add(kind, time.perf_counter() - started)
+        return result
+
+
+def turn(backend, stats, thread_id, text):
+    """Consume one streamed turn like frontend_latest's ai_only_stream; returns the answer text."""
+    started = time.perf_counter()
+    first, answer = None, []
+    try:
+        for chunk, metadata in backend.stream_turn(thread_id, text):
+            if isinstance(chunk, AIMessage) and metadata.get("langgraph_node") == "chat_node" and chunk.content:
+                if first is None:
+                    first = time.perf_counter() - started
+                answer.append(chunk.content)
+    except Exception as e:
+        stats.error(e)
+        return None
+    stats.add("turn", time.perf_counter() - started)
+    if first is not None:
+        stats.add("ttft", first)
+    with stats.lock:
+        stats.counts["turns"] += 1
+    return "".join(answer)
+
+
+def user(backend, stats, index, deadline, args):
+    rng = random.Random(index)
+    own = []
+
+    def think():
+        time.sleep(min(rng.expovariate(1 / args.think), args.think * 5) if args.think else 0)
+        return time.monotonic() < deadline
+
+    while time.monotonic() < deadline:
+        ids = stats.timed("sidebar", backend.retrieve_all_thread_ids)
+        if ids is not None:
+            stats.timed("sidebar", backend.get_chat_titles, ids[-50:])
+        new = not own or rng.random() < args.new_chat
+        if new:
+            thread_id = str(uuid.uuid4())
+            own.append(thread_id)
+        else:
+            thread_id = rng.choice(own)
+            stats.timed("page", backend.load_conversation_page, thread_id)
+        for k in range(rng.randint(1, args.max_turns)):
+            if not think():
+                return
+            text = f"user {index} question {k}: " + "some context for the question " * 3
+            answer = turn(backend, stats, thread_id, text)
+            if new and k == 0 and answer is not None:
+                stats.timed("sidebar", backend.request_title, thread_id, text, answer)
+        if len(own) > 3 and rng.random() < args.delete:
+            stats.timed("sidebar", backend.delete_thread, own.pop(0))
+            with stats.lock:
+                stats.counts["deleted"] += 1
+
+
+def ms(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000, 1)
+
+
+def run_level(users, args, tmp):
+    path = os.path.join(tmp, f"load-{args.storage}-{users}.db")
+    backend = Backend(path, args.storage, args)
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for future in [pool.submit(user, backend, stats, i, deadline, args) for i in range(users)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    time.sleep(1)  # let the title worker finish its last batch
+    with backend.saver.cursor(transaction=False) as cur:
+        titled = cur.execute("SELECT COUNT(*) FROM thread_registry WHERE title LIKE 'Load test chat%'").fetchone()[0]
+    backend.close()
+    s = stats.samples
+    return {
+        "storage": args.storage,
+        "users": users,
+        "seconds": round(elapsed, 1),
+        "turns": stats.counts["turns"],
+        "turns_per_sec": round(stats.counts["turns"] / elapsed, 2),
+        "turn_ms_p50": ms(s["turn"], 50),
+        "turn_ms_p95": ms(s["turn"], 95),
+        "turn_ms_p99": ms(s["turn"], 99),
+        "ttft_ms_p50": ms(s["ttft"], 50),
+        "ttft_ms_p95": ms(s["ttft"], 95),
+        "ttft_ms_p99": ms(s["ttft"], 99),
+        "page_ms_p95": ms(s["page"], 95),
+        "sidebar_ms_p95": ms(s["sidebar"], 95),
+        "database_locked": stats.errors.pop("database_locked", 0),
+        "other_errors": dict(stats.errors),
+        "titles_written": titled,
+        "deleted": stats.counts["deleted"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10, 25, 50], help="concurrency levels")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per level")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between messages (s)")
+    parser.add_argument("--max-turns", type=int, default=4, help="messages per visit to a chat")
+    parser.add_argument("--new-chat", type=float, default=0.3, help="probability a visit starts a new chat")
+    parser.add_argument("--delete", type=float, default=0.1, help="probability a visit ends with a delete")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--tool-latency", type=float, default=0.2)
+    parser.add_argument("--storage", choices=("pool", "single"), default="pool")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for users in args.users:
+            print(json.dumps(run_level(users, args, tmp)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Checkpoint storage: full message list per checkpoint vs append-only message log.
+
+Replays the checkpoints of real threads (from a copy of chatbot.db) and/or a
+synthetic long thread into two fresh databases, one per storage mode, and reports
+database size and `put` latency for each.
+
+    python -m benchmarks.bench_message_log --source chatbot.db --copies 20
+    python -m benchmarks.bench_message_log --source "" --synthetic-turns 200
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import shutil
+import tempfile
+import time
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fake_llm import ScriptedChatModel
+from chat_graph import build_graph, make_chat_node
+from chat_saver import ChatSaver
+from chat_tools import calculator
+from db import Database
+
+
+def source_threads(path, tmp):
+    """[(thread_id, [CheckpointTuple oldest -> newest])] from a copy of an existing database."""
+    copy = os.path.join(tmp, "source.db")
+    for suffix in ("", "-wal"):
+        if os.path.exists(path + suffix):
+            shutil.copyfile(path + suffix, copy + suffix)
+    conn = sqlite3.connect(copy, check_same_thread=False)
+    saver = ChatSaver(conn=conn)
+    thread_ids = [r[0] for r in conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+    threads = [
+        (tid, list(reversed(list(saver.list({"configurable": {"thread_id": tid, "checkpoint_ns": ""}})))))
+        for tid in thread_ids
+    ]
+    conn.close()
+    return threads
+
+
+def synthetic_thread(turns):
+    """One long thread with a tool call (and a bulky tool result) every other turn."""
+    script = [
+        {"tool_calls": [{"name": "calculator", "args": {"expression": "2 + 3"}}]},
+        "The result is 5. " + "Here is a fairly long explanation of the result. " * 20,
+        "Plain answer without tools. " * 15,
+    ]
+    saver = InMemorySaver()
+    chatbot = build_graph(make_chat_node(ScriptedChatModel(script=script)), [calculator]).compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "synthetic"}}
+    for t in range(turns):
+        chatbot.invoke({"messages": [HumanMessage(content=f"question {t} " + "with some context " * 10)]}, config)
+    return [("synthetic", list(reversed(list(saver.list(config)))))]
+
+
+def replay(threads, copies, db_path, message_log):
+    db = Database(db_path)
+    saver = ChatSaver(db=db, message_log=message_log)
+    saver.setup()
+    latencies = []
+    for copy in range(copies):
+        for thread_id, checkpoints in threads:
+            for tup in checkpoints:
+                parent_id = tup.parent_config["configurable"]["checkpoint_id"] if tup.parent_config else None
+                config = {"configurable": {"thread_id": f"{thread_id}-{copy}", "checkpoint_ns": "", "checkpoint_id": parent_id}}
+                started = time.perf_counter()
+                saver.put(config, tup.checkpoint, tup.metadata, {})
+                latencies.append(time.perf_counter() - started)
+    db.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    db.close()
+    latencies.sort()
+    return {
+        "mode": "message_log" if message_log else "full_messages",
+        "checkpoints": len(latencies),
+        "db_bytes": os.path.getsize(db_path),
+        "put_ms_mean": round(statistics.mean(latencies) * 1000, 3),
+        "put_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="chatbot.db", help="database to replay ('' to skip)")
+    parser.add_argument("--copies", type=int, default=10, help="replay every thread this many times")
+    parser.add_argument("--synthetic-turns", type=int, default=100, help="add one synthetic thread (0 to skip)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        threads = []
+        if args.source:
+            threads += source_threads(args.source, tmp)
+        if args.synthetic_turns:
+            threads += synthetic_thread(args.synthetic_turns)
+
+        for message_log in (False, True):
+            result = replay(threads, args.copies, os.path.join(tmp, f"{message_log}.db"), message_log)
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Cost of metrics.py: turn latency with CHAT_METRICS off vs on, and a disabled hook call.
+
+Same offline graph as bench_graph (scripted model, fake tools without latency,
+InMemorySaver), `--turns` turns per configuration on fresh threads.
+
+    python -m benchmarks.bench_metrics_overhead --turns 300
+"""
+import argparse
+import json
+import statistics
+import time
+import timeit
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+import metrics
+from benchmarks.bench_graph import SCRIPT
+from benchmarks.fake_llm import ScriptedChatModel
+from benchmarks.fake_tools import FakeTools
+from chat_graph import build_graph, make_chat_node
+
+
+def run(turns):
+    tools = FakeTools(latency=0)
+    saver = metrics.instrument_saver(InMemorySaver())
+    chatbot = build_graph(make_chat_node(ScriptedChatModel(script=SCRIPT)), tools.tools).compile(checkpointer=saver)
+    latencies = []
+    for i in range(turns):
+        config = {"configurable": {"thread_id": f"t{i}"}}
+        started = time.perf_counter()
+        stream = chatbot.stream({"messages": [HumanMessage(content="hi")]}, config, stream_mode="messages")
+        for _ in metrics.trace_turn(f"t{i}", stream):
+            pass
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "turn_ms_mean": round(statistics.mean(latencies) * 1000, 3),
+        "turn_ms_p50": round(latencies[len(latencies) // 2] * 1000, 3),
+        "turn_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=300)
+    args = parser.parse_args()
+
+    run(20)  # warm-up
+    off = run(args.turns)
+    hook_ns = timeit.timeit(lambda: metrics.observe("x", 0.001, op="put"), number=200_000) / 200_000 * 1e9
+    print(json.dumps({"metrics": "off", **off, "disabled_observe_ns": round(hook_ns)}))
+
+    metrics.REGISTRY = metrics.Registry()
+    on = run(args.turns)
+    print(json.dumps({
+        "metrics": "on", **on,
+        "overhead_pct_p50": round((on["turn_ms_p50"] - off["turn_ms_p50"]) / off["turn_ms_p50"] * 100, 1),
+        "checkpoint_calls": sum(h["count"] for h in metrics.snapshot()["chatbot_checkpoint_seconds"]),
+    }))
+
+
+if __name__ == "__main__":
+    main()
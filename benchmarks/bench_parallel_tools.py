@@ -0,0 +1,90 @@
+"""Tool super-step latency: sequential calls vs ToolNode vs parallel_tools.make_tool_node.
+
+One AIMessage with several tool calls (fake tools that just sleep), executed by each
+node, sync and async; plus a turn where one tool hangs past its timeout.
+
+    python -m benchmarks.bench_parallel_tools --delays 0.3 0.5 0.2
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+from langgraph.graph import StateGraph, START, END
+from langgraph.prebuilt import ToolNode
+
+from chat_graph import ChatState
+from parallel_tools import make_tool_node
+
+
+def sleepy_tool(name, delay):
+    def func(query: str) -> str:
+        time.sleep(delay)
+        return f"{name} result for {query}"
+
+    async def coroutine(query: str) -> str:
+        await asyncio.sleep(delay)
+        return f"{name} result for {query}"
+
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=name, description=f"sleeps {delay}s")
+
+
+def turn(names):
+    calls = [{"name": n, "args": {"query": "q"}, "id": f"call_{i}"} for i, n in enumerate(names)]
+    return {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+
+def one_node_graph(node):
+    # ToolNode needs the graph runtime, so run both nodes the way chat_graph does
+    graph = StateGraph(ChatState)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    return graph.compile()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    out = fn()
+    return round((time.perf_counter() - started) * 1000, 1), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delays", type=float, nargs="+", default=[0.3, 0.5, 0.2])
+    args = parser.parse_args()
+
+    tools = [sleepy_tool(f"tool_{i}", d) for i, d in enumerate(args.delays)]
+    state = turn([t.name for t in tools])
+    tool_node = one_node_graph(ToolNode(tools))
+    parallel = one_node_graph(make_tool_node(tools))
+
+    def sequential():
+        return [t.invoke(c) for t, c in zip(tools, state["messages"][-1].tool_calls)]
+
+    ms, out = timed(lambda: parallel.invoke(state))
+    print(json.dumps({
+        "tool_delays_s": args.delays,
+        "sequential_ms": timed(sequential)[0],
+        "toolnode_sync_ms": timed(lambda: tool_node.invoke(state))[0],
+        "toolnode_async_ms": timed(lambda: asyncio.run(tool_node.ainvoke(state)))[0],
+        "parallel_sync_ms": ms,
+        "parallel_async_ms": timed(lambda: asyncio.run(parallel.ainvoke(state)))[0],
+        "latency_ms": [m.response_metadata["latency_ms"] for m in out["messages"][1:]],
+    }))
+
+    # one tool hangs past its timeout: partial results + an error ToolMessage
+    hung = sleepy_tool("hung", 5)
+    node = one_node_graph(make_tool_node(tools + [hung], timeouts={"hung": 1}))
+    ms, out = timed(lambda: node.invoke(turn([t.name for t in tools] + ["hung", "missing"])))
+    print(json.dumps({
+        "with_timeout_ms": ms,
+        "statuses": [m.status for m in out["messages"][1:]],
+        "errors": [m.content for m in out["messages"][1:] if m.status == "error"],
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Sustained overload against a provider quota: no limiter vs rate_limiter.RateLimiter.
+
+Turns arrive at `--arrival` per second for `--duration` seconds against a
+`QuotaChatModel` that answers 429 once more than `--quota` calls fall in one
+`--window` seconds. Both configurations retry 429s like the chat model does
+(resilient_llm); the limited one sits behind a RateLimiter with the same quota and
+`--max-wait` seconds of queueing. Reported: answered / busy / failed turns, 429s seen
+by the provider, latency of answered turns and how long a refused turn took to learn it.
+
+    python -m benchmarks.bench_rate_limiter --duration 20 --arrival 8 --quota 30 --window 6
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_llm import QuotaChatModel
+from rate_limiter import BusyError, RateLimiter, rate_limited
+from resilient_llm import resilient_model
+
+
+def ms(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000, 1)
+
+
+def run(name, model, provider, limiter, args):
+    answered, refused, failed = [], [], []
+
+    def turn():
+        started = time.perf_counter()
+        try:
+            model.invoke("hi")
+            answered.append(time.perf_counter() - started)
+        except BusyError:
+            refused.append(time.perf_counter() - started)
+        except Exception:
+            failed.append(time.perf_counter() - started)
+
+    turns = int(args.duration * args.arrival)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=turns) as pool:
+        for i in range(turns):
+            time.sleep(max(0, started + i / args.arrival - time.perf_counter()))
+            pool.submit(turn)
+    row = {
+        "config": name,
+        "turns": turns,
+        "answered": len(answered),
+        "busy": len(refused),
+        "failed": len(failed),
+        "provider_429s": provider.rejected,
+        "answered_p50_ms": ms(answered, 50),
+        "answered_p95_ms": ms(answered, 95),
+        "busy_p95_ms": ms(refused, 95),
+        "failed_p95_ms": ms(failed, 95),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    if limiter is not None:
+        row["limiter"] = limiter.stats()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--arrival", type=float, default=8, help="turns per second")
+    parser.add_argument("--quota", type=int, default=30, help="provider calls per window")
+    parser.add_argument("--window", type=float, default=6, help="provider quota window in seconds")
+    parser.add_argument("--max-wait", type=float, default=2)
+    args = parser.parse_args()
+    logging.getLogger("resilient_llm").setLevel(logging.ERROR)
+    # same retry policy as the chat model, scaled down with the window
+    policy = {"base_delay": 0.5, "max_delay": 2, "budget": 10}
+
+    provider = QuotaChatModel(rpm=args.quota, window=args.window, latency=0.05)
+    print(json.dumps(run("no limiter", resilient_model(provider, **policy), provider, None, args)))
+
+    time.sleep(args.window)  # let the quota window drain
+    provider = QuotaChatModel(rpm=args.quota, window=args.window, latency=0.05)
+    limiter = RateLimiter("quota", rpm=args.quota, max_wait=args.max_wait, period=args.window)
+    model = resilient_model(rate_limited(provider, limiter), **policy)
+    print(json.dumps(run("rate limited", model, provider, limiter, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Turn latency and error rate under injected overload: plain model vs resilient_llm.
+
+The primary is a `FlakyChatModel` (503s on `--fail-rate` of the calls, `--slow-rate`
+of the calls take `--slow-latency` extra seconds); hedge and fallback are healthy
+scripted models. Each configuration runs `--turns` turns through the chat graph
+(stream_mode="messages", like the frontend) and reports p50/p95/p99 turn latency,
+time to first token, failed turns and error-shaped messages left in the checkpoints.
+
+    python -m benchmarks.bench_resilience --turns 200 --fail-rate 0.2 --slow-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from google.api_core.exceptions import ServiceUnavailable
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fake_llm import FlakyChatModel, ScriptedChatModel
+from chat_graph import OVERLOADED_MSG, build_graph, make_async_chat_node, make_chat_node
+from resilient_llm import FailureLog, resilient_model
+
+ANSWER = "Sure, here is a short answer from the model."
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000, 1)
+
+
+def summarize(name, latencies, ttfts, failed, turns, failures=None):
+    row = {
+        "config": name,
+        "turns": turns,
+        "failed_turns": failed,
+        "error_rate": round(failed / turns, 3),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "ttft_p50_ms": percentile(ttfts, 50),
+        "ttft_p99_ms": percentile(ttfts, 99),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+    }
+    if failures is not None:
+        row["events"] = failures.stats()
+    return row
+
+
+def persisted_errors(saver):
+    # the old chat_node stored errors as HumanMessages starting with ⚠️ / ❌
+    count = 0
+    for item in saver.list(None):
+        messages = item.checkpoint["channel_values"].get("messages", [])
+        count += any(m.type == "human" and m.content[:1] in ("⚠", "❌") for m in messages)
+    return count
+
+
+def legacy_chat_node(llm):
+    # chat_node before resilient_llm: the error becomes a (checkpointed) HumanMessage
+    def chat_node(state):
+        try:
+            return {"messages": [llm.invoke(state["messages"])]}
+        except ServiceUnavailable:
+            return {"messages": [HumanMessage(content=OVERLOADED_MSG)]}
+    return chat_node
+
+
+def run(name, model, turns, failures=None, node=make_chat_node):
+    saver = InMemorySaver()
+    chatbot = build_graph(node(model), []).compile(checkpointer=saver)
+    latencies, ttfts, failed = [], [], 0
+    for i in range(turns):
+        config = {"configurable": {"thread_id": f"t{i}"}}
+        started = time.perf_counter()
+        first = None
+        try:
+            for chunk, _ in chatbot.stream({"messages": [HumanMessage(content="hi")]}, config, stream_mode="messages"):
+                if first is None and isinstance(chunk, AIMessage) and chunk.content:
+                    first = time.perf_counter() - started
+        except Exception:
+            failed += 1
+            continue
+        if first is None:
+            failed += 1  # legacy node: no answer, the error message was stored instead
+            continue
+        latencies.append(time.perf_counter() - started)
+        ttfts.append(first)
+    return {**summarize(name, latencies, ttfts, failed, turns, failures), "persisted_errors": persisted_errors(saver)}
+
+
+async def arun(name, model, turns, failures=None, concurrency=20):
+    chatbot = build_graph(make_async_chat_node(model), []).compile(checkpointer=InMemorySaver())
+    latencies, ttfts, failed = [], [], 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def turn(i):
+        nonlocal failed
+        async with gate:
+            config = {"configurable": {"thread_id": f"t{i}"}}
+            started = time.perf_counter()
+            first = None
+            try:
+                async for chunk, _ in chatbot.astream({"messages": [HumanMessage(content="hi")]}, config, stream_mode="messages"):
+                    if first is None and isinstance(chunk, AIMessage) and chunk.content:
+                        first = time.perf_counter() - started
+            except Exception:
+                failed += 1
+                return
+            latencies.append(time.perf_counter() - started)
+            ttfts.append(first or latencies[-1])
+
+    await asyncio.gather(*(turn(i) for i in range(turns)))
+    return summarize(name, latencies, ttfts, failed, turns, failures)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="first-token latency of a healthy call")
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--hedge-after", type=float, default=0.3)
+    args = parser.parse_args()
+
+    def primary():
+        return FlakyChatModel(
+            script=[ANSWER], latency=args.latency, fail_rate=args.fail_rate,
+            slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=42,
+        )
+
+    def healthy():
+        return ScriptedChatModel(script=[ANSWER], latency=args.latency * 1.5)
+
+    # short backoff so the run stays quick; production defaults are 0.5 s .. 4 s
+    policy = {"base_delay": 0.05, "max_delay": 0.4, "budget": 10}
+    configs = [
+        ("retry", lambda f: resilient_model(primary(), failures=f, **policy)),
+        ("retry+fallback", lambda f: resilient_model(primary(), fallback=healthy(), failures=f, **policy)),
+        ("retry+hedge+fallback", lambda f: resilient_model(
+            primary(), hedge=healthy(), fallback=healthy(), failures=f, hedge_after=args.hedge_after, **policy)),
+    ]
+    logging.getLogger("resilient_llm").setLevel(logging.ERROR)
+    print(json.dumps({"fail_rate": args.fail_rate, "slow_rate": args.slow_rate, "slow_latency_s": args.slow_latency}))
+    print(json.dumps(run("plain (old chat_node)", primary(), args.turns, node=legacy_chat_node)))
+    for name, make in configs:
+        failures = FailureLog()
+        print(json.dumps(run(name, make(failures), args.turns, failures)))
+    failures = FailureLog()
+    print(json.dumps(asyncio.run(arun("async retry+hedge+fallback", configs[-1][1](failures), args.turns, failures))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Full-text message search (message_search.py) at 100k messages (no Gemini calls).
+
+Writes `--threads` chats of `--messages` messages each as checkpoints with indexing
+off (a database from before the index), then reports:
+
+- backfill: `backfill_search` over every thread (messages/s)
+- put: indexing one new turn on a long thread, incremental (`index_messages`) vs
+  re-indexing the whole thread
+- search: p50 / p95 of `search_messages` for a few query kinds, next to a
+  `LIKE '%word%'` scan of the same text (every match, as ranking needs) as the
+  no-index baseline
+
+    python -m benchmarks.bench_search --threads 1000 --messages 100
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from chat_saver import ChatSaver
+from db import Database
+from message_search import INSERT_SQL, backfill_search, index_messages, index_rows, search_messages
+
+WORDS = (
+    "graph stream token model answer python stock price market search weather travel recipe "
+    "bread pasta tomato garden physics quantum energy battery solar budget invoice meeting "
+    "holiday flight hotel museum history music guitar piano football tennis running health "
+    "sleep coffee tea database index query latency cache server deploy docker kubernetes"
+).split()
+RARE = ["zanzibar", "quokka", "xylophone", "fjord", "kumquat"]
+
+
+def sentence(rng, n):
+    words = [rng.choice(WORDS) for _ in range(n)]
+    if rng.random() < 0.01:
+        words[rng.randrange(n)] = rng.choice(RARE)
+    return " ".join(words).capitalize() + "."
+
+
+def conversation(rng, n):
+    return [
+        HumanMessage(content=sentence(rng, rng.randint(5, 15)), id=f"m{i}") if i % 2 == 0
+        else AIMessage(content=" ".join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6))), id=f"m{i}")
+        for i in range(n)
+    ]
+
+
+def put(saver, thread_id, messages):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": messages}
+    checkpoint["channel_versions"] = {"messages": 1}
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    saver.put(config, checkpoint, {}, {"messages": 1})
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return result, {
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100, help="messages per thread")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "search.db"))
+        saver = ChatSaver(db=db)
+        saver.setup()
+        saver.search_enabled = False  # a database written before the index existed
+        for t in range(args.threads):
+            put(saver, f"thread-{t:06d}", conversation(rng, args.messages))
+        saver.search_enabled = True
+
+        started = time.perf_counter()
+        rows = backfill_search(saver)
+        seconds = time.perf_counter() - started
+        print(json.dumps({
+            "step": "backfill", "threads": args.threads, "messages": rows,
+            "seconds": round(seconds, 2), "messages_per_sec": round(rows / seconds),
+        }), flush=True)
+
+        # one more turn on a long thread: only its 2 new messages vs the whole thread
+        messages = conversation(rng, args.messages + 2)
+        runs = iter(range(args.repeat * 2))
+        with saver.cursor() as cur:
+            _, incremental = timed(lambda: index_messages(cur, f"thread-{next(runs):06d}", messages), args.repeat)
+            _, full = timed(lambda: cur.executemany(INSERT_SQL, index_rows(f"reindex-{next(runs)}", messages)), args.repeat)
+            cur.connection.rollback()
+        print(json.dumps({"step": "put", "thread_messages": len(messages), "incremental": incremental, "full_reindex": full}), flush=True)
+
+        queries = {
+            "common_word": "python",
+            "two_words": "quantum energy",
+            "prefix": "kuber",
+            "rare_word": "quokka",
+        }
+        with saver.cursor(transaction=False) as cur:
+            for kind, query in queries.items():
+                hits, fts = timed(lambda: search_messages(cur, query, 20), args.repeat)
+                word = query.split()[0]
+                # no index: every message has to be scanned to rank the matches
+                _, like = timed(lambda: cur.execute(
+                    "SELECT thread_id, text FROM message_text WHERE text LIKE ?", (f"%{word}%",)
+                ).fetchall(), max(args.repeat // 5, 3))
+                print(json.dumps({
+                    "step": "search", "kind": kind, "query": query, "hits": len(hits),
+                    "fts": fts, "like_scan": like,
+                    "top": hits[0]["snippet"] if hits else None,
+                }), flush=True)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Rerun cost of frontend_latest's sidebar as the number of chats grows (no Gemini calls).
+
+Fills a temporary database with N titled threads, then runs frontend_latest.py under
+streamlit.testing.AppTest in a fresh interpreter and reports, per N:
+
+- first_run_ms: first script run of a session
+- rerun_ms_p50: a full rerun (what every chat message / button click costs)
+- buttons: sidebar buttons rendered on a rerun
+
+    python -m benchmarks.bench_sidebar --threads 10 100 500 1000
+    python -m benchmarks.bench_sidebar --tree /tmp/before    # another checkout, e.g. a git worktree
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILL = """
+import sqlite3, sys
+from chat_saver import ChatSaver
+from thread_registry import set_title, touch_thread
+
+conn = sqlite3.connect(sys.argv[1])
+saver = ChatSaver(conn=conn)
+saver.setup()
+with saver.cursor() as cur:
+    for i in range(int(sys.argv[2])):
+        ts = f"2024-01-01T00:00:00.{i:06d}"
+        touch_thread(cur, f"thread-{i:06d}", ts, 2)
+        set_title(cur, f"thread-{i:06d}", f"Chat about topic {i}", ts)
+conn.close()
+"""
+
+RUN = """
+import json, os, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+
+at = AppTest.from_file(os.path.join(sys.argv[1], "frontend_latest.py"), default_timeout=120)
+started = time.perf_counter()
+at.run()
+first = time.perf_counter() - started
+assert not at.exception, at.exception
+reruns = []
+for _ in range(int(sys.argv[2])):
+    started = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - started)
+print(json.dumps({
+    "first_run_ms": round(first * 1000, 1),
+    "rerun_ms_p50": round(statistics.median(reruns) * 1000, 1),
+    "buttons": len(at.sidebar.button),
+}))
+"""
+
+
+def python(code, args, tree, cwd, db):
+    env = {
+        **os.environ, "PYTHONPATH": tree, "CHATBOT_DB": db,
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "dummy"),
+    }
+    out = subprocess.run([sys.executable, "-c", code, *map(str, args)], cwd=cwd, env=env,
+                         capture_output=True, text=True, timeout=600)
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip()[-2000:])
+    return out.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--tree", default=ROOT, help="checkout to measure (default: this one)")
+    args = parser.parse_args()
+    tree = os.path.abspath(args.tree)
+
+    for n in args.threads:
+        with tempfile.TemporaryDirectory() as cwd:
+            db = os.path.join(cwd, "sidebar.db")
+            python(FILL, [db, n], tree, cwd, db)
+            row = json.loads(python(RUN, [tree, args.reruns], tree, cwd, db).strip().splitlines()[-1])
+        print(json.dumps({"tree": tree, "threads": n, **row}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
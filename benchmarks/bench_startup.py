@@ -0,0 +1,93 @@
+"""Cold start of backend_latest / frontend_latest, each sample in a fresh interpreter.
+
+Per sample (fresh Python process, empty temporary database):
+
+- import_ms: `import backend_latest`
+- sidebar_ms: import + what the first render needs (thread ids and titles)
+- chat_ready_ms: import + the compiled graph (`backend_latest.chatbot`), i.e. the first message
+- app_first_run_ms (`--app`): first run of frontend_latest.py under streamlit.testing.AppTest,
+  what the first visitor of a fresh process waits for
+
+Works on any checkout that has backend_latest.py, so the eager (import-time) backend can be
+compared with the lazy one:
+
+    git worktree add /tmp/before <commit>
+    python -m benchmarks.bench_startup --tree /tmp/before --app
+    python -m benchmarks.bench_startup --app
+
+No API requests are made; GOOGLE_API_KEY is set to a dummy value if missing so the Gemini
+clients can be constructed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKEND = """
+import json, time
+started = time.perf_counter()
+import backend_latest
+imported = time.perf_counter()
+ids = backend_latest.retrieve_all_thread_ids()
+backend_latest.get_chat_titles(ids)
+sidebar = time.perf_counter()
+backend_latest.chatbot
+ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "sidebar_ms": (sidebar - started) * 1000,
+    "chat_ready_ms": (ready - started) * 1000,
+}))
+"""
+
+APP = """
+import json, os, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(os.path.join({tree!r}, "frontend_latest.py"), default_timeout=120).run()
+assert not at.exception, at.exception
+print(json.dumps({{"app_first_run_ms": (time.perf_counter() - started) * 1000}}))
+"""
+
+
+def sample(code, tree):
+    env = {**os.environ, "PYTHONPATH": tree, "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "dummy")}
+    with tempfile.TemporaryDirectory() as cwd:  # fresh database, no .env from the repo
+        env["CHATBOT_DB"] = os.path.join(cwd, "startup.db")
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, timeout=300
+        )
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tree", default=ROOT, help="checkout to measure (default: this one)")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--app", action="store_true", help="also time the first frontend run (AppTest)")
+    args = parser.parse_args()
+    tree = os.path.abspath(args.tree)
+
+    sample(BACKEND, tree)  # warm the OS file cache / .pyc files
+    runs = []
+    for _ in range(args.samples):
+        row = sample(BACKEND, tree)
+        if args.app:
+            row.update(sample(APP.format(tree=tree), tree))
+        runs.append(row)
+
+    result = {"tree": tree, "samples": args.samples}
+    for key in runs[0]:
+        result[key] = round(statistics.median(r[key] for r in runs), 1)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Stock tool: one fresh `requests.get` per symbol vs the pooled multi-symbol tool.
+
+Runs against the local stand-in quote server (no API key, no network):
+
+    python -m benchmarks.bench_stock_quotes --symbols 5 --latency 0.2 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import requests
+
+from benchmarks.fake_quote_server import start_quote_server
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="server delay per quote (s)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server, url = start_quote_server(latency=args.latency)
+    os.environ["ALPHAVANTAGE_URL"] = url
+    os.environ["TOOL_CACHE"] = "0"  # measure the HTTP path, not the cache
+    from chat_tools import get_stock_price
+
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    def old_tool():
+        # previous implementation: one tool round trip per symbol, new connection each time
+        for s in symbols:
+            requests.get(f"{url}?function=GLOBAL_QUOTE&symbol={s}&apikey=demo").json()
+
+    def pooled_sync():
+        get_stock_price.invoke({"symbols": symbols})
+
+    def pooled_async():
+        asyncio.run(get_stock_price.ainvoke({"symbols": symbols}))
+
+    results = {
+        "symbols": args.symbols,
+        "server_latency_ms": args.latency * 1000,
+        "sequential_requests_ms": timed(old_tool, args.rounds),
+        "pooled_sync_ms": timed(pooled_sync, args.rounds),
+        "pooled_async_ms": timed(pooled_async, args.rounds),
+    }
+    print(json.dumps(results))
+
+    # retries + timeouts: two 503s are retried, a hung symbol costs one read timeout
+    server.shutdown()
+    server, url = start_quote_server(fail_first=2, hang=("HANG",))
+    os.environ["ALPHAVANTAGE_URL"] = url
+    started = time.perf_counter()
+    out = get_stock_price.invoke({"symbols": ["AAPL", "HANG"]})
+    print(json.dumps({
+        "retried_ok": "Global Quote" in out["AAPL"],
+        "hung_symbol": out["HANG"].get("error", "")[:60],
+        "elapsed_s": round(time.perf_counter() - started, 1),
+    }))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
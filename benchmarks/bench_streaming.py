@@ -0,0 +1,105 @@
+"""Token coalescing (stream_utils.coalesce) vs handing every chunk to the UI.
+
+A producer thread emits a long answer (prose + a code block, some empty / non-text
+chunks) every `--token-delay` seconds into a queue, like the graph's executor does;
+the consumer stands in for `st.write_stream`: every delta costs `--delta-cost` (websocket
+message) plus `--render-per-char` times the message length so far (the browser
+re-renders the whole markdown message).
+
+Reported per mode: deltas sent, total render time, time to first text, how long after
+the last token the answer is fully shown (lag) and the largest backlog of chunks
+produced but not yet rendered.
+
+    python -m benchmarks.bench_streaming --chunks 2000
+"""
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+
+from stream_utils import StreamStats, coalesce
+
+DONE = object()
+
+
+def answer_chunks(n, seed=0):
+    rng = random.Random(seed)
+    words = "the graph streams tokens to the browser and every delta re-renders the markdown".split()
+    chunks = []
+    while len(chunks) < n:
+        if rng.random() < 0.1:  # a code block, line by line
+            chunks += ["\n```python\n"] + [f"x{i} = compute({i})\n" for i in range(rng.randint(3, 8))] + ["```\n"]
+        elif rng.random() < 0.03:
+            chunks.append("")  # empty / non-text chunk
+        else:
+            word = rng.choice(words)
+            chunks.append(" " + word + ("." if rng.random() < 0.08 else ""))
+    return chunks[:n]
+
+
+def run(mode, chunks, args):
+    items = queue.Queue()
+    produced = {"count": 0, "last": None}
+
+    def produce():
+        for chunk in chunks:
+            time.sleep(args.token_delay)
+            produced["count"] += 1
+            items.put(chunk)
+        produced["last"] = time.perf_counter()
+        items.put(DONE)
+
+    def source():
+        while (item := items.get()) is not DONE:
+            yield item
+
+    stats = StreamStats()
+    if mode == "coalesced":
+        stream = coalesce(source(), interval=args.interval, stats=stats)
+    else:
+        stream = coalesce(source(), interval=0, max_delay=0, render_factor=0, stats=stats)
+
+    started = time.perf_counter()
+    threading.Thread(target=produce, daemon=True).start()
+    shown, first, backlog, rendered = 0, None, 0, 0
+    for delta in stream:
+        if first is None:
+            first = time.perf_counter() - started
+        shown += len(delta)
+        time.sleep(args.delta_cost + args.render_per_char * shown)  # websocket + markdown re-render
+        rendered = stats.chunks
+        backlog = max(backlog, produced["count"] - rendered)
+    finished = time.perf_counter()
+    summary = stats.summary()
+    return {
+        "mode": mode,
+        "chunks": summary["chunks"],
+        "skipped": summary["skipped"],
+        "deltas": summary["flushes"],
+        "render_ms": summary["render_ms"],
+        "render_lag_max_ms": summary["render_lag_max_ms"],
+        "first_text_ms": round(first * 1000, 1),
+        "done_after_last_token_ms": round((finished - produced["last"]) * 1000, 1),
+        "max_backlog_chunks": backlog,
+        "total_ms": round((finished - started) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--token-delay", type=float, default=0.003, help="seconds between produced chunks")
+    parser.add_argument("--delta-cost", type=float, default=0.001, help="fixed seconds per delta")
+    parser.add_argument("--render-per-char", type=float, default=1e-6, help="seconds per character of the message, per delta")
+    parser.add_argument("--interval", type=float, default=0.05, help="coalescing window (s)")
+    args = parser.parse_args()
+
+    chunks = answer_chunks(args.chunks)
+    for mode in ("per_chunk", "coalesced"):
+        print(json.dumps(run(mode, chunks, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Turn throughput through chat workers (chat_worker.py) as the number of worker processes grows.
+
+Starts `--workers` worker processes serving a scripted backend (no Gemini calls): every
+answer is `--tokens` chunks, each after `--token-delay` seconds of waiting (the model
+API) and `--cpu-ms` of Python work (graph, callbacks, serialization; holds the GIL).
+`--users` client threads then run turns through `chat_client.ChatClient` for
+`--duration` seconds, each on its own thread id, and half of the streams are dropped
+after a few events and resumed from the last event id.
+
+One JSON line per worker count: turns/s, p50 / p95 turn latency, resumed streams and
+whether every resumed answer matched the full one.
+
+    python -m benchmarks.bench_worker --workers 1 2 4 --users 32
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from chat_client import ChatClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import sys, threading, time
+from langchain_core.messages import AIMessageChunk
+import chat_worker
+
+port, tokens, token_delay, cpu = int(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4]) / 1000
+
+class Scripted:
+    def stream_turn(self, thread_id, text):
+        for i in range(tokens):
+            time.sleep(token_delay)
+            deadline = time.perf_counter() + cpu
+            while time.perf_counter() < deadline:
+                pass
+            yield AIMessageChunk(content=f"{text}-{i} "), {"langgraph_node": "chat_node"}
+    def titles_version(self):
+        return 0
+    def rate_limit_stats(self):
+        return {}
+
+chat_worker.serve(Scripted(), port)
+print("ready", flush=True)
+threading.Event().wait()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_workers(n, args):
+    procs, urls = [], []
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    for _ in range(n):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-c", WORKER, str(port), str(args.tokens), str(args.token_delay), str(args.cpu_ms)],
+            env=env, stdout=subprocess.PIPE, text=True,
+        )
+        proc.stdout.readline()  # "ready"
+        procs.append(proc)
+        urls.append(f"http://127.0.0.1:{port}")
+    return procs, urls
+
+
+def run_level(n, args):
+    procs, urls = start_workers(n, args)
+    client = ChatClient(urls)
+    latencies, resumed, mismatched = [], [0], [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + args.duration
+
+    def user(u):
+        i = 0
+        while time.perf_counter() < stop:
+            thread_id, text = str(uuid.uuid4()), f"u{u}t{i}"
+            started = time.perf_counter()
+            turn_id = client.start_turn(thread_id, text)
+            if i % 2:
+                # drop the stream after a few events, pick it up again from the last id
+                seen = 0
+                events = client.turn_events(thread_id, turn_id)
+                for seen, _ in zip(range(1, 4), events):
+                    pass
+                events.close()
+                done = list(client.turn_events(thread_id, turn_id, after=seen))[-1]
+            else:
+                done = list(client.turn_events(thread_id, turn_id))[-1]
+            elapsed = time.perf_counter() - started
+            expected = "".join(f"{text}-{k} " for k in range(args.tokens))
+            with lock:
+                latencies.append(elapsed)
+                resumed[0] += i % 2
+                mismatched[0] += done["text"] != expected
+            i += 1
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(args.users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+
+    latencies.sort()
+    return {
+        "workers": n,
+        "users": args.users,
+        "turns": len(latencies),
+        "turns_per_sec": round(len(latencies) / wall, 2),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 1),
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "resumed": resumed[0],
+        "resumed_ok": mismatched[0] == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--tokens", type=int, default=40, help="chunks per answer")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds waiting per chunk")
+    parser.add_argument("--cpu-ms", type=float, default=2.0, help="ms of Python work per chunk")
+    args = parser.parse_args()
+
+    for n in args.workers:
+        print(json.dumps(run_level(n, args)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Deterministic, scripted chat model for offline benchmarks.
+
+Replays `script` in a loop: a string step is streamed back as text tokens, a dict
+step `{"tool_calls": [{"name": ..., "args": {...}}]}` becomes an AIMessage with
+tool calls. `latency` is the delay before the first token and `token_delay` the gap
+between tokens, both honoured by the sync and the async code paths; `seconds`
+adds up the simulated time so benchmarks can subtract it from measured latencies.
+
+`FlakyChatModel` adds fault injection on top: a share of calls fails with a 503
+(`ServiceUnavailable`) before the first token, another share is slow.
+`QuotaChatModel` behaves like a provider quota: more than `rpm` calls in a sliding
+minute (`window` seconds) are answered with a 429 (`ResourceExhausted`).
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class ScriptedChatModel(BaseChatModel):
+    script: list[Any] = ["Hello from the scripted model. How can I help you today?"]
+    latency: float = 0.0
+    token_delay: float = 0.0
+    model_name: str = "scripted"
+
+    _steps: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _seconds: float = PrivateAttr(default=0.0)
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    @property
+    def calls(self):
+        return self._calls
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+    def _spend(self, seconds):
+        with self._lock:
+            self._seconds += seconds
+        return seconds
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next_step(self):
+        with self._lock:
+            if self._steps is None:
+                self._steps = itertools.cycle(self.script)
+            self._calls += 1
+            return next(self._steps)
+
+    @staticmethod
+    def _tokens(text):
+        words = text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _message(self, step):
+        if isinstance(step, dict):
+            tool_calls = [
+                {"name": c["name"], "args": c.get("args", {}), "id": c.get("id") or f"call_{uuid.uuid4().hex[:12]}"}
+                for c in step["tool_calls"]
+            ]
+            return AIMessage(content=step.get("content", ""), tool_calls=tool_calls)
+        return AIMessage(content=step)
+
+    def _chunks(self, message):
+        if message.tool_calls:
+            yield AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                    for i, c in enumerate(message.tool_calls)
+                ],
+            )
+            return
+        for token in self._tokens(message.content):
+            yield AIMessageChunk(content=token)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._message(self._next_step())
+        time.sleep(self._spend(self.latency + self.token_delay * len(self._tokens(message.content))))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._message(self._next_step())
+        await asyncio.sleep(self._spend(self.latency + self.token_delay * len(self._tokens(message.content))))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._message(self._next_step())
+        time.sleep(self._spend(self.latency))
+        for i, chunk in enumerate(self._chunks(message)):
+            if i:
+                time.sleep(self._spend(self.token_delay))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._message(self._next_step())
+        await asyncio.sleep(self._spend(self.latency))
+        for i, chunk in enumerate(self._chunks(message)):
+            if i:
+                await asyncio.sleep(self._spend(self.token_delay))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class FlakyChatModel(ScriptedChatModel):
+    fail_rate: float = 0.0
+    # the first `fail_first` calls always fail (an outage that is just ending)
+    fail_first: int = 0
+    slow_rate: float = 0.0
+    slow_latency: float = 5.0
+    seed: int = 0
+    model_name: str = "flaky"
+
+    _random: Any = PrivateAttr(default=None)
+    _attempts: int = PrivateAttr(default=0)
+    _failures: int = PrivateAttr(default=0)
+
+    @property
+    def failures(self):
+        return self._failures
+
+    def _fault(self):
+        """Extra delay for this call, or raise the injected 503."""
+        with self._lock:
+            if self._random is None:
+                self._random = random.Random(self.seed)
+            self._attempts += 1
+            fail = self._attempts <= self.fail_first or self._random.random() < self.fail_rate
+            slow = self._random.random() < self.slow_rate
+            if fail:
+                self._failures += 1
+        if fail:
+            raise ServiceUnavailable("503 The model is overloaded. Please try again later.")
+        return self.slow_latency if slow else 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._fault())
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._fault())
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._fault())
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._fault())
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+
+
+class QuotaChatModel(ScriptedChatModel):
+    rpm: float = 60
+    # length of the quota window; shorten it to compress time in a benchmark
+    window: float = 60.0
+    model_name: str = "quota"
+
+    _window: Any = PrivateAttr(default_factory=deque)
+    _rejected: int = PrivateAttr(default=0)
+
+    @property
+    def rejected(self):
+        return self._rejected
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._window and self._window[0] <= now - self.window:
+                self._window.popleft()
+            if len(self._window) >= self.rpm:
+                self._rejected += 1
+                raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+            self._window.append(now)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
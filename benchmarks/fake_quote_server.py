@@ -0,0 +1,87 @@
+"""Local stand-in for the Alpha Vantage GLOBAL_QUOTE endpoint.
+
+Answers `/query?function=GLOBAL_QUOTE&symbol=XYZ` with a deterministic quote after
+`latency` seconds. `fail_first` makes the first N requests return 503 (to exercise
+retries) and `hang` symbols never answer within the read timeout.
+
+    server, url = start_quote_server(latency=0.2)
+    os.environ["ALPHAVANTAGE_URL"] = url
+    ...
+    server.shutdown()
+
+or standalone: `python -m benchmarks.fake_quote_server --port 8765 --latency 0.2`
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_quote(symbol):
+    price = 50 + zlib.crc32(symbol.encode()) % 45000 / 100
+    return {
+        "Global Quote": {
+            "01. symbol": symbol,
+            "05. price": f"{price:.4f}",
+            "07. latest trading day": "2025-01-02",
+            "10. change percent": "0.4200%",
+        }
+    }
+
+
+class QuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail_first=0, hang=()):
+        super().__init__(address, QuoteHandler)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.hang = set(hang)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            failing = server.requests <= server.fail_first
+        query = parse_qs(urlparse(self.path).query)
+        symbol = query.get("symbol", [""])[0].upper()
+        if symbol in server.hang:
+            time.sleep(60)
+        time.sleep(server.latency)
+        if failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps(fake_quote(symbol)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_quote_server(port=0, **kwargs):
+    """Serve in a background thread; returns (server, base url for ALPHAVANTAGE_URL)."""
+    server = QuoteServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-quote-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/query"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    server = QuoteServer(("127.0.0.1", args.port), latency=args.latency)
+    print(f"ALPHAVANTAGE_URL=http://127.0.0.1:{args.port}/query")
+    server.serve_forever()
@@ -0,0 +1,77 @@
+"""Offline stand-ins for the chat tools, with configurable latency.
+
+Same names and argument shapes as chat_tools (`duckduckgo_results_json`,
+`get_stock_price`), deterministic results, a fixed delay per call (sync and async).
+The real `calculator` has no I/O and is used as is. `FakeTools.seconds` adds up
+the simulated time so benchmarks can subtract it from measured latencies.
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from langchain_core.tools import StructuredTool
+
+from chat_tools import calculator
+
+
+class FakeTools:
+    def __init__(self, latency=0.05, search_latency=None, quote_latency=None):
+        self.latency = {
+            "duckduckgo_results_json": latency if search_latency is None else search_latency,
+            "get_stock_price": latency if quote_latency is None else quote_latency,
+        }
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.tools = [self._search(), self._stock(), calculator]
+
+    def _spent(self, name):
+        with self._lock:
+            self.calls += 1
+            self.seconds += self.latency[name]
+        return self.latency[name]
+
+    def _search(self):
+        name = "duckduckgo_results_json"
+
+        def search(query: str) -> str:
+            time.sleep(self._spent(name))
+            return _search_result(query)
+
+        async def asearch(query: str) -> str:
+            await asyncio.sleep(self._spent(name))
+            return _search_result(query)
+
+        return StructuredTool.from_function(
+            func=search, coroutine=asearch, name=name, description="Search the web (offline fake)."
+        )
+
+    def _stock(self):
+        name = "get_stock_price"
+
+        def quote(symbols: list[str]) -> dict:
+            time.sleep(self._spent(name))
+            return _quotes(symbols)
+
+        async def aquote(symbols: list[str]) -> dict:
+            await asyncio.sleep(self._spent(name))
+            return _quotes(symbols)
+
+        return StructuredTool.from_function(
+            func=quote, coroutine=aquote, name=name, description="Latest quotes for stock symbols (offline fake)."
+        )
+
+
+def _search_result(query: str) -> str:
+    return " ".join(
+        f"snippet: Result {i} about {query}, with a paragraph of text., title: {query} #{i}, link: https://example.com/{i}"
+        for i in range(4)
+    )
+
+
+def _quotes(symbols: Optional[list[str]]) -> dict:
+    return {
+        s.upper(): {"01. symbol": s.upper(), "05. price": f"{100 + len(s) * 7.25:.2f}", "10. change percent": "0.42%"}
+        for s in symbols or []
+    }
@@ -0,0 +1,178 @@
+"""Thin client for one or more chat workers (chat_worker.py), same functions as the backends.
+
+    CHAT_WORKER_URLS="http://127.0.0.1:8765,http://127.0.0.1:8766" streamlit run frontend_latest.py
+
+The Streamlit process then runs no graph, model or tool: turns are started on a worker
+and their events read over SSE. Every thread is routed to one worker (crc32 of the
+thread id), so the worker that runs a thread's turn also serves its resumable stream;
+a dropped stream is resumed from the last event id. Calls that aren't about one thread
+(sidebar pages, titles) go to any worker, they all share chatbot.db.
+"""
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import zlib
+from urllib.parse import quote, urlencode
+
+from chat_worker import ThreadBusyError, TurnNotFoundError
+
+TIMEOUT = 30  # seconds for plain requests; a stream may be quiet longer (keepalives every 15 s)
+STREAM_TIMEOUT = 60
+RESUME_ATTEMPTS = 5
+
+
+def _error(event):
+    """Rebuild the exception a turn failed with, so callers can handle it like in-process turns."""
+    if event.get("kind") == "busy":
+        from rate_limiter import BusyError
+        return BusyError(event.get("model", "model"), event.get("retry_after", 0))
+    if event.get("kind") == "unavailable":
+        from resilient_llm import LLMUnavailableError
+        return LLMUnavailableError(event["message"])
+    return RuntimeError(event.get("message", "turn failed"))
+
+
+class ChatClient:
+    def __init__(self, urls, timeout=TIMEOUT):
+        self.urls = [u.rstrip("/") for u in urls]
+        self.timeout = timeout
+        self._next = 0
+
+    def worker_for(self, thread_id):
+        return self.urls[zlib.crc32(str(thread_id).encode()) % len(self.urls)]
+
+    def _any_worker(self):
+        self._next = (self._next + 1) % len(self.urls)
+        return self.urls[self._next]
+
+    def _call(self, method, url, payload=None, timeout=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            body = json.loads(e.read() or b"{}")
+            if e.code == 404 and body.get("error") == "turn_not_found":
+                raise TurnNotFoundError(body["turn_id"]) from None
+            if e.code == 409 and body.get("error") == "thread_busy":
+                raise ThreadBusyError(payload.get("thread_id"), body["turn_id"]) from None
+            raise RuntimeError(f"{method} {url}: {e.code} {body.get('error', '')}") from None
+
+    # ------------------------------------------------------------------ turns
+    def start_turn(self, thread_id, user_input):
+        url = self.worker_for(thread_id) + "/turns"
+        return self._call("POST", url, {"thread_id": thread_id, "text": user_input})["turn_id"]
+
+    def turn_events(self, thread_id, turn_id, after=0):
+        """Events of a turn (dicts, see chat_worker), resuming the SSE stream if it drops."""
+        url = f"{self.worker_for(thread_id)}/turns/{turn_id}/events"
+        attempts = 0
+        while True:
+            try:
+                for seq, event in self._sse(url, after):
+                    after, attempts = seq, 0
+                    if event["type"] == "error":
+                        raise _error(event)
+                    yield event
+                    if event["type"] == "done":
+                        return
+                # the stream ended before the turn did: resume below
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    raise TurnNotFoundError(turn_id) from None
+                raise
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                if attempts >= RESUME_ATTEMPTS:
+                    raise
+            attempts += 1
+            if attempts > RESUME_ATTEMPTS:
+                raise ConnectionError(f"lost the stream of turn {turn_id}")
+            time.sleep(min(0.2 * 2 ** attempts, 5))
+
+    def _sse(self, url, after):
+        request = urllib.request.Request(url, headers={"Accept": "text/event-stream", "Last-Event-ID": str(after)})
+        with urllib.request.urlopen(request, timeout=STREAM_TIMEOUT) as response:
+            seq, data = None, []
+            for raw in response:
+                line = raw.decode().rstrip("\r\n")
+                if not line:
+                    if data:
+                        yield seq, json.loads("\n".join(data))
+                    seq, data = None, []
+                elif line.startswith("id:"):
+                    seq = int(line[3:].strip())
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+
+    def stream_turn(self, thread_id, user_input):
+        """Start a turn and follow it to the end."""
+        return self.turn_events(thread_id, self.start_turn(thread_id, user_input))
+
+    # ---------------------------------------------------------------- threads
+    def list_chat_page(self, query=None, limit=20, offset=0):
+        params = urlencode({"query": query or "", "limit": limit, "offset": offset})
+        page = self._call("GET", f"{self._any_worker()}/threads?{params}")
+        return page["threads"], page["total"]
+
+    def search_messages(self, query, limit=20):
+        params = urlencode({"query": query, "limit": limit})
+        return self._call("GET", f"{self._any_worker()}/search?{params}")["hits"]
+
+    def retrieve_all_thread_ids(self):
+        return self._call("GET", f"{self._any_worker()}/threads/ids")["thread_ids"]
+
+    def load_conversation_page(self, thread_id, limit=20, before=None):
+        params = urlencode({"limit": limit, **({"before": before} if before is not None else {})})
+        page = self._call("GET", f"{self.worker_for(thread_id)}/threads/{quote(thread_id)}/messages?{params}")
+        return page["messages"], page["cursor"]
+
+    def delete_thread(self, thread_id):
+        self._call("DELETE", f"{self.worker_for(thread_id)}/threads/{quote(thread_id)}")
+
+    def delete_threads(self, thread_ids):
+        # each worker deletes (in one transaction) the threads routed to it, so its caches stay right
+        by_worker = {}
+        for thread_id in thread_ids:
+            by_worker.setdefault(self.worker_for(thread_id), []).append(thread_id)
+        return sum(
+            self._call("POST", f"{url}/threads/delete", {"thread_ids": ids})["deleted"]
+            for url, ids in by_worker.items()
+        )
+
+    # ----------------------------------------------------------------- titles
+    def get_chat_titles(self, thread_ids):
+        return self._call("POST", f"{self._any_worker()}/titles", {"thread_ids": list(thread_ids)})
+
+    def set_chat_title(self, thread_id, title):
+        self._call("PUT", f"{self.worker_for(thread_id)}/threads/{quote(thread_id)}/title", {"title": title})
+
+    def request_title(self, thread_id, user_input, ai_message):
+        url = f"{self.worker_for(thread_id)}/threads/{quote(thread_id)}/title-request"
+        return self._call("POST", url, {"user_input": user_input, "ai_message": ai_message})["title"]
+
+    # ------------------------------------------------------------------ stats
+    def _stats(self):
+        stats = {}
+        for url in self.urls:
+            try:
+                stats[url] = self._call("GET", url + "/stats", timeout=5)
+            except (OSError, RuntimeError):
+                continue  # a worker being restarted shouldn't break the sidebar
+        return stats
+
+    def titles_version(self):
+        # each worker has its own title worker, their versions only grow: the sum changes whenever one does
+        return sum(s["titles_version"] for s in self._stats().values())
+
+    def rate_limit_stats(self):
+        # limiters are per worker process
+        return {f"{url} {model}": s for url, stats in self._stats().items() for model, s in stats["rate_limits"].items()}
+
+
+def from_env():
+    """ChatClient for CHAT_WORKER_URLS (comma separated), or None to run the backend in-process."""
+    urls = [u.strip() for u in os.getenv("CHAT_WORKER_URLS", "").split(",") if u.strip()]
+    return ChatClient(urls) if urls else None
@@ -0,0 +1,64 @@
+from langgraph.graph import StateGraph, START, END
+from typing import TypedDict, Annotated, NotRequired
+from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt import tools_condition
+
+import metrics
+from parallel_tools import make_tool_node
+
+# Graph definition shared by the sync (backend_latest) and async (backend_async) backends.
+
+# define state
+
+class ChatState(TypedDict):
+
+    messages: Annotated[list[BaseMessage], add_messages]
+    # rolling summary of messages[:summarized_upto] (only used with a HistoryManager)
+    summary: NotRequired[str]
+    summarized_upto: NotRequired[int]
+
+
+# shown by the frontend when the model call fails for good (resilient_llm.LLMUnavailableError)
+OVERLOADED_MSG = "⚠️ Gemini service is temporarily overloaded. Please try again in a few seconds."
+
+# define graph-node
+# Errors are not turned into messages here: retries / hedging / fallback happen in
+# resilient_llm, failures are logged out of band and the exception ends the run, so
+# nothing error-shaped is checkpointed into the conversation.
+def make_chat_node(llm_with_tools, history=None):
+    def chat_node(state: ChatState):
+        # take user query from state (summary + recent tail when history is managed)
+        messages = history.window(state) if history else state['messages']
+        # send to llm
+        response = llm_with_tools.invoke(messages)
+        return {'messages': [response]}
+    return chat_node
+
+
+def make_async_chat_node(llm_with_tools, history=None):
+    async def chat_node(state: ChatState):
+        messages = history.window(state) if history else state['messages']
+        response = await llm_with_tools.ainvoke(messages)
+        return {'messages': [response]}
+    return chat_node
+
+
+# define graph
+def build_graph(chat_node, tools, history=None, is_async=False):
+    graph = StateGraph(ChatState)
+
+    # add nodes (timed when CHAT_METRICS=1, see metrics.py)
+    graph.add_node('chat_node', metrics.instrument_node('chat_node', chat_node))
+    # tool calls of one turn run concurrently (bounded pool, per-tool timeouts), see parallel_tools.py
+    graph.add_node("tools", metrics.instrument_node("tools", make_tool_node(tools)))
+    graph.add_edge(START, 'chat_node')
+    graph.add_edge('tools', 'chat_node')
+    if history is None:
+        graph.add_conditional_edges("chat_node",tools_condition)
+    else:
+        # chat_node -> tools | summarize | END, summarize runs after the answer is out
+        graph.add_node('summarize', metrics.instrument_node('summarize', history.asummarize if is_async else history.summarize))
+        graph.add_conditional_edges("chat_node", history.route, ["tools", "summarize", END])
+        graph.add_edge('summarize', END)
+    return graph
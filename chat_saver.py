@@ -0,0 +1,392 @@
+import json
+import os
+from contextlib import contextmanager, closing
+from datetime import datetime, timezone
+
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.sqlite.utils import search_where
+
+from message_log import MessageLog, MESSAGE_LOG_SCHEMA, is_ref
+from message_search import (
+    FTS5_SQL,
+    INSERT_SQL as INSERT_TEXT_SQL,
+    SEARCH_SCHEMA,
+    WATERMARK_SQL,
+    index_messages,
+    index_rows,
+    search_messages,
+    setup_search,
+)
+from thread_registry import (
+    REGISTRY_SCHEMA,
+    TOUCH_THREAD_SQL,
+    SET_TITLE_SQL,
+    SET_TITLE_IF_MISSING_SQL,
+    TITLES_JSON,
+    registry_backfilled,
+    setup_registry,
+    touch_thread,
+    backfill_registry,
+    set_title,
+    set_title_if_missing,
+    replace_title,
+    get_titles,
+    titles_query,
+    migrate_titles_json,
+)
+
+# every table with per-thread rows; thread_registry holds the title too
+THREAD_TABLES = ("checkpoints", "writes", "message_log", "thread_registry")
+SEARCH_TABLES = ("message_text",)  # only when message search is on (deleting rows there drops their index entries)
+DELETE_CHUNK = 500  # thread ids per statement, well under SQLite's bound-variable limit
+
+
+def delete_threads_statements(thread_ids, tables=THREAD_TABLES):
+    """(sql, params) deleting every row of `thread_ids`; shared by the sync and async savers."""
+    thread_ids = [str(t) for t in dict.fromkeys(thread_ids)]
+    for i in range(0, len(thread_ids), DELETE_CHUNK):
+        chunk = thread_ids[i:i + DELETE_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        for table in tables:
+            yield f"DELETE FROM {table} WHERE thread_id IN ({marks})", chunk
+
+
+def ensure_thread_indexes(cur, tables=THREAD_TABLES):
+    """Index thread_id wherever no index (primary key included) starts with it; returns the tables fixed.
+
+    Deletes by thread id are then index range scans, not full table scans (databases
+    written by older checkpointer versions may lack the composite primary keys)."""
+    fixed = []
+    for table in tables:
+        leading = set()
+        for row in cur.execute(f"PRAGMA index_list({table})").fetchall():
+            first = cur.execute(f"PRAGMA index_info({row[1]!r})").fetchone()
+            if first is not None:
+                leading.add(first[2])
+        if "thread_id" not in leading:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_thread_id ON {table} (thread_id)")
+            fixed.append(table)
+    return fixed
+
+
+class ChatSaver(SqliteSaver):
+    """SqliteSaver that also keeps the chatbot's side tables (thread registry) in sync.
+
+    Given a `db.Database`, writes go through its single writer connection (sharing its
+    write lock) and reads use the pooled read-only connections, so `get_state` and the
+    sidebar queries don't wait for an in-progress turn.
+
+    With `message_log=True` messages are written once to the append-only message_log
+    table and checkpoints only store references to them (see message_log.py).
+
+    User / assistant message text is indexed for full-text search as it is checkpointed
+    (see message_search.py).
+    """
+
+    search_enabled = False
+
+    def __init__(self, conn=None, *, db=None, serde=None, message_log=False):
+        super().__init__(conn if conn is not None else db.writer, serde=serde)
+        self.db = db
+        if db is not None:
+            self.lock = db.write_lock
+        self.log_messages = message_log
+        self.message_log = MessageLog(self.serde)
+
+    @contextmanager
+    def cursor(self, transaction=True):
+        if self.db is None or transaction:
+            with super().cursor(transaction) as cur:
+                yield cur
+            return
+        if not self.is_setup:
+            with self.lock:
+                self.setup()
+        with self.db.read() as cur:
+            yield cur
+
+    def get_tuple(self, config):
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is None or not is_ref(checkpoint_tuple.checkpoint["channel_values"].get("messages")):
+            return checkpoint_tuple
+        with self.cursor(transaction=False) as cur:
+            checkpoint = self.message_log.expand(
+                cur, checkpoint_tuple.config["configurable"]["thread_id"], checkpoint_tuple.checkpoint
+            )
+        return checkpoint_tuple._replace(checkpoint=checkpoint)
+
+    def message_page(self, thread_id, limit=20, before=None, keep=None):
+        """[(position, message)] for the last `limit` kept messages of the thread before `before`."""
+        # SqliteSaver.get_tuple: the latest checkpoint *without* expanding a message log reference
+        latest = super().get_tuple({"configurable": {"thread_id": str(thread_id), "checkpoint_ns": ""}})
+        if latest is None:
+            return []
+        messages = latest.checkpoint["channel_values"].get("messages", [])
+        if is_ref(messages):
+            with self.cursor(transaction=False) as cur:
+                return self.message_log.page(cur, thread_id, messages, limit, before, keep)
+        end = len(messages) if before is None else min(before, len(messages))
+        page = []
+        for pos in range(end - 1, -1, -1):
+            if keep is None or keep(messages[pos]):
+                page.append((pos, messages[pos]))
+                if len(page) == limit:
+                    break
+        return page[::-1]
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # same as SqliteSaver.list, but pending writes (and logged messages) are read on
+        # the same connection as the checkpoints, which is a pooled reader when we have one
+        where, params = search_where(config, filter, before)
+        query = f"""SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata
+        FROM checkpoints
+        {where}
+        ORDER BY checkpoint_id DESC"""
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        decoded = {}  # thread_id -> {seq: message}, consecutive checkpoints share most messages
+        with self.cursor(transaction=False) as cur, closing(cur.connection.cursor()) as wcur:
+            cur.execute(query, params)
+            for thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata in cur:
+                wcur.execute(
+                    "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+                writes = wcur.fetchall()
+                checkpoint = self.message_log.expand(
+                    wcur, thread_id, self.serde.loads_typed((type_, checkpoint)), decoded.setdefault(thread_id, {})
+                )
+                yield CheckpointTuple(
+                    _config(thread_id, checkpoint_ns, checkpoint_id),
+                    checkpoint,
+                    json.loads(metadata) if metadata is not None else {},
+                    _config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+                    [(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+                )
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        setup_registry(self.conn)
+        self.conn.executescript(MESSAGE_LOG_SCHEMA)
+        self.search_enabled = setup_search(self.conn)
+        ensure_thread_indexes(self.conn, self.thread_tables)
+        self.conn.commit()
+
+    @property
+    def thread_tables(self):
+        return THREAD_TABLES + (SEARCH_TABLES if self.search_enabled else ())
+
+    def migrate(self, titles_json=TITLES_JSON):
+        # one-shot migrations for databases created before the side tables existed
+        self.setup()
+        with self.cursor(transaction=False) as cur:
+            backfilled = registry_backfilled(cur)
+        if not backfilled:
+            backfill_registry(self)
+        if os.path.exists(titles_json):
+            with self.cursor() as cur:
+                migrate_titles_json(cur, titles_json)
+            try:
+                # keep the old file around, but don't import it again
+                os.replace(titles_json, titles_json + ".migrated")
+            except OSError:
+                pass  # another process got there first
+
+    def set_title(self, thread_id, title):
+        with self.cursor() as cur:
+            set_title(cur, thread_id, title, _now())
+
+    def set_title_if_missing(self, thread_id, title):
+        with self.cursor() as cur:
+            return set_title_if_missing(cur, thread_id, title, _now())
+
+    def replace_title(self, thread_id, expected, title):
+        with self.cursor() as cur:
+            return replace_title(cur, thread_id, expected, title)
+
+    def get_titles(self, thread_ids):
+        with self.cursor(transaction=False) as cur:
+            return get_titles(cur, thread_ids)
+
+    def search(self, query, limit=20):
+        """Full-text search over all threads, see message_search.search_messages."""
+        with self.cursor(transaction=False) as cur:
+            return search_messages(cur, query, limit) if self.search_enabled else []
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        if config["configurable"].get("checkpoint_ns", "") != "":
+            return super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        messages = checkpoint["channel_values"].get("messages", [])
+        stored = checkpoint
+        try:
+            if self.log_messages and messages:
+                # log rows go in first: a crash in between leaves unreferenced rows, never dangling refs
+                with self.cursor() as cur:
+                    ref = self.message_log.append(cur, thread_id, messages)
+                stored = {**checkpoint, "channel_values": {**checkpoint["channel_values"], "messages": ref}}
+            next_config = super().put(config, stored, metadata, new_versions)
+        except BaseException:
+            # e.g. the log commit failed: the cached index may name rows that were never written
+            self.message_log.forget(thread_id)
+            raise
+        with self.cursor() as cur:
+            touch_thread(cur, thread_id, checkpoint["ts"], len(messages))
+            if self.search_enabled:
+                index_messages(cur, thread_id, messages)  # only the positions added since the last put
+        return next_config
+
+    def delete_threads(self, thread_ids):
+        """Delete many threads (checkpoints, writes, logged messages, registry row and title)
+        in one transaction; returns the number of rows deleted."""
+        thread_ids = list(thread_ids)
+        deleted = 0
+        with self.cursor() as cur:
+            try:
+                for sql, params in delete_threads_statements(thread_ids, self.thread_tables):
+                    deleted += cur.execute(sql, params).rowcount
+            except BaseException:
+                self.conn.rollback()  # all or nothing, the next commit mustn't keep half of it
+                raise
+        for thread_id in thread_ids:
+            self.message_log.forget(thread_id)
+        return deleted
+
+    def delete_thread(self, thread_id):
+        self.delete_threads([thread_id])
+
+
+def _config(thread_id, checkpoint_ns, checkpoint_id):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+def _now():
+    # same format as checkpoint["ts"], so registry timestamps stay comparable
+    return datetime.now(timezone.utc).isoformat()
+
+
+class AsyncChatSaver(AsyncSqliteSaver):
+    """Async twin of ChatSaver for backend_async (registry + optional message log).
+
+    One-shot migrations (registry backfill) are left to the sync ChatSaver.migrate(),
+    which backend_async runs once at startup.
+    """
+
+    search_enabled = False
+
+    def __init__(self, conn, *, serde=None, message_log=False):
+        super().__init__(conn, serde=serde)
+        self.log_messages = message_log
+        self.message_log = MessageLog(self.serde)
+
+    async def setup(self):
+        if self.is_setup:
+            return
+        await super().setup()
+        async with self.lock:
+            await self.conn.executescript(REGISTRY_SCHEMA + MESSAGE_LOG_SCHEMA)
+            async with self.conn.execute(FTS5_SQL) as cur:
+                self.search_enabled = await cur.fetchone() is not None
+            if self.search_enabled:
+                await self.conn.executescript(SEARCH_SCHEMA)
+            await self.conn.commit()
+
+    @property
+    def thread_tables(self):
+        return THREAD_TABLES + (SEARCH_TABLES if self.search_enabled else ())
+
+    async def aget_tuple(self, config):
+        checkpoint_tuple = await super().aget_tuple(config)
+        if checkpoint_tuple is None or not is_ref(checkpoint_tuple.checkpoint["channel_values"].get("messages")):
+            return checkpoint_tuple
+        async with self.lock:
+            checkpoint = await self.message_log.aexpand(
+                self.conn, checkpoint_tuple.config["configurable"]["thread_id"], checkpoint_tuple.checkpoint
+            )
+        return checkpoint_tuple._replace(checkpoint=checkpoint)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        decoded = {}
+        # super().alist holds self.lock while it yields, so expand on the connection directly
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            thread_id = checkpoint_tuple.config["configurable"]["thread_id"]
+            checkpoint = await self.message_log.aexpand(
+                self.conn, thread_id, checkpoint_tuple.checkpoint, decoded.setdefault(thread_id, {})
+            )
+            yield checkpoint_tuple._replace(checkpoint=checkpoint)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        if config["configurable"].get("checkpoint_ns", "") != "":
+            return await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        messages = checkpoint["channel_values"].get("messages", [])
+        stored = checkpoint
+        try:
+            if self.log_messages and messages:
+                await self.setup()
+                async with self.lock:
+                    ref = await self.message_log.aappend(self.conn, thread_id, messages)
+                    await self.conn.commit()
+                stored = {**checkpoint, "channel_values": {**checkpoint["channel_values"], "messages": ref}}
+            next_config = await super().aput(config, stored, metadata, new_versions)
+        except BaseException:
+            self.message_log.forget(thread_id)
+            raise
+        async with self.lock:
+            await self.conn.execute(
+                TOUCH_THREAD_SQL, (thread_id, checkpoint["ts"], checkpoint["ts"], len(messages))
+            )
+            if self.search_enabled:
+                async with self.conn.execute(WATERMARK_SQL, (thread_id,)) as cur:
+                    start = (await cur.fetchone())[0]
+                await self.conn.executemany(INSERT_TEXT_SQL, index_rows(thread_id, messages, start))
+            await self.conn.commit()
+        return next_config
+
+    async def adelete_threads(self, thread_ids):
+        thread_ids = list(thread_ids)
+        deleted = 0
+        async with self.lock, self.conn.cursor() as cur:
+            try:
+                for sql, params in delete_threads_statements(thread_ids, self.thread_tables):
+                    await cur.execute(sql, params)
+                    deleted += cur.rowcount
+            except BaseException:
+                await self.conn.rollback()
+                raise
+            await self.conn.commit()
+        for thread_id in thread_ids:
+            self.message_log.forget(thread_id)
+        return deleted
+
+    async def adelete_thread(self, thread_id):
+        await self.adelete_threads([thread_id])
+
+    async def aset_title(self, thread_id, title):
+        await self.setup()
+        ts = _now()
+        async with self.lock:
+            await self.conn.execute(SET_TITLE_SQL, (str(thread_id), ts, ts, title))
+            await self.conn.commit()
+
+    async def aset_title_if_missing(self, thread_id, title):
+        await self.setup()
+        ts = _now()
+        async with self.lock, self.conn.execute(SET_TITLE_IF_MISSING_SQL, (str(thread_id), ts, ts, title)) as cur:
+            await self.conn.commit()
+            return cur.rowcount == 1
+
+    async def aget_titles(self, thread_ids):
+        await self.setup()
+        thread_ids = [str(t) for t in thread_ids]
+        titles = {}
+        async with self.lock:
+            for i in range(0, len(thread_ids), 500):
+                chunk = thread_ids[i:i + 500]
+                async with self.conn.execute(titles_query(len(chunk)), chunk) as cur:
+                    titles.update(await cur.fetchall())
+        return titles
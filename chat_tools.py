@@ -0,0 +1,185 @@
+from langchain_community.tools import DuckDuckGoSearchResults
+from langchain_core.tools import tool, StructuredTool
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from safe_math import evaluate_batch
+from tool_cache import ToolCache, wrap_tools, DEFAULT_TTLS
+
+# Tools (shared by the sync and the async backend)
+
+search_tool = DuckDuckGoSearchResults()
+
+tool_cache = ToolCache.from_env()
+CACHE_TOOLS = os.getenv("TOOL_CACHE", "1") != "0"
+QUOTE_TTL = DEFAULT_TTLS["get_stock_price"]
+
+
+@tool
+def calculator(expression: str = "", expressions: Optional[list[str]] = None) -> dict:
+    """
+    Evaluate arithmetic in ONE call: a single `expression`, or a batch of `expressions`
+    evaluated in order. Do the whole calculation here instead of one operation per call.
+    Supports numbers, + - * / // % ** (or ^), parentheses, pi, e and the functions
+    abs, round(x, digits), min, max, pow, sqrt, exp, log, log10, floor, ceil, sin, cos, tan.
+    In a batch, `name = expression` stores a value for later expressions, e.g.
+    ["cost = 150.25 * 10 + 4.95", "value = 165.1 * 10", "round((value - cost) / cost * 100, 2)"]
+    """
+    if expressions:
+        return {"results": evaluate_batch(expressions)}
+    return evaluate_batch([expression])[0]
+
+
+# Alpha Vantage: one pooled keep-alive session (bounded retries, connect/read timeouts)
+# and a shared async client. ALPHAVANTAGE_URL can point at a local stand-in server
+# (see benchmarks/fake_quote_server.py).
+STOCK_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+MAX_SYMBOLS = 10
+STOCK_RETRIES = 2
+STOCK_BACKOFF = 0.3  # seconds, doubled per retry
+STOCK_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_maxsize=16,
+    # retry connect errors and 429/5xx, but not read timeouts: a hung call costs one timeout
+    max_retries=Retry(
+        total=STOCK_RETRIES, read=0, backoff_factor=STOCK_BACKOFF,
+        status_forcelist=STOCK_RETRY_STATUSES, allowed_methods=("GET",),
+    ),
+))
+_session.mount("http://", _session.adapters["https://"])
+_quote_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stock-quote")
+# an AsyncClient belongs to one event loop: one per loop (backend_async has exactly one,
+# asyncio.run() callers get a fresh loop each time)
+_async_clients = {}  # event loop -> (httpx.AsyncClient, closer)
+
+
+def _stock_url() -> str:
+    # read per call: the backends run load_dotenv() after importing this module
+    return os.getenv("ALPHAVANTAGE_URL", "https://www.alphavantage.co/query")
+
+
+def _stock_params(symbol: str) -> dict:
+    return {"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": os.getenv("ALPHAVANTAGE_API_KEY", "RP2J23DYDVG9996S")}
+
+
+def _fetch_quote(symbol: str) -> dict:
+    r = _session.get(_stock_url(), params=_stock_params(symbol), timeout=STOCK_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+
+async def _close_on_shutdown(client):
+    # a suspended async generator: the loop's shutdown_asyncgens() (run by asyncio.run)
+    # finalizes it, which closes the client's connections on the loop that opened them
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def _async_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        for closed in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[closed]
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(STOCK_TIMEOUT[1], connect=STOCK_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            transport=httpx.AsyncHTTPTransport(retries=STOCK_RETRIES),  # connect errors only
+        )
+        closer = _close_on_shutdown(client)
+        await closer.asend(None)
+        _async_clients[loop] = (client, closer)
+    return _async_clients[loop][0]
+
+
+def _retry_delay(response, attempt):
+    # Retry-After (seconds) when the API sends one, like urllib3's Retry on the sync session
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return min(float(retry_after), STOCK_TIMEOUT[1])
+    return STOCK_BACKOFF * 2 ** attempt
+
+
+async def _afetch_quote(symbol: str) -> dict:
+    client = await _async_client()
+    # 429/5xx are retried with backoff, as the sync session's Retry does
+    for attempt in range(STOCK_RETRIES + 1):
+        r = await client.get(_stock_url(), params=_stock_params(symbol))
+        if r.status_code not in STOCK_RETRY_STATUSES or attempt == STOCK_RETRIES:
+            break
+        await asyncio.sleep(_retry_delay(r, attempt))
+    r.raise_for_status()
+    return r.json()
+
+
+def _is_quote(result) -> bool:
+    # don't cache Alpha Vantage errors / rate-limit notes
+    return isinstance(result, dict) and bool(result.get("Global Quote"))
+
+
+def _symbols(symbols) -> list:
+    if isinstance(symbols, str):
+        symbols = symbols.replace(",", " ").split()
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))[:MAX_SYMBOLS]
+
+
+def _quote(symbol: str) -> dict:
+    try:
+        if CACHE_TOOLS:
+            # cached per symbol, so "AAPL" and ["AAPL", "TSLA"] share the AAPL entry
+            return tool_cache.get_or_call(
+                "get_stock_price", {"symbol": symbol}, QUOTE_TTL, lambda: _fetch_quote(symbol), _is_quote
+            )
+        return _fetch_quote(symbol)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+async def _aquote(symbol: str) -> dict:
+    try:
+        if CACHE_TOOLS:
+            return await tool_cache.aget_or_call(
+                "get_stock_price", {"symbol": symbol}, QUOTE_TTL, lambda: _afetch_quote(symbol), _is_quote
+            )
+        return await _afetch_quote(symbol)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def _get_stock_price(symbols: list[str]) -> dict:
+    symbols = _symbols(symbols)
+    return dict(zip(symbols, _quote_pool.map(_quote, symbols)))
+
+
+async def _aget_stock_price(symbols: list[str]) -> dict:
+    symbols = _symbols(symbols)
+    return dict(zip(symbols, await asyncio.gather(*(_aquote(s) for s in symbols))))
+
+
+get_stock_price = StructuredTool.from_function(
+    func=_get_stock_price,
+    coroutine=_aget_stock_price,
+    name="get_stock_price",
+    description="""
+    Fetch the latest stock quotes for one or more symbols (e.g. ['AAPL'] or
+    ['AAPL', 'TSLA', 'MSFT']) from Alpha Vantage in a single call.
+    Returns {symbol: quote}; a symbol that failed maps to {"error": ...}.
+    """,
+)
+
+
+# web search results go through one process-wide TTL cache (shared by all sessions);
+# stock quotes use the same cache per symbol (see _quote). TOOL_CACHE=0 turns it off
+tools = [search_tool, get_stock_price, calculator]
+if CACHE_TOOLS:
+    tools = wrap_tools(tools, tool_cache, ttls={"duckduckgo_results_json": DEFAULT_TTLS["duckduckgo_results_json"]})
@@ -0,0 +1,336 @@
+"""Chat worker: runs turns outside the Streamlit script run, over a small HTTP / SSE API.
+
+Generation used to happen inside the Streamlit script thread: a rerun or a closed tab
+mid-stream abandoned the turn, and every session's LLM work lived in the Streamlit
+server process. Here a turn runs in its own thread and its events are kept by turn id,
+so a client can disconnect and pick the stream up again (`?after=<last event id>`).
+
+`TurnManager` is used in-process by the backends too (`start_turn` / `turn_events`),
+`python chat_worker.py --port 8765` serves `backend_latest` over HTTP:
+
+    POST   /turns                       {"thread_id", "text"} -> 202 {"turn_id"} (409 if the thread is busy)
+    GET    /turns/<turn_id>/events      SSE: token / tool_call / tool / done / error, resumable
+                                        with ?after=N or Last-Event-ID
+    GET    /threads?query=&limit=&offset=   one sidebar page {"threads", "total"}
+    GET    /search?query=&limit=        full-text message search {"hits": [{thread_id, title, snippet, rank, ...}]}
+    GET    /threads/ids                 all thread ids, oldest -> newest activity
+    GET    /threads/<id>/messages?limit=&before=   {"messages", "cursor"}
+    DELETE /threads/<id>
+    POST   /threads/delete              {"thread_ids"} -> {"deleted": rows}, one transaction
+    POST   /titles                      {"thread_ids"} -> {thread_id: title}
+    PUT    /threads/<id>/title          {"title"}
+    POST   /threads/<id>/title-request  {"user_input", "ai_message"} -> {"title": placeholder}
+    GET    /stats                       titles version, rate limiters, running turns
+    GET    /health
+
+Several workers can share one chatbot.db (SQLite WAL); `chat_client.ChatClient` routes
+every thread to the same worker, so its turns and streams stay in one process.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+TURN_TTL = 600  # seconds a finished turn stays resumable
+KEEPALIVE = 15  # seconds between SSE comments on a quiet stream
+
+
+class TurnNotFoundError(KeyError):
+    """Unknown turn id (never started, expired or started on another worker)."""
+
+
+class ThreadBusyError(RuntimeError):
+    """The thread already has a turn running."""
+
+    def __init__(self, thread_id, turn_id):
+        super().__init__(f"thread {thread_id} is still answering (turn {turn_id})")
+        self.thread_id = thread_id
+        self.turn_id = turn_id
+
+
+def stream_events(pairs):
+    """(message_chunk, metadata) pairs of stream_mode="messages" -> UI events (dicts)."""
+    from langchain_core.messages import AIMessage, ToolMessage
+    from conversation import message_text
+
+    for chunk, metadata in pairs:
+        if isinstance(chunk, ToolMessage):
+            yield {"type": "tool", "name": getattr(chunk, "name", None) or "tool"}
+        # ONLY assistant tokens (not e.g. the history summarizer)
+        elif isinstance(chunk, AIMessage) and metadata.get("langgraph_node") == "chat_node":
+            if getattr(chunk, "tool_call_chunks", None) or chunk.tool_calls:
+                yield {"type": "tool_call"}
+            text = message_text(chunk)
+            if text:
+                yield {"type": "token", "text": text}
+
+
+def error_event(e):
+    from rate_limiter import BusyError
+    from resilient_llm import LLMUnavailableError
+
+    if isinstance(e, BusyError):
+        return {"type": "error", "kind": "busy", "model": e.model, "retry_after": e.retry_after, "message": str(e)}
+    if isinstance(e, LLMUnavailableError):
+        return {"type": "error", "kind": "unavailable", "message": str(e)}
+    return {"type": "error", "kind": "error", "message": f"{type(e).__name__}: {e}"}
+
+
+class Turn:
+    def __init__(self, thread_id, text):
+        self.id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.text = text
+        self.events = []
+        self.exception = None
+        self.finished_at = None
+        self.cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def add(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def follow(self, after=0, timeout=None):
+        """Events from index `after` on, as (seq, event); waits for new ones until the turn is done.
+
+        With `timeout`, yields (None, None) after that many quiet seconds (SSE keepalive)."""
+        while True:
+            with self.cond:
+                if len(self.events) <= after and not self.done:
+                    self.cond.wait(timeout)
+                batch = self.events[after:]
+                done = self.done
+            if not batch and not done and timeout is not None:
+                yield None, None
+            for event in batch:
+                after += 1
+                yield after, event
+            if done and after >= len(self.events):
+                return
+
+
+class TurnManager:
+    def __init__(self, stream_turn, ttl=TURN_TTL):
+        self.stream_turn = stream_turn
+        self.ttl = ttl
+        self.turns = {}
+        self.running = {}  # thread_id -> turn id
+        self._lock = threading.Lock()
+
+    def start(self, thread_id, text):
+        with self._lock:
+            self._expire()
+            if thread_id in self.running:
+                raise ThreadBusyError(thread_id, self.running[thread_id])
+            turn = Turn(thread_id, text)
+            self.turns[turn.id] = turn
+            self.running[thread_id] = turn.id
+        threading.Thread(target=self._run, args=(turn,), name=f"turn-{turn.id[:8]}", daemon=True).start()
+        return turn.id
+
+    def _run(self, turn):
+        answer, final = [], None
+        try:
+            for event in stream_events(self.stream_turn(turn.thread_id, turn.text)):
+                if event["type"] == "token":
+                    answer.append(event["text"])
+                turn.add(event)
+            final = {"type": "done", "text": "".join(answer)}
+        except Exception as e:
+            logger.warning("turn %s on thread %s failed: %s", turn.id, turn.thread_id, e)
+            turn.exception = e
+            final = error_event(e)
+        finally:
+            # free the thread before anyone sees the final event: a client that starts its next
+            # turn right after "done" must not get ThreadBusyError
+            with self._lock:
+                self.running.pop(turn.thread_id, None)
+            with turn.cond:
+                if final is not None:
+                    turn.events.append(final)
+                turn.finished_at = time.monotonic()
+                turn.cond.notify_all()
+
+    def _expire(self):
+        now = time.monotonic()
+        for turn_id in [t.id for t in self.turns.values() if t.done and now - t.finished_at > self.ttl]:
+            del self.turns[turn_id]
+
+    def get(self, turn_id):
+        with self._lock:
+            turn = self.turns.get(turn_id)
+        if turn is None:
+            raise TurnNotFoundError(turn_id)
+        return turn
+
+    def events(self, turn_id, after=0):
+        """Events of a turn from `after` on; an error event re-raises the turn's exception."""
+        turn = self.get(turn_id)
+        for _, event in turn.follow(after):
+            if event["type"] == "error":
+                raise turn.exception
+            yield event
+
+    def stats(self):
+        with self._lock:
+            return {"running": len(self.running), "kept": len(self.turns)}
+
+
+# ----------------------------------------------------------------------- HTTP
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    backend = None
+    turns = None
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            self._dispatch(method, parts, query)
+        except TurnNotFoundError as e:
+            self._json(404, {"error": "turn_not_found", "turn_id": e.args[0]})
+        except ThreadBusyError as e:
+            self._json(409, {"error": "thread_busy", "turn_id": e.turn_id})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away, the turn keeps running
+        except Exception as e:
+            logger.exception("%s %s failed", method, self.path)
+            self._json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _dispatch(self, method, parts, query):
+        backend = self.backend
+        match method, parts:
+            case "GET", ["health"]:
+                self._json(200, {"ok": True})
+            case "GET", ["stats"]:
+                self._json(200, {
+                    "titles_version": backend.titles_version(),
+                    "rate_limits": backend.rate_limit_stats(),
+                    "turns": self.turns.stats(),
+                })
+            case "POST", ["turns"]:
+                body = self._body()
+                turn_id = self.turns.start(body["thread_id"], body["text"])
+                self._json(202, {"turn_id": turn_id, "thread_id": body["thread_id"]})
+            case "GET", ["turns", turn_id, "events"]:
+                after = int(self.headers.get("Last-Event-ID") or query.get("after") or 0)
+                self._sse(self.turns.get(turn_id), after)
+            case "GET", ["threads"]:
+                rows, total = backend.list_chat_page(
+                    query.get("query") or None, int(query.get("limit", 20)), int(query.get("offset", 0))
+                )
+                self._json(200, {"threads": rows, "total": total})
+            case "GET", ["search"]:
+                self._json(200, {"hits": backend.search_messages(query.get("query", ""), int(query.get("limit", 20)))})
+            case "POST", ["threads", "delete"]:
+                self._json(200, {"deleted": backend.delete_threads(self._body()["thread_ids"])})
+            case "GET", ["threads", "ids"]:
+                self._json(200, {"thread_ids": backend.retrieve_all_thread_ids()})
+            case "GET", ["threads", thread_id, "messages"]:
+                before = query.get("before")
+                messages, cursor = backend.load_conversation_page(
+                    thread_id, int(query.get("limit", 20)), int(before) if before else None
+                )
+                self._json(200, {"messages": messages, "cursor": cursor})
+            case "DELETE", ["threads", thread_id]:
+                backend.delete_thread(thread_id)
+                self._json(200, {"deleted": thread_id})
+            case "POST", ["titles"]:
+                self._json(200, backend.get_chat_titles(self._body()["thread_ids"]))
+            case "PUT", ["threads", thread_id, "title"]:
+                backend.set_chat_title(thread_id, self._body()["title"])
+                self._json(200, {"thread_id": thread_id})
+            case "POST", ["threads", thread_id, "title-request"]:
+                body = self._body()
+                self._json(200, {"title": backend.request_title(thread_id, body["user_input"], body["ai_message"])})
+            case _:
+                self._json(404, {"error": "not_found"})
+
+    def _sse(self, turn, after):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for seq, event in turn.follow(after, timeout=KEEPALIVE):
+            if seq is None:
+                self.wfile.write(b": keepalive\n\n")
+            else:
+                self.wfile.write(f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # default 5: a burst of clients gets connection resets
+
+
+def serve(backend, port, host="127.0.0.1"):
+    """Serve `backend` (backend_latest's functions) on host:port from daemon threads; returns the server."""
+    handler = type("Handler", (_Handler,), {"backend": backend, "turns": TurnManager(backend.stream_turn)})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="chat-worker-http", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot graph over HTTP / SSE")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from backend_latest import get_backend
+
+    backend = get_backend()
+    backend.chatbot  # build everything before accepting turns
+    server = serve(backend, args.port, args.host)
+    logger.info("chat worker on http://%s:%d", args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
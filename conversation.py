@@ -0,0 +1,41 @@
+"""Tail-first, paginated conversation loading for the frontends.
+
+Opening a thread used to load every message through `chatbot.get_state` and turn all
+of them into `message_history`. `load_page` returns only the last `limit` displayable
+(user / assistant) messages plus a cursor for the page before them, so opening a
+thread costs the same however long it is. With CHECKPOINT_MESSAGE_LOG=1 only the
+rows of that page are read and decoded; otherwise the latest checkpoint is decoded
+once but only the page is converted and rendered.
+"""
+from langchain_core.messages import HumanMessage, AIMessage
+
+PAGE_SIZE = 20
+
+
+def message_text(message):
+    # Gemini may return content as a list of parts
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
+def is_displayable(message):
+    return isinstance(message, (HumanMessage, AIMessage)) and bool(message_text(message))
+
+
+def to_display(message):
+    return {'role': 'user' if isinstance(message, HumanMessage) else 'assistant', 'content': message_text(message)}
+
+
+def load_page(checkpointer, thread_id, limit=PAGE_SIZE, before=None):
+    """(messages as {'role', 'content'} dicts, cursor for the older page or None)."""
+    page = checkpointer.message_page(thread_id, limit=limit, before=before, keep=is_displayable)
+    if not page:
+        return [], None
+    oldest = page[0][0]
+    return [to_display(m) for _, m in page], (oldest if oldest > 0 else None)
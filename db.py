@@ -0,0 +1,128 @@
+"""SQLite connection manager for chatbot.db.
+
+One writer connection (guarded by `write_lock`, shared with the checkpointer) and a
+small pool of read-only connections. In WAL mode readers never block the writer and
+the writer never blocks readers, so loading the sidebar or a conversation does not
+queue behind a turn that is busy writing checkpoints.
+"""
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.getenv("CHATBOT_DB", "chatbot.db")
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # durable across app crashes in WAL mode, fsyncs only on checkpoint
+    "busy_timeout": 5000,  # ms to wait on a lock instead of failing with "database is locked"
+    "cache_size": -32000,  # negative = KiB, so ~32 MB page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def apply_pragmas(conn, readonly=False):
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def connect(path=DB_PATH, readonly=False):
+    # connections move between Streamlit script threads, but only ever one at a time
+    conn = sqlite3.connect(database=path, check_same_thread=False, timeout=PRAGMAS["busy_timeout"] / 1000)
+    return apply_pragmas(conn, readonly=readonly)
+
+
+async def aconnect(path=DB_PATH):
+    import aiosqlite
+
+    # check_same_thread=False: backend_async's sync code writes on this connection too (LoopLock)
+    conn = await aiosqlite.connect(path, timeout=PRAGMAS["busy_timeout"] / 1000, check_same_thread=False)
+    for name, value in PRAGMAS.items():
+        await conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class LoopLock:
+    """threading.Lock stand-in for an asyncio.Lock that belongs to `loop`, for sync code in other threads."""
+
+    def __init__(self, lock, loop):
+        self.lock = lock
+        self.loop = loop
+
+    def acquire(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            raise RuntimeError("LoopLock taken on its own event loop, use asyncio.to_thread")
+        asyncio.run_coroutine_threadsafe(self.lock.acquire(), self.loop).result()
+        return True
+
+    def release(self):
+        self.loop.call_soon_threadsafe(self.lock.release)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Database:
+    """Single writer + pooled readers on one SQLite file.
+
+    `writer` / `write_lock` default to a new connection and a threading.Lock; backend_async
+    passes the async saver's connection and a LoopLock instead, so it has one writer too.
+    """
+
+    def __init__(self, path=DB_PATH, readers=8, writer=None, write_lock=None):
+        self.path = path
+        self.writer = writer if writer is not None else connect(path)
+        self.write_lock = write_lock or threading.Lock()
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(readers)
+
+    @contextmanager
+    def write(self):
+        """Cursor on the writer connection; commits on success, rolls back on error."""
+        with self.write_lock:
+            cur = self.writer.cursor()
+            try:
+                yield cur
+                self.writer.commit()
+            except BaseException:
+                self.writer.rollback()
+                raise
+            finally:
+                cur.close()
+
+    @contextmanager
+    def read(self):
+        """Cursor on a pooled read-only connection (never waits for the writer)."""
+        with self._reader_slots:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = connect(self.path, readonly=True)
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+                conn.rollback()  # end the read snapshot so the WAL can be checkpointed
+                self._readers.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.writer.close()
@@ -1,21 +1,16 @@
 import streamlit as st
-from backend_rename_delete import chatbot, llm, retrieve_all_thread_ids, delete_thread
+from backend_rename_delete import chatbot, llm, retrieve_all_thread_ids, delete_thread, load_conversation_page, get_chat_titles, set_chat_title
 from langchain_core.messages import HumanMessage, AIMessage
-import uuid, json, os
+import uuid
 
 # **************************************** utility functions *************************
-TITLE_FILE = "chat_titles.json"
-
+# titles are stored in the database (thread_registry), session_state only caches them
 def load_chat_titles():
-    if os.path.exists(TITLE_FILE):
-        with open(TITLE_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    return get_chat_titles(st.session_state['chat_threads'])
 
-def save_chat_titles(titles_dict):
-    serializable_dict = {str(k): v for k, v in titles_dict.items()}
-    with open(TITLE_FILE, "w") as f:
-        json.dump(serializable_dict, f)
+def save_chat_title(thread_id, title):
+    set_chat_title(thread_id, title)  # single-row upsert
+    st.session_state['chat_titles'][thread_id] = title
 
 def generate_thread_id():
     return str(uuid.uuid4())
@@ -29,10 +24,23 @@ def reset_chat():
     st.session_state['thread_id'] = thread_id
     add_thread(thread_id)
     st.session_state['message_history'] = []
+    st.session_state['history_cursor'] = None
+
+PAGE_SIZE = 20
+
+# only the last PAGE_SIZE messages are loaded when a chat is opened, older ones on demand
+def open_thread(thread_id):
+    st.session_state['thread_id'] = thread_id
+    messages, cursor = load_conversation_page(thread_id, limit=PAGE_SIZE)
+    st.session_state['message_history'] = messages
+    st.session_state['history_cursor'] = cursor
 
-def load_conversation(thread_id):
-    state = chatbot.get_state(config={'configurable': {'thread_id': thread_id}})
-    return state.values.get('messages', [])
+def load_earlier_messages():
+    messages, cursor = load_conversation_page(
+        st.session_state['thread_id'], limit=PAGE_SIZE, before=st.session_state['history_cursor']
+    )
+    st.session_state['message_history'] = messages + st.session_state['message_history']
+    st.session_state['history_cursor'] = cursor
 
 # **************************************** Session Setup ******************************
 if 'chat_threads' not in st.session_state:
@@ -45,6 +53,9 @@ if 'thread_id' not in st.session_state:
 if 'message_history' not in st.session_state:
     st.session_state['message_history'] = []
 
+if 'history_cursor' not in st.session_state:
+    st.session_state['history_cursor'] = None
+
 if 'chat_titles' not in st.session_state:
     st.session_state['chat_titles'] = load_chat_titles()
 
@@ -68,14 +79,7 @@ for tid in st.session_state['chat_threads'][::-1]:
     # --- Select chat ---
     with col1:
         if st.button(title, key=f"chat_{tid}"):
-            st.session_state['thread_id'] = tid
-            messages = load_conversation(tid)
-            temp_messages = []
-            from langchain_core.messages import HumanMessage, AIMessage
-            for msg in messages:
-                role = 'user' if isinstance(msg, HumanMessage) else 'assistant'
-                temp_messages.append({'role': role, 'content': msg.content})
-            st.session_state['message_history'] = temp_messages
+            open_thread(tid)
             st.rerun()
 
     # --- Rename chat ---
@@ -91,8 +95,7 @@ for tid in st.session_state['chat_threads'][::-1]:
                 key=rename_key
             )
             if st.button("Save", key=f"save_{tid}"):
-                st.session_state['chat_titles'][tid] = new_title.strip()
-                save_chat_titles(st.session_state['chat_titles'])  # persist to JSON
+                save_chat_title(tid, new_title.strip())  # persist to the database
                 st.session_state[f"renaming_{tid}"] = False
                 st.rerun()
         # --- Delete chat ---
@@ -110,12 +113,10 @@ if st.session_state.get('confirm_delete'):
     with c1:
         if st.button("Yes, delete", key="confirm_yes"):
             delete_thread(tid)  # remove from database
-            # Remove from in-memory and title store
+            # Remove from in-memory state (the title went with the thread's registry row)
             if tid in st.session_state['chat_threads']:
                 st.session_state['chat_threads'].remove(tid)
-            if tid in st.session_state['chat_titles']:
-                st.session_state['chat_titles'].pop(tid)
-                save_chat_titles(st.session_state['chat_titles'])
+            st.session_state['chat_titles'].pop(tid, None)
             st.session_state.pop('confirm_delete', None)
             st.rerun()
     with c2:
@@ -128,6 +129,11 @@ if st.session_state.get('confirm_delete'):
 
 
 # **************************************** Main Chat UI ************************************
+if st.session_state['history_cursor'] is not None:
+    if st.button("⬆️ Load earlier messages", key="load_earlier"):
+        load_earlier_messages()
+        st.rerun()
+
 for message in st.session_state['message_history']:
     with st.chat_message(message['role']):
         st.markdown(message['content'])
@@ -159,6 +165,5 @@ if user_input:
         title_prompt = f"Summarize this chat topic in 5 words or fewer:\nUser: {user_input}\nAssistant: {ai_message}"
         title_response = llm.invoke([HumanMessage(content=title_prompt)])
         title_text = title_response.content.strip().replace('"', '')
-        st.session_state['chat_titles'][st.session_state['thread_id']] = title_text
-        save_chat_titles(st.session_state['chat_titles'])
+        save_chat_title(st.session_state['thread_id'], title_text)
         st.rerun()
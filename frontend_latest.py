@@ -1,52 +1,79 @@
 import streamlit as st
-from backend_latest import chatbot, llm1, retrieve_all_thread_ids, delete_thread
-from langchain_core.messages import HumanMessage, AIMessage ,ToolMessage
-import uuid, json, os
+import uuid, os
+from chat_worker import ThreadBusyError, TurnNotFoundError
+from stream_utils import FLUSH, StreamStats, coalesce_from_env
+
+# one backend per process, shared by every session and rerun; backend_latest builds its models,
+# tools and graph lazily (warm_up() at the end of the first run builds them in the background)
+@st.cache_resource(show_spinner="Starting the chatbot…")
+def load_backend():
+    # CHAT_WORKER_URLS=http://127.0.0.1:8765,... makes this a thin client of chat_worker.py processes
+    from chat_client import from_env
+    if client := from_env():
+        return client
+    # CHATBOT_ASYNC=1 runs turns on the async backend (aiosqlite + ainvoke on one event loop)
+    if os.getenv("CHATBOT_ASYNC") == "1":
+        import backend_async
+        return backend_async
+    from backend_latest import get_backend
+    backend = get_backend()
+    backend.checkpointer  # the sidebar needs the database right away
+    return backend
+
+backend = load_backend()
 
 # **************************************** utility functions *************************
-TITLE_FILE = "chat_titles.json"
-
-def load_chat_titles():
-    if os.path.exists(TITLE_FILE):
-        with open(TITLE_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_chat_titles(titles_dict):
-    serializable_dict = {str(k): v for k, v in titles_dict.items()}
-    with open(TITLE_FILE, "w") as f:
-        json.dump(serializable_dict, f)
+# titles are stored in the database (thread_registry), session_state only caches the ones seen in the sidebar
+def save_chat_title(thread_id, title):
+    backend.set_chat_title(thread_id, title)  # single-row upsert
+    st.session_state['chat_titles'][thread_id] = title
 
 def generate_thread_id():
     return str(uuid.uuid4())
 
-def add_thread(thread_id):
-    if thread_id not in st.session_state['chat_threads']:
-        st.session_state['chat_threads'].append(thread_id)
-
 def reset_chat():
     thread_id = generate_thread_id()
     st.session_state['thread_id'] = thread_id
-    add_thread(thread_id)
     st.session_state['message_history'] = []
+    st.session_state['history_cursor'] = None
 
-def load_conversation(thread_id):
-    state = chatbot.get_state(config={'configurable': {'thread_id': thread_id}})
-    return state.values.get('messages', [])
+PAGE_SIZE = 20
 
-# **************************************** Session Setup ******************************
-if 'chat_threads' not in st.session_state:
-    st.session_state['chat_threads'] = retrieve_all_thread_ids()
+# only the last PAGE_SIZE messages are loaded when a chat is opened, older ones on demand
+def open_thread(thread_id):
+    st.session_state['thread_id'] = thread_id
+    messages, cursor = backend.load_conversation_page(thread_id, limit=PAGE_SIZE)
+    st.session_state['message_history'] = messages
+    st.session_state['history_cursor'] = cursor
+
+def load_earlier_messages():
+    messages, cursor = backend.load_conversation_page(
+        st.session_state['thread_id'], limit=PAGE_SIZE, before=st.session_state['history_cursor']
+    )
+    st.session_state['message_history'] = messages + st.session_state['message_history']
+    st.session_state['history_cursor'] = cursor
 
+# **************************************** Session Setup ******************************
 if 'thread_id' not in st.session_state:
     st.session_state['thread_id'] = generate_thread_id()
-    add_thread(st.session_state['thread_id'])
 
 if 'message_history' not in st.session_state:
     st.session_state['message_history'] = []
 
+if 'history_cursor' not in st.session_state:
+    st.session_state['history_cursor'] = None
+
+# filled page by page by the conversation list
 if 'chat_titles' not in st.session_state:
-    st.session_state['chat_titles'] = load_chat_titles()
+    st.session_state['chat_titles'] = {}
+
+if 'chat_page' not in st.session_state:
+    st.session_state['chat_page'] = 0
+
+# threads still showing their keyword placeholder (thread_id -> placeholder)
+if 'pending_titles' not in st.session_state:
+    st.session_state['pending_titles'] = {}
+    st.session_state['titles_version'] = backend.titles_version()
 
 # **************************************** Sidebar UI *********************************
 st.sidebar.title('LangGraph Chatbot')
@@ -54,86 +81,183 @@ st.sidebar.title('LangGraph Chatbot')
 if st.sidebar.button('New Chat'):
     reset_chat()
 
+# queue depth / wait times of the shared Gemini rate limiters (only when LLM_RATE_LIMITS is set)
+if limits := backend.rate_limit_stats():
+    with st.sidebar.expander("🚦 LLM queue"):
+        st.json(limits)
+
 st.sidebar.header('My Conversations')
 
+# poll for background-generated titles, only while some of ours are still placeholders
+@st.fragment(run_every=2)
+def watch_titles():
+    version = backend.titles_version()
+    if version == st.session_state['titles_version']:
+        return
+    st.session_state['titles_version'] = version
+    pending = st.session_state['pending_titles']
+    fresh = backend.get_chat_titles(list(pending))
+    done = [tid for tid, placeholder in pending.items() if fresh.get(tid, placeholder) != placeholder]
+    for tid in done:
+        st.session_state['chat_titles'][tid] = fresh[tid]
+        pending.pop(tid)
+    if done:
+        st.rerun()
 
-# Show chat list with rename buttons
-for tid in st.session_state['chat_threads'][::-1]:
-    title = st.session_state['chat_titles'].get(tid, "New Chat...")
-    col1, col2, col3 = st.sidebar.columns([5, 1, 1])
-
-
-    # --- Select chat ---
-    with col1:
-    # Minimal highlight: add a subtle arrow prefix for the active thread (no CSS)
-        is_active = (st.session_state['thread_id'] == tid)
-        display_title = ("👉 " if is_active else "") + title
-
-        if st.button(display_title, key=f"chat_{tid}"):
-            st.session_state['thread_id'] = tid
-            messages = load_conversation(tid)
-            temp_messages = []
-            from langchain_core.messages import HumanMessage, AIMessage
-            for msg in messages:
-                if isinstance(msg, (HumanMessage, AIMessage)):  # skip tool messages
-                    role = 'user' if isinstance(msg, HumanMessage) else 'assistant'
-                    temp_messages.append({'role': role, 'content': msg.content})
-            st.session_state['message_history'] = temp_messages
+if st.session_state['pending_titles']:
+    with st.sidebar:
+        watch_titles()
+
+
+SIDEBAR_PAGE_SIZE = 20
+
+def set_chat_page(page):
+    st.session_state['chat_page'] = page
+
+# chats ticked in select mode, kept across pages / searches until they're deleted or select mode ends
+def toggle_selected(tid):
+    selected = st.session_state.setdefault('selected_chats', set())
+    if st.session_state[f"pick_{tid}"]:
+        selected.add(tid)
+    else:
+        selected.discard(tid)
+
+def clear_selected():
+    st.session_state['selected_chats'] = set()
+
+# Conversation list: one page of threads at a time, searched by title in SQLite (thread_registry),
+# so its cost doesn't grow with the number of chats. It is a fragment: searching and paging rerun
+# only this list; opening / renaming / deleting a chat reruns the whole app.
+@st.fragment
+def conversation_list():
+    in_messages = st.session_state.get('chat_search_messages', False)
+    query = st.text_input(
+        "Search chats", key="chat_search", label_visibility="collapsed",
+        placeholder="🔎 Search all messages" if in_messages else "🔎 Search by title",
+    )
+    st.toggle("Search in messages", key="chat_search_messages")
+    if query != st.session_state.get('chat_search_last', ""):
+        st.session_state['chat_search_last'] = query
+        st.session_state['chat_page'] = 0
+
+    # full-text search (FTS5 index, message_search.py): best matching message per chat, click to open it
+    if query and in_messages:
+        hits = backend.search_messages(query, limit=SIDEBAR_PAGE_SIZE)
+        if not hits:
+            st.caption("No messages found.")
+        for hit in hits:
+            tid = hit['thread_id']
+            if hit['title']:
+                st.session_state['chat_titles'][tid] = hit['title']  # the thread may not be on a sidebar page we've shown
+            title = st.session_state['chat_titles'].get(tid, "New Chat...")
+            if st.button(("👉 " if tid == st.session_state['thread_id'] else "") + title, key=f"hit_{tid}"):
+                open_thread(tid)
+                st.rerun()
+            st.caption(("🧑 " if hit['role'] == "user" else "🤖 ") + hit['snippet'])
+        return
+    page = st.session_state['chat_page']
+    rows, total = backend.list_chat_page(query or None, limit=SIDEBAR_PAGE_SIZE, offset=page * SIDEBAR_PAGE_SIZE)
+    if not rows and page > 0:  # the page emptied (deletes), go back to the last one
+        page = st.session_state['chat_page'] = max(0, (total - 1) // SIDEBAR_PAGE_SIZE)
+        rows, total = backend.list_chat_page(query or None, limit=SIDEBAR_PAGE_SIZE, offset=page * SIDEBAR_PAGE_SIZE)
+
+    # a new chat is only stored with its first message, until then it's pinned on top
+    current = st.session_state['thread_id']
+    if not query and page == 0 and not st.session_state['message_history'] and all(r['thread_id'] != current for r in rows):
+        rows = [{"thread_id": current, "title": None}] + rows
+
+    if not rows:
+        st.caption("No chats found." if query else "No chats yet.")
+
+    # select mode: tick chats (on any page) and delete them together
+    selecting = st.toggle("Select chats", key="chat_select_mode", on_change=clear_selected)
+    if selecting:
+        selected = st.session_state.setdefault('selected_chats', set())
+        if st.button(f"🗑️ Delete selected ({len(selected)})", key="delete_selected", disabled=not selected):
+            st.session_state['confirm_delete'] = list(selected)
             st.rerun()
 
+    for row in rows:
+        tid = row['thread_id']
+        if row['title']:
+            st.session_state['chat_titles'][tid] = row['title']
+        title = st.session_state['chat_titles'].get(tid, "New Chat...")
+        if selecting:
+            st.checkbox(title, value=tid in selected, key=f"pick_{tid}", on_change=toggle_selected, args=(tid,))
+            continue
+        col1, col2, col3 = st.columns([5, 1, 1])
+
+        # --- Select chat ---
+        with col1:
+            # Minimal highlight: add a subtle arrow prefix for the active thread (no CSS)
+            display_title = ("👉 " if tid == current else "") + title
+            if st.button(display_title, key=f"chat_{tid}"):
+                open_thread(tid)
+                st.rerun()
 
-    
-   # --- Rename chat (clean popup version) ---
-    with col2:
-        if st.button("✏️", key=f"rename_{tid}", help="Rename chat"):
-            st.session_state['rename_target'] = tid
-            st.session_state['show_rename_dialog'] = True
-            st.rerun()
+        # --- Rename chat (clean popup version) ---
+        with col2:
+            if st.button("✏️", key=f"rename_{tid}", help="Rename chat"):
+                st.session_state['rename_target'] = tid
+                st.session_state['show_rename_dialog'] = True
+                st.rerun()
 
         # --- Delete chat ---
-    with col3:
-        if st.button("🗑️", key=f"delete_{tid}", help="Delete chat"):
-            st.session_state['confirm_delete'] = tid  # mark this chat for confirmation
-            st.rerun()
+        with col3:
+            if st.button("🗑️", key=f"delete_{tid}", help="Delete chat"):
+                st.session_state['confirm_delete'] = [tid]  # mark this chat for confirmation
+                st.rerun()
 
-# --- Delete Confirmation Dialog ---
+    # --- Pager --- (callbacks run before the fragment reruns)
+    pages = max(1, -(-total // SIDEBAR_PAGE_SIZE))
+    if pages > 1:
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            st.button("◀", key="chat_page_prev", disabled=page == 0, on_click=set_chat_page, args=(page - 1,))
+        with info_col:
+            st.caption(f"Page {page + 1} / {pages} · {total} chats")
+        with next_col:
+            st.button("▶", key="chat_page_next", disabled=page >= pages - 1, on_click=set_chat_page, args=(page + 1,))
+
+with st.sidebar:
+    conversation_list()
+
+# --- Delete Confirmation Dialog --- (one chat or the ones ticked in select mode)
 if st.session_state.get("confirm_delete"):
-    tid = st.session_state["confirm_delete"]
-    title = st.session_state["chat_titles"].get(tid, "New Chat...")
+    tids = st.session_state["confirm_delete"]
+    if len(tids) == 1:
+        what = f"**'{st.session_state['chat_titles'].get(tids[0], 'New Chat...')}'**"
+    else:
+        what = f"**{len(tids)} chats**"
 
     @st.dialog("🗑️ Confirm Delete")
     def delete_chat_dialog():
-        st.markdown("### ⚠️ Delete Chat")
-        st.write(f"Are you sure you want to delete **'{title}'**? This action cannot be undone.")
+        st.markdown("### ⚠️ Delete Chat" if len(tids) == 1 else "### ⚠️ Delete Chats")
+        st.write(f"Are you sure you want to delete {what}? This action cannot be undone.")
         st.markdown("---")
 
         c1, c2 = st.columns(2)
         with c1:
             if st.button("✅ Yes, Delete", use_container_width=True):
-                delete_thread(tid)  # remove from database
+                # one transaction for all of them (titles included), space is reclaimed in the background
+                backend.delete_threads(tids)
 
-                # Update session state and local storage
-                if tid in st.session_state["chat_threads"]:
-                    st.session_state["chat_threads"].remove(tid)
-                if tid in st.session_state["chat_titles"]:
-                    st.session_state["chat_titles"].pop(tid)
-                    save_chat_titles(st.session_state["chat_titles"])
+                # Update session state
+                for tid in tids:
+                    st.session_state["chat_titles"].pop(tid, None)
+                    st.session_state["pending_titles"].pop(tid, None)
+                st.session_state["selected_chats"] = set()
 
-                st.toast("🗑️ Chat deleted successfully!", icon="⚡")
+                st.toast("🗑️ Chat deleted successfully!" if len(tids) == 1 else f"🗑️ {len(tids)} chats deleted!", icon="⚡")
                 st.session_state.pop("confirm_delete", None)
 
-                # ✅ Only reset if no chats left
-                if not st.session_state["chat_threads"]:
-                    reset_chat()
-                else:
-                    # ✅ If deleted chat was the current one, switch to another existing one
-                    if st.session_state["thread_id"] == tid:
-                        st.session_state["thread_id"] = st.session_state["chat_threads"][-1]
-                        messages = load_conversation(st.session_state["thread_id"])
-                        st.session_state["message_history"] = [
-                            {'role': 'user' if isinstance(m, HumanMessage) else 'assistant', 'content': m.content}
-                            for m in messages
-                        ]
+                # ✅ If the current chat was deleted, switch to the most recent one left (or a new chat)
+                if st.session_state["thread_id"] in tids:
+                    latest, _ = backend.list_chat_page(limit=1)
+                    if latest:
+                        open_thread(latest[0]['thread_id'])
+                    else:
+                        reset_chat()
 
                 st.rerun()
 
@@ -170,8 +294,8 @@ if st.session_state.get("show_rename_dialog", False):
             with c1:
                 if st.button("💾 Save", use_container_width=True):
                     if new_title.strip():
-                        st.session_state['chat_titles'][tid] = new_title.strip()
-                        save_chat_titles(st.session_state['chat_titles'])
+                        save_chat_title(tid, new_title.strip())
+                        st.session_state['pending_titles'].pop(tid, None)
                         st.toast("✅ Chat renamed successfully!", icon="✨")
                     st.session_state['show_rename_dialog'] = False
                     st.rerun()
@@ -185,6 +309,11 @@ if st.session_state.get("show_rename_dialog", False):
 
 
 # **************************************** Main Chat UI ************************************
+if st.session_state['history_cursor'] is not None:
+    if st.button("⬆️ Load earlier messages", key="load_earlier"):
+        load_earlier_messages()
+        st.rerun()
+
 for message in st.session_state['message_history']:
     # Skip any tool or empty assistant message
     if not message.get('content'):
@@ -196,28 +325,20 @@ for message in st.session_state['message_history']:
     with st.chat_message(message['role']):
         st.markdown(message['content'])
 
-user_input = st.chat_input('Type here')
-
-if user_input:
-    st.session_state['message_history'].append({'role': 'user', 'content': user_input})
-    with st.chat_message('user'):
-        st.markdown(user_input)
-
-    CONFIG = {'configurable': {'thread_id': st.session_state['thread_id']}}
-
+# Turns run outside this script (backend thread or chat worker, see chat_worker.py): the answer is
+# read from the turn's events, so a rerun / closed tab mid-stream doesn't abandon it; the next run
+# shows it again from the start. Returns True when a title placeholder was set (sidebar needs a rerun).
+def finish_turn(thread_id, turn_id, user_input):
     with st.chat_message("assistant"):
         # Use a mutable holder so the generator can set/modify it
         status_holder = {"box": None}
 
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
-                {"messages": [HumanMessage(content=user_input)]},
-                config=CONFIG,
-                stream_mode="messages",
-            ):
+            for event in backend.turn_events(thread_id, turn_id):
                 # Lazily create & update the SAME status container when any tool runs
-                if isinstance(message_chunk, ToolMessage):
-                    tool_name = getattr(message_chunk, "name", "tool")
+                if event["type"] == "tool":
+                    yield FLUSH  # show buffered text before the tool status
+                    tool_name = event["name"]
                     if status_holder["box"] is None:
                         status_holder["box"] = st.status(
                             f"🔧 Using `{tool_name}` …", expanded=True
@@ -228,12 +349,40 @@ if user_input:
                             state="running",
                             expanded=True,
                         )
-
-                # Stream ONLY assistant tokens
-                if isinstance(message_chunk, AIMessage):
-                    yield message_chunk.content
-
-        ai_message = st.write_stream(ai_only_stream())
+                elif event["type"] == "tool_call":
+                    yield FLUSH  # tools are about to run
+                # ONLY assistant tokens (not e.g. the history summarizer), filtered by the backend
+                elif event["type"] == "token":
+                    yield event["text"]
+
+        # chunks are coalesced into fewer, larger deltas (stream_utils.py, STREAM_FLUSH_MS)
+        stream_stats = StreamStats()
+        try:
+            ai_message = st.write_stream(coalesce_from_env(ai_only_stream(), stream_stats))
+        except TurnNotFoundError:
+            # the turn is gone (expired, worker restarted): show what was saved with the thread
+            st.session_state.pop('active_turn', None)
+            open_thread(thread_id)
+            st.rerun()
+        except Exception as e:
+            # retries / fallback already happened in the backend (resilient_llm.py); the error is
+            # only shown, it is not part of the conversation (imported here: the model stack is
+            # loaded by the time a turn has run, not on the first page render)
+            from chat_graph import OVERLOADED_MSG
+            from resilient_llm import LLMUnavailableError
+            from rate_limiter import BusyError
+            st.session_state.pop('active_turn', None)
+            if status_holder["box"] is not None:
+                status_holder["box"].update(label="❌ Tool run interrupted", state="error", expanded=False)
+            if isinstance(e, BusyError):
+                # our own rate limiter is full: answer right away instead of queueing into a timeout
+                st.warning(f"🚦 The assistant is busy right now, please try again in {e.retry_after:.0f} seconds.")
+            else:
+                st.error(OVERLOADED_MSG if isinstance(e, LLMUnavailableError) else f"❌ Unexpected error: {e}")
+            st.stop()
+        finally:
+            # chunks / flushes per second, render lag (also exported with CHAT_METRICS=1)
+            st.session_state['last_stream_stats'] = stream_stats.summary()
 
         # Finalize only if a tool was actually used
         if status_holder["box"] is not None:
@@ -241,15 +390,47 @@ if user_input:
                 label="✅ Tool finished", state="complete", expanded=False
             )
 
+    st.session_state.pop('active_turn', None)
     st.session_state['message_history'].append({'role': 'assistant', 'content': ai_message})
 
-    if st.session_state['thread_id'] not in st.session_state['chat_titles']:
-        title_prompt = f"Summarize this chat topic in 5 words or fewer:\nUser: {user_input}\nAssistant: {ai_message}"
-        title_response = llm1.invoke([HumanMessage(content=title_prompt)])
-        title_text = title_response.content.strip().replace('"', '')
-        st.session_state['chat_titles'][st.session_state['thread_id']] = title_text
-        save_chat_titles(st.session_state['chat_titles'])
-        st.rerun()
+    if thread_id not in st.session_state['chat_titles']:
+        # instant keyword placeholder, the LLM title arrives in the background (title_worker.py)
+        placeholder = backend.request_title(thread_id, user_input, ai_message)
+        if placeholder is None:  # it has a title already (not on the sidebar page we've seen)
+            st.session_state['chat_titles'].update(backend.get_chat_titles([thread_id]))
+            return False
+        st.session_state['chat_titles'][thread_id] = placeholder
+        st.session_state['pending_titles'][thread_id] = placeholder
+        return True
+    return False
+
+user_input = st.chat_input('Type here')
+needs_rerun = False
 
+# a turn of this chat interrupted by the previous rerun: show it (again) until it's done
+active = st.session_state.get('active_turn')
+if active and active['thread_id'] != st.session_state['thread_id']:
+    st.session_state.pop('active_turn')  # another chat is open: it finishes and is saved in the background
+elif active:
+    needs_rerun |= finish_turn(**active)
+
+if user_input:
+    tid = st.session_state['thread_id']
+    try:
+        turn_id = backend.start_turn(tid, user_input)
+    except ThreadBusyError:
+        # e.g. started from another tab; it shows up in this chat once it's saved
+        st.warning("⏳ This chat is still answering a previous message, please wait a moment.")
+        st.stop()
+    st.session_state['active_turn'] = {'thread_id': tid, 'turn_id': turn_id, 'user_input': user_input}
+    st.session_state['message_history'].append({'role': 'user', 'content': user_input})
+    with st.chat_message('user'):
+        st.markdown(user_input)
+    needs_rerun |= finish_turn(tid, turn_id, user_input)
 
+if needs_rerun:
+    st.rerun()
 
+# the page is rendered: load models / tools / graph in the background, before the first message
+if hasattr(backend, "warm_up"):
+    backend.warm_up()
@@ -1,24 +1,16 @@
 import streamlit as st
-from backend_sql import chatbot,llm,retrieve_all_thread_ids
+from backend_sql import chatbot,llm,retrieve_all_thread_ids,get_chat_titles,set_chat_title
 from langchain_core.messages import HumanMessage, AIMessage
 import uuid
 
 # **************************************** utility functions *************************
-import json, os
-
-TITLE_FILE = "chat_titles.json"
-
+# titles are stored in the database (thread_registry), session_state only caches them
 def load_chat_titles():
-    if os.path.exists(TITLE_FILE):
-        with open(TITLE_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
+    return get_chat_titles(st.session_state['chat_threads'])
 
-def save_chat_titles(titles_dict):
-    serializable_dict = {str(k): v for k, v in titles_dict.items()}
-    with open(TITLE_FILE, "w") as f:
-        json.dump(serializable_dict, f)
+def save_chat_title(thread_id, title):
+    set_chat_title(thread_id, title)  # single-row upsert
+    st.session_state['chat_titles'][thread_id] = title
 
 
 def generate_thread_id():
@@ -139,6 +131,5 @@ if user_input:
         title_prompt = f"Summarize this chat topic in 5 words or fewer:\nUser: {user_input}\nAssistant: {ai_message}"
         title_response = llm.invoke([HumanMessage(content=title_prompt)])
         title_text = title_response.content.strip().replace('"', '')
-        st.session_state['chat_titles'][st.session_state['thread_id']] = title_text
-        save_chat_titles(st.session_state['chat_titles'])
+        save_chat_title(st.session_state['thread_id'], title_text)
         st.rerun()  # Refresh sidebar to show new title 
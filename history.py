@@ -0,0 +1,138 @@
+"""Token-budgeted history window with a rolling summary (optional).
+
+Without it `chat_node` sends every message of the thread to Gemini, including old
+ToolMessages with full search payloads. With HISTORY_TOKEN_BUDGET set, the model
+only sees
+
+    [summary of older turns] + [verbatim tail of recent turns that fits the budget]
+
+The summary is extended incrementally by a `summarize` node running on the cheap
+`llm1` model. It only runs once enough messages have fallen out of the window (not
+every turn), after the answer has already been streamed, and its tokens are never
+streamed to the UI. Until then those messages are still sent verbatim, so the prompt
+can go over the budget by up to `summarize_after` tokens.
+
+The full message list stays in the state, so the UI history is unchanged.
+"""
+import os
+
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph import END
+from langgraph.prebuilt import tools_condition
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+
+Current summary:
+{summary}
+
+New messages to fold into the summary:
+{lines}
+
+Return the updated summary in at most {max_words} words. Keep names, numbers, decisions
+and open questions; drop pleasantries and raw tool output."""
+
+
+class HistoryManager:
+    def __init__(self, summary_model, token_budget=4000, summarize_after=None, max_summary_words=250):
+        self.summary_model = summary_model
+        self.token_budget = token_budget
+        # summarize once this many tokens have fallen out of the window (hysteresis)
+        self.summarize_after = summarize_after or token_budget // 4
+        self.max_summary_words = max_summary_words
+
+    @classmethod
+    def from_env(cls, summary_model):
+        budget = os.getenv("HISTORY_TOKEN_BUDGET")
+        if not budget:
+            return None
+        return cls(summary_model, token_budget=int(budget))
+
+    # ------------------------------------------------------------------ window
+    def tail_start(self, state):
+        """Index of the first message kept verbatim."""
+        messages = state['messages']
+        lo = min(state.get('summarized_upto', 0), len(messages))
+        budget = self.token_budget - count_tokens_approximately([self._summary_message(state)])
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, lo - 1, -1):
+            used += count_tokens_approximately([messages[i]])
+            if used > budget:
+                break
+            start = i
+        # begin the tail on a user turn so tool calls stay paired with their results
+        while start < len(messages) and not isinstance(messages[start], HumanMessage):
+            start += 1
+        if start >= len(messages):
+            # a single turn is bigger than the budget: keep it whole anyway
+            humans = [i for i in range(lo, len(messages)) if isinstance(messages[i], HumanMessage)]
+            start = humans[-1] if humans else lo
+        return start
+
+    def window(self, state):
+        """Messages to send to the model for this turn.
+
+        Everything after the summary: messages that fell out of the budget but haven't been
+        summarized yet (fewer than `summarize_after` tokens, give or take the current turn)
+        stay verbatim, otherwise the model would see neither them nor a summary of them."""
+        messages = state['messages']
+        tail = messages[min(state.get('summarized_upto', 0), len(messages)):]
+        if state.get('summary'):
+            return [self._summary_message(state)] + tail
+        return tail
+
+    def _summary_message(self, state):
+        return SystemMessage(content=f"Summary of the earlier conversation:\n{state.get('summary', '')}")
+
+    # --------------------------------------------------------------- summarize
+    def _overflow(self, state):
+        messages = state['messages']
+        return messages[state.get('summarized_upto', 0):self.tail_start(state)]
+
+    def needs_summary(self, state):
+        overflow = self._overflow(state)
+        return bool(overflow) and count_tokens_approximately(overflow) >= self.summarize_after
+
+    def route(self, state):
+        """Conditional edge after chat_node: tools first, then (maybe) summarize, else END."""
+        if tools_condition(state) == "tools":
+            return "tools"
+        if self.needs_summary(state):
+            return "summarize"
+        return END
+
+    def _prompt(self, state):
+        lines = "\n".join(_render(m) for m in self._overflow(state))
+        prompt = SUMMARY_PROMPT.format(
+            summary=state.get('summary') or "(empty)", lines=lines, max_words=self.max_summary_words
+        )
+        return [HumanMessage(content=prompt)]
+
+    def summarize(self, state):
+        upto = self.tail_start(state)
+        response = self.summary_model.invoke(self._prompt(state), config={"tags": [TAG_NOSTREAM]})
+        return {'summary': response.content.strip(), 'summarized_upto': upto}
+
+    async def asummarize(self, state):
+        upto = self.tail_start(state)
+        response = await self.summary_model.ainvoke(self._prompt(state), config={"tags": [TAG_NOSTREAM]})
+        return {'summary': response.content.strip(), 'summarized_upto': upto}
+
+
+def _render(message, limit=500):
+    if isinstance(message, HumanMessage):
+        role = "User"
+    elif isinstance(message, ToolMessage):
+        role = f"Tool ({message.name})"
+    elif isinstance(message, AIMessage):
+        role = "Assistant"
+        if message.tool_calls and not message.content:
+            return "Assistant called: " + ", ".join(c["name"] for c in message.tool_calls)
+    else:
+        role = message.type
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    if len(text) > limit:
+        text = text[:limit] + " …"
+    return f"{role}: {text}"
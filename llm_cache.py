@@ -0,0 +1,297 @@
+"""Deterministic LLM response cache (opt-in, LLM_CACHE=1).
+
+Both Gemini models run at temperature=0, so an identical prompt (same messages,
+same bound tools, same model) can be answered from a cache: common first questions,
+re-asked titles, branches regenerated after time travel.
+
+`CachedChatModel` wraps `llm.bind_tools(tools)` (or a bare model) and is used like
+it by chat_node / the title worker:
+
+- key = blake2b of the canonical messages (type, content, tool calls, tool results;
+  no message ids), the bound tool schemas and the model name
+- tier 1: in-process LRU with TTL, tier 2: `llm_cache` table in chatbot.db (TTL +
+  row cap, through the Database writer / reader pool)
+- on a miss the wrapped model is called (streamed when the graph streams) and its
+  tokens are passed through; the inner run is tagged nostream so LangGraph doesn't
+  stream them twice
+- on a hit the stored AIMessage is replayed as chunks, with fresh message / tool call
+  ids and `response_metadata["cache_hit"] = True`
+- answers a ResilientChatModel got from its hedge or fallback model are not stored
+- `stats()`: memory hits, db hits, misses, stores, evictions, not_stored, hit rate
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, Counter
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, message_chunk_to_message, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.constants import TAG_NOSTREAM
+
+LLM_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at);
+"""
+
+
+class LLMCache:
+    def __init__(self, db=None, max_entries=512, ttl=24 * 3600, max_rows=10000):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (expires_at, AIMessage)
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        if db is not None:
+            with db.write() as cur:
+                cur.executescript(LLM_CACHE_SCHEMA)
+
+    @classmethod
+    def from_env(cls, db=None):
+        if os.getenv("LLM_CACHE") != "1":
+            return None
+        return cls(
+            db,
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(24 * 3600))),
+            max_rows=int(os.getenv("LLM_CACHE_ROWS", "10000")),
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+        if self.db is not None:
+            with self.db.read() as cur:
+                row = cur.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            if row is not None:
+                message = messages_from_dict([json.loads(row[0])])[0]
+                self._remember(key, message, row[1])
+                self.counters["db_hits"] += 1
+                return message
+        self.counters["misses"] += 1
+        return None
+
+    def _remember(self, key, message, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, message)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def put(self, key, model, message):
+        now = time.time()
+        self._remember(key, message, now + self.ttl)
+        self.counters["stores"] += 1
+        if self.db is None:
+            return
+        with self.db.write() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(message_to_dict(message)), now, now + self.ttl),
+            )
+            if self.counters["stores"] % 100 == 0:
+                self._trim(cur, now)
+
+    def _trim(self, cur, now):
+        cur.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        cur.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+        self.counters["db_evictions"] += cur.rowcount
+
+    def stats(self):
+        stats = dict(self.counters)
+        hits = stats.get("memory_hits", 0) + stats.get("db_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        stats["entries"] = len(self._entries)
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def _canonical(message):
+    data = {"type": message.type, "content": message.content}
+    if getattr(message, "tool_calls", None):
+        data["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in message.tool_calls]
+    if message.type == "tool":
+        data["name"] = message.name
+    return data
+
+
+def _replay(message):
+    """Copy of a cached AIMessage with fresh ids (it may be served to many threads)."""
+    return message.model_copy(update={
+        "id": None,
+        "tool_calls": [{**c, "id": f"call_{uuid.uuid4().hex[:12]}"} for c in message.tool_calls],
+        "response_metadata": {**message.response_metadata, "cache_hit": True},
+    })
+
+
+def _chunks(message):
+    """Stream a cached message back: word-sized text chunks, tool calls in the last one."""
+    content = message.content
+    words = content.split(" ") if isinstance(content, str) and content else [content]
+    tokens = [w + " " for w in words[:-1]] + words[-1:]
+    for i, token in enumerate(tokens):
+        last = i == len(tokens) - 1
+        yield AIMessageChunk(
+            content=token,
+            response_metadata=message.response_metadata if i == 0 else {},
+            tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": j}
+                for j, c in enumerate(message.tool_calls)
+            ] if last else [],
+            usage_metadata=message.usage_metadata if last else None,
+        )
+
+
+class CachedChatModel(BaseChatModel):
+    inner: Any
+    # not `cache`: BaseChatModel already has a field with that name (langchain's own cache)
+    response_cache: Any
+    model_name: str = ""
+    tools_key: str = ""
+
+    @property
+    def _llm_type(self):
+        return "cached-" + self.model_name
+
+    def _key(self, messages, stop):
+        payload = {
+            "model": self.model_name,
+            "tools": self.tools_key,
+            "stop": stop,
+            "messages": [_canonical(m) for m in messages],
+        }
+        return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode(), digest_size=20).hexdigest()
+
+    @staticmethod
+    def _inner_config(run_manager):
+        # the inner call inherits the node's config from context; nostream: LangGraph must not
+        # stream the inner model's tokens, we pass them on ourselves
+        return {"tags": [TAG_NOSTREAM]}
+
+    @staticmethod
+    def _stop(stop):
+        return {"stop": stop} if stop else {}
+
+    def _store(self, key, message):
+        # the key names this model: an answer from a hedge / fallback model (ResilientChatModel's
+        # served_by) must not be replayed as if the primary had given it
+        served_by = message.response_metadata.get("served_by")
+        if served_by and served_by != self.model_name:
+            self.response_cache.counters["not_stored"] += 1
+            return
+        # only complete answers: no empty or errored responses
+        if message.content or message.tool_calls:
+            self.response_cache.put(key, self.model_name, message.model_copy(update={"id": None}))
+
+    # ------------------------------------------------------------------ sync
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=_replay(cached))])
+        message = self.inner.invoke(messages, config=self._inner_config(run_manager), **self._stop(stop))
+        self._store(key, message)
+        return ChatResult(generations=[ChatGeneration(message=message.model_copy(update={"id": None}))])
+
+    @staticmethod
+    def _token(chunk):
+        return chunk.content if isinstance(chunk.content, str) else ""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            chunks = _chunks(_replay(cached))
+        else:
+            chunks = self._pass_through(key, self.inner.stream(messages, config=self._inner_config(run_manager), **self._stop(stop)))
+        for chunk in chunks:
+            if run_manager:
+                run_manager.on_llm_new_token(self._token(chunk), chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    def _pass_through(self, key, stream):
+        full = None
+        for chunk in stream:
+            chunk = chunk.model_copy(update={"id": None})
+            full = chunk if full is None else full + chunk
+            yield chunk
+        if full is not None:
+            self._store(key, message_chunk_to_message(full))
+
+    # ------------------------------------------------------------------ async
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop)
+        cached = await asyncio.to_thread(self.response_cache.get, key)
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=_replay(cached))])
+        message = await self.inner.ainvoke(messages, config=self._inner_config(run_manager), **self._stop(stop))
+        await asyncio.to_thread(self._store, key, message)
+        return ChatResult(generations=[ChatGeneration(message=message.model_copy(update={"id": None}))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages, stop)
+        cached = await asyncio.to_thread(self.response_cache.get, key)
+        if cached is not None:
+            chunks = _aiter(_chunks(_replay(cached)))
+        else:
+            chunks = self._apass_through(key, self.inner.astream(messages, config=self._inner_config(run_manager), **self._stop(stop)))
+        async for chunk in chunks:
+            if run_manager:
+                await run_manager.on_llm_new_token(self._token(chunk), chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _apass_through(self, key, stream):
+        full = None
+        async for chunk in stream:
+            chunk = chunk.model_copy(update={"id": None})
+            full = chunk if full is None else full + chunk
+            yield chunk
+        if full is not None:
+            await asyncio.to_thread(self._store, key, message_chunk_to_message(full))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _model_name(model):
+    return str(getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__)
+
+
+def cached_model(model, cache, tools=None):
+    """`model.bind_tools(tools)` (or `model`) behind `cache`; returns the plain binding if cache is None."""
+    bound = model.bind_tools(tools) if tools else model
+    if cache is None:
+        return bound
+    tools_key = ""
+    if tools:
+        schemas = [convert_to_openai_tool(t) for t in tools]
+        tools_key = hashlib.blake2b(json.dumps(schemas, sort_keys=True).encode(), digest_size=16).hexdigest()
+    return CachedChatModel(inner=bound, response_cache=cache, model_name=_model_name(model), tools_key=tools_key)
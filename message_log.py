@@ -0,0 +1,200 @@
+"""Append-only per-thread message log for the checkpointer.
+
+With `add_messages` state, every checkpoint row normally stores the whole `messages`
+channel again, so a 200-message thread rewrites its old messages hundreds of times.
+In message-log mode each message is written once to `message_log` and the checkpoint
+only keeps a list of log sequence numbers:
+
+    {"__message_log__": [0, 1, 2, ...]}
+
+The saver expands that reference back into messages on read, so `get_state` and the
+graph see exactly the same state as before. Old checkpoints (full message lists) keep
+loading as-is, which makes the mode safe to switch on for an existing chatbot.db.
+"""
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+MESSAGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_log (
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    msg_hash TEXT NOT NULL,
+    role TEXT,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, seq)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_message_log_hash ON message_log (thread_id, msg_hash);
+"""
+
+REF_KEY = "__message_log__"
+
+INSERT_SQL = "INSERT INTO message_log (thread_id, seq, msg_hash, role, type, value) VALUES (?, ?, ?, ?, ?, ?)"
+INDEX_SQL = "SELECT msg_hash, seq FROM message_log WHERE thread_id = ?"
+FETCH_SQL = "SELECT seq, type, value FROM message_log WHERE thread_id = ? AND seq BETWEEN ? AND ?"
+PAGE_SQL = FETCH_SQL + " AND role IN ('human', 'ai')"
+DELETE_SQL = "DELETE FROM message_log WHERE thread_id = ?"
+
+
+def is_ref(value):
+    return isinstance(value, dict) and REF_KEY in value
+
+
+class MessageLog:
+    """Turns message lists into log references and back.
+
+    Keeps a small in-process index per thread (hash -> seq, and message id -> the
+    exact object already logged), so a put only serializes messages it has not seen.
+    The caller must hold the saver's write lock around `plan()` + inserting its rows, and
+    `forget()` the thread if that transaction doesn't commit (the index already has the rows).
+    """
+
+    def __init__(self, serde, max_threads=256):
+        self.serde = serde
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, thread_id, rows=None):
+        with self._lock:
+            index = self._threads.get(thread_id)
+            if index is None and rows is not None:
+                index = {"by_hash": dict(rows), "by_id": {}}
+                index["next"] = max(index["by_hash"].values(), default=-1) + 1
+                self._threads[thread_id] = index
+                while len(self._threads) > self.max_threads:
+                    self._threads.popitem(last=False)
+            if index is not None:
+                self._threads.move_to_end(thread_id)
+            return index
+
+    def forget(self, thread_id):
+        with self._lock:
+            self._threads.pop(str(thread_id), None)
+
+    def plan(self, thread_id, messages, index):
+        """Return (reference, rows to insert) for `messages`."""
+        seqs, rows = [], []
+        by_id = index["by_id"]
+        for message in messages:
+            cached = by_id.get(message.id) if message.id else None
+            if cached is not None and cached[0] is message:
+                seqs.append(cached[1])
+                continue
+            type_, value = self.serde.dumps_typed(message)
+            msg_hash = hashlib.blake2b(value, digest_size=16).hexdigest()
+            seq = index["by_hash"].get(msg_hash)
+            if seq is None:
+                seq = index["next"]
+                index["next"] += 1
+                index["by_hash"][msg_hash] = seq
+                rows.append((thread_id, seq, msg_hash, message.type, type_, value))
+            if message.id:
+                by_id[message.id] = (message, seq)
+            seqs.append(seq)
+        return {REF_KEY: seqs}, rows
+
+    def append(self, cur, thread_id, messages, retry=True):
+        """Log any new messages of `thread_id` on `cur`; returns the reference to store."""
+        thread_id = str(thread_id)
+        index = self._index(thread_id)
+        if index is None:
+            index = self._index(thread_id, cur.execute(INDEX_SQL, (thread_id,)).fetchall())
+        try:
+            ref, rows = self.plan(thread_id, messages, index)
+            if rows:
+                cur.executemany(INSERT_SQL, rows)
+        except sqlite3.IntegrityError:
+            # another process appended to this thread: reload its index and try again
+            self.forget(thread_id)
+            if not retry:
+                raise
+            return self.append(cur, thread_id, messages, retry=False)
+        except BaseException:
+            # plan() already counted rows that may not be written: reload the index next time
+            self.forget(thread_id)
+            raise
+        return ref
+
+    async def aappend(self, conn, thread_id, messages):
+        thread_id = str(thread_id)
+        index = self._index(thread_id)
+        if index is None:
+            async with conn.execute(INDEX_SQL, (thread_id,)) as cur:
+                index = self._index(thread_id, await cur.fetchall())
+        try:
+            ref, rows = self.plan(thread_id, messages, index)
+            if rows:
+                await conn.executemany(INSERT_SQL, rows)
+        except BaseException:
+            self.forget(thread_id)
+            raise
+        return ref
+
+    def _decode(self, ref, rows, decoded):
+        found = {seq: (type_, value) for seq, type_, value in rows}
+        messages = []
+        for seq in ref[REF_KEY]:
+            if seq not in decoded:
+                decoded[seq] = self.serde.loads_typed(found[seq])
+            messages.append(decoded[seq])
+        return messages
+
+    def expand(self, cur, thread_id, checkpoint, decoded=None):
+        """Checkpoint with its message reference replaced by the logged messages.
+
+        `decoded` (seq -> message) can be shared across calls for the same thread, e.g.
+        when listing checkpoints, so each message is only fetched and decoded once.
+        """
+        ref = checkpoint["channel_values"].get("messages")
+        if not is_ref(ref):
+            return checkpoint
+        decoded = {} if decoded is None else decoded
+        rows = []
+        if missing := [seq for seq in ref[REF_KEY] if seq not in decoded]:
+            rows = cur.execute(FETCH_SQL, (str(thread_id), min(missing), max(missing))).fetchall()
+        return self._with_messages(checkpoint, self._decode(ref, rows, decoded))
+
+    async def aexpand(self, conn, thread_id, checkpoint, decoded=None):
+        ref = checkpoint["channel_values"].get("messages")
+        if not is_ref(ref):
+            return checkpoint
+        decoded = {} if decoded is None else decoded
+        rows = []
+        if missing := [seq for seq in ref[REF_KEY] if seq not in decoded]:
+            async with conn.execute(FETCH_SQL, (str(thread_id), min(missing), max(missing))) as cur:
+                rows = await cur.fetchall()
+        return self._with_messages(checkpoint, self._decode(ref, rows, decoded))
+
+    @staticmethod
+    def _with_messages(checkpoint, messages):
+        return {**checkpoint, "channel_values": {**checkpoint["channel_values"], "messages": messages}}
+
+    def page(self, cur, thread_id, ref, limit, before=None, keep=None):
+        """[(position, message)] for the last `limit` user/assistant messages before `before`.
+
+        Walks the reference backwards in small windows, fetching and decoding only the
+        human/ai rows it needs.
+        """
+        seqs = ref[REF_KEY]
+        end = len(seqs) if before is None else min(before, len(seqs))
+        page = []
+        while end > 0 and len(page) < limit:
+            start = max(0, end - 2 * limit)
+            window = seqs[start:end]
+            rows = {
+                seq: (type_, value)
+                for seq, type_, value in cur.execute(PAGE_SQL, (str(thread_id), min(window), max(window)))
+            }
+            for pos in range(end - 1, start - 1, -1):
+                if seqs[pos] not in rows:
+                    continue
+                message = self.serde.loads_typed(rows[seqs[pos]])
+                if keep is None or keep(message):
+                    page.append((pos, message))
+                    if len(page) == limit:
+                        break
+            end = start
+        return page[::-1]
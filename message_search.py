@@ -0,0 +1,199 @@
+"""Full-text search over every conversation (SQLite FTS5).
+
+Finding an old chat used to mean clicking through sidebar titles. The text of user and
+assistant messages is kept in `message_text` (one row per message, keyed by its
+position in the thread's message list) with an external-content FTS5 index on top,
+kept in sync by triggers.
+
+The index is maintained incrementally by the checkpointer, right after the checkpoint
+is committed (best effort: a failure there doesn't lose the checkpoint, the next put
+catches up). It assumes the `messages` channel only grows, so a put indexes the
+positions after the thread's last indexed one and never re-reads history. Forks,
+`update_state` or time travel to an older checkpoint break that assumption: rows for
+replaced positions keep their old text and the new messages there aren't indexed.
+Deleting a thread deletes its rows (and index entries) in the same transaction as its
+checkpoints.
+
+If this SQLite build has no FTS5, search is switched off and puts skip indexing.
+
+Run `python message_search.py` to index threads written before the index existed
+(idempotent, safe to run against a live chatbot.db).
+"""
+import logging
+import re
+import unicodedata
+
+from langchain_core.messages import HumanMessage
+
+from conversation import is_displayable, message_text
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_text (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (thread_id, seq)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    text, content='message_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS message_text_ai AFTER INSERT ON message_text BEGIN
+    INSERT INTO message_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS message_text_ad AFTER DELETE ON message_text BEGIN
+    INSERT INTO message_fts (message_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# positions below this are indexed already (or not displayable)
+WATERMARK_SQL = "SELECT COALESCE(MAX(seq) + 1, 0) FROM message_text WHERE thread_id = ?"
+INSERT_SQL = "INSERT OR IGNORE INTO message_text (thread_id, seq, role, text) VALUES (?, ?, ?, ?)"
+FTS5_SQL = "SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_FTS5'"
+
+# bm25 is computed for every row it orders: only the most recent RANK_WINDOW matches are
+# ranked, so a word found in half of all messages costs the same as one found in 5000
+RANK_WINDOW = 5000
+RANK_SQL = """
+SELECT rowid, rank FROM (
+    SELECT rowid, rank FROM message_fts WHERE message_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+)
+ORDER BY rank
+LIMIT ?
+"""
+
+
+def hits_sql(count):
+    return f"""
+        SELECT t.id, t.thread_id, t.seq, t.role, t.text, r.title
+        FROM message_text t
+        LEFT JOIN thread_registry r ON r.thread_id = t.thread_id
+        WHERE t.id IN ({','.join('?' * count)})
+    """
+
+
+def fts5_available(cur):
+    return cur.execute(FTS5_SQL).fetchone() is not None
+
+
+def setup_search(cur):
+    """Create the table / index / triggers; returns False when FTS5 isn't available."""
+    if not fts5_available(cur):
+        logger.warning("SQLite was built without FTS5, message search is disabled")
+        return False
+    # executescript commits any open transaction, so only call this at startup
+    cur.executescript(SEARCH_SCHEMA)
+    return True
+
+
+def index_rows(thread_id, messages, start=0):
+    """INSERT_SQL rows for the displayable messages at positions >= start."""
+    rows = []
+    for seq in range(start, len(messages)):
+        message = messages[seq]
+        if is_displayable(message):
+            role = "user" if isinstance(message, HumanMessage) else "assistant"
+            rows.append((str(thread_id), seq, role, message_text(message)))
+    return rows
+
+
+def index_messages(cur, thread_id, messages):
+    """Index the messages added since the thread's last indexed position; returns rows added."""
+    start = cur.execute(WATERMARK_SQL, (str(thread_id),)).fetchone()[0]
+    rows = index_rows(thread_id, messages, start)
+    if rows:
+        cur.executemany(INSERT_SQL, rows)
+    return len(rows)
+
+
+def fts_query(words):
+    """Words -> FTS5 query: every word must match, the last one as a prefix (search as you type).
+
+    Words are quoted, so FTS5 syntax in the input ("AND", quotes, `*`, `:`) is just text."""
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+
+def _fold(word):
+    # what the unicode61 tokenizer compares: case and diacritics folded
+    return "".join(c for c in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(c))
+
+
+def make_snippet(text, words, size=12):
+    """About `size` words of `text` around the first match, matches in **bold**.
+
+    Built from the stored text: FTS5's snippet() re-reads the match for every row."""
+    exact, prefix = {_fold(w) for w in words[:-1]}, _fold(words[-1])
+    tokens = list(re.finditer(r"\w+", text))
+    if not tokens:
+        return text[:200]
+    hits = {i for i, m in enumerate(tokens) if _fold(m.group()) in exact or _fold(m.group()).startswith(prefix)}
+    start = max(0, min(min(hits) - size // 4 if hits else 0, len(tokens) - size))
+    end = min(len(tokens), start + size)
+    parts, pos = [], tokens[start].start()
+    for i in range(start, end):
+        m = tokens[i]
+        parts.append(text[pos:m.start()])
+        parts.append(f"**{m.group()}**" if i in hits else m.group())
+        pos = m.end()
+    if end == len(tokens):
+        parts.append(text[pos:])
+    return ("…" if start else "") + "".join(parts).strip() + ("…" if end < len(tokens) else "")
+
+
+def search_messages(cur, query, limit=20):
+    """Best matching messages, at most one per thread, best first.
+
+    Returns dicts with thread_id, title, seq (position in the thread), role, snippet
+    (matches in **bold**) and rank (bm25, lower is better)."""
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return []
+    # a thread often matches with several messages: rank a few more rows than threads wanted
+    ranked = cur.execute(RANK_SQL, (fts_query(words), RANK_WINDOW, limit * 5)).fetchall()
+    if not ranked:
+        return []
+    rows = {row[0]: row[1:] for row in cur.execute(hits_sql(len(ranked)), [rowid for rowid, _ in ranked])}
+    hits, seen = [], set()
+    for rowid, rank in ranked:
+        thread_id, seq, role, text, title = rows[rowid]
+        if thread_id in seen:
+            continue
+        seen.add(thread_id)
+        hits.append({
+            "thread_id": thread_id, "title": title, "seq": seq, "role": role,
+            "snippet": make_snippet(text, words), "rank": round(rank, 3),
+        })
+        if len(hits) == limit:
+            break
+    return hits
+
+
+def backfill_search(checkpointer):
+    """Index every thread's latest checkpoint (all positions, existing rows are kept); returns rows added."""
+    with checkpointer.cursor(transaction=False) as cur:
+        thread_ids = [row[0] for row in cur.execute("SELECT thread_id FROM thread_registry")]
+    added = 0
+    for thread_id in thread_ids:
+        state = checkpointer.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+        if state is None:
+            continue
+        rows = index_rows(thread_id, state.checkpoint["channel_values"].get("messages", []))
+        # one short transaction per thread, foreground turns get the write lock in between
+        with checkpointer.cursor() as cur:
+            cur.executemany(INSERT_SQL, rows)
+            added += max(cur.rowcount, 0)
+    return added
+
+
+if __name__ == "__main__":
+    from chat_saver import ChatSaver
+    from db import Database
+
+    saver = ChatSaver(db=Database())
+    saver.setup()
+    if not saver.search_enabled:
+        raise SystemExit("SQLite was built without FTS5")
+    print(f"Indexed {backfill_search(saver)} messages for search")
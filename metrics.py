@@ -0,0 +1,450 @@
+"""Latency instrumentation for the chatbot (opt-in, CHAT_METRICS=1).
+
+Where does a slow turn spend its time: the Gemini call, a tool, the checkpointer or
+Streamlit? With metrics on, the backends record histograms for
+
+- graph nodes (`chatbot_node_seconds{node="chat_node"|"tools"|"summarize"}`)
+- every tool call (`chatbot_tool_seconds{tool, status}`, from parallel_tools)
+- checkpointer calls (`chatbot_checkpoint_seconds{op="put"|"put_writes"|"get_tuple"|"list"}`)
+- stream milestones of a turn: total time, time to first token, streamed chunks / tokens
+- Streamlit render time per flushed piece (`chatbot_stream_render_seconds`), recorded by
+  stream_utils in the Streamlit process; turns run in TurnManager's worker threads, so the
+  traced stream itself is only ever consumed by a list append
+
+Export:
+
+- `prometheus_text()` / `snapshot()`; CHAT_METRICS_PORT=9464 serves both on
+  /metrics and /metrics.json from a daemon thread
+- CHAT_METRICS_JSONL=metrics.jsonl appends one JSON line per turn (its trace)
+- CHAT_TRACES=1 stores the per-turn trace in the `turn_traces` table next to the thread
+
+When CHAT_METRICS is not set nothing is wrapped: `instrument_*` return their argument
+unchanged and `observe` is a single `None` check.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TURN_TRACES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turn_traces (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    total_ms REAL,
+    ttft_ms REAL,
+    tokens INTEGER,
+    trace TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turn_traces_thread ON turn_traces (thread_id, id);
+"""
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}    # (name, labels) -> value
+
+    def observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus_text(self):
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        out = {}
+        with self._lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                out.setdefault(name, []).append({
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum_s": round(h.sum, 6),
+                    "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else None,
+                    **{f"p{q}_le_s": h.quantile(q / 100) for q in (50, 95, 99)},
+                })
+            for (name, labels), value in sorted(self.counters.items()):
+                out.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return out
+
+
+def _labels(labels, **extra):
+    items = list(labels) + [(k, v) for k, v in extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+# None while metrics are off; every hook checks this first
+REGISTRY = None
+TRACES = None  # TraceStore when CHAT_TRACES=1
+JSONL_PATH = None
+
+# trace of the turn being streamed in this context (copied into LangGraph's worker threads)
+_current_trace = contextvars.ContextVar("turn_trace", default=None)
+
+
+def enabled():
+    return REGISTRY is not None
+
+
+def observe(name, seconds, **labels):
+    if REGISTRY is None:
+        return
+    REGISTRY.observe(name, seconds, labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        # span names like "node:chat_node", "tool:calculator", "checkpoint:put"
+        kind = name.removeprefix("chatbot_").removesuffix("_seconds")
+        what = labels.get("node") or labels.get("tool") or labels.get("op")
+        trace.add(f"{kind}:{what}" if what else kind, seconds)
+
+
+def inc(name, value=1, **labels):
+    if REGISTRY is not None:
+        REGISTRY.inc(name, value, labels)
+
+
+def prometheus_text():
+    return REGISTRY.prometheus_text() if REGISTRY is not None else ""
+
+
+def snapshot():
+    return REGISTRY.snapshot() if REGISTRY is not None else {}
+
+
+# --------------------------------------------------------------------- wrappers
+def instrument_node(name, node):
+    """Time a graph node (plain sync / async function or Runnable); unchanged when metrics are off."""
+    if REGISTRY is None:
+        return node
+    # only needed once a graph is built, keeps `import metrics` light for the storage side of the backend
+    from langchain_core.runnables import Runnable, RunnableLambda
+
+    metric = "chatbot_node_seconds"
+    if isinstance(node, Runnable):
+        def run(state, config):
+            started = time.perf_counter()
+            try:
+                return node.invoke(state, config)
+            finally:
+                observe(metric, time.perf_counter() - started, node=name)
+
+        async def arun(state, config):
+            started = time.perf_counter()
+            try:
+                return await node.ainvoke(state, config)
+            finally:
+                observe(metric, time.perf_counter() - started, node=name)
+
+        return RunnableLambda(run, afunc=arun, name=getattr(node, "name", None) or name)
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await node(*args, **kwargs)
+            finally:
+                observe(metric, time.perf_counter() - started, node=name)
+        return timed_async
+
+    @functools.wraps(node)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return node(*args, **kwargs)
+        finally:
+            observe(metric, time.perf_counter() - started, node=name)
+    return timed
+
+
+def _timed_method(method, op):
+    metric = "chatbot_checkpoint_seconds"
+    if inspect.isasyncgenfunction(method):
+        async def timed_agen(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                async for item in method(*args, **kwargs):
+                    yield item
+            finally:
+                observe(metric, time.perf_counter() - started, op=op)
+        return timed_agen
+    if inspect.iscoroutinefunction(method):
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                observe(metric, time.perf_counter() - started, op=op)
+        return timed_async
+    if inspect.isgeneratorfunction(method):
+        def timed_gen(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                yield from method(*args, **kwargs)
+            finally:
+                observe(metric, time.perf_counter() - started, op=op)
+        return timed_gen
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            observe(metric, time.perf_counter() - started, op=op)
+    return timed
+
+
+def instrument_saver(saver):
+    """Time get_tuple / put / put_writes / list (and the a* variants) on this checkpointer instance."""
+    if REGISTRY is None:
+        return saver
+    for op in ("get_tuple", "put", "put_writes", "list"):
+        for name in (op, "a" + op):
+            # skip what only the base class provides (it raises NotImplementedError)
+            if getattr(type(saver), name, None) not in (None, getattr(BaseCheckpointSaver, name)):
+                setattr(saver, name, _timed_method(getattr(saver, name), op))
+    return saver
+
+
+# ----------------------------------------------------------------------- traces
+class TurnTrace:
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.chunks = 0
+        self.tokens = 0
+        self.spans = {}  # name -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def chunk(self, message_chunk, metadata):
+        if isinstance(message_chunk, AIMessage) and metadata.get("langgraph_node") == "chat_node":
+            if self.ttft is None and message_chunk.content:
+                self.ttft = time.perf_counter() - self.started
+            self.chunks += 1
+            usage = message_chunk.usage_metadata
+            self.tokens += usage.get("output_tokens", 0) if usage else 0
+
+    def to_dict(self, total, error=None):
+        return {
+            "thread_id": self.thread_id,
+            "ts": self.started_at,
+            "total_ms": round(total * 1000, 1),
+            "ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None else None,
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "spans": {name: {"count": c, "ms": round(s * 1000, 1)} for name, (c, s) in sorted(self.spans.items())},
+            **({"error": error} if error else {}),
+        }
+
+
+class TraceStore:
+    def __init__(self, db):
+        self.db = db
+        with db.write() as cur:
+            cur.executescript(TURN_TRACES_SCHEMA)
+
+    def save(self, trace):
+        with self.db.write() as cur:
+            cur.execute(
+                "INSERT INTO turn_traces (thread_id, ts, total_ms, ttft_ms, tokens, trace) VALUES (?, ?, ?, ?, ?, ?)",
+                (trace["thread_id"], trace["ts"], trace["total_ms"], trace["ttft_ms"], trace["tokens"], json.dumps(trace)),
+            )
+
+    def for_thread(self, thread_id, limit=20):
+        with self.db.read() as cur:
+            rows = cur.execute(
+                "SELECT trace FROM turn_traces WHERE thread_id = ? ORDER BY id DESC LIMIT ?", (str(thread_id), limit)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def forget(self, *thread_ids):
+        with self.db.write() as cur:
+            cur.executemany("DELETE FROM turn_traces WHERE thread_id = ?", [(str(t),) for t in thread_ids])
+
+
+def _finish(trace, error=None):
+    total = time.perf_counter() - trace.started
+    observe("chatbot_turn_seconds", total)
+    if trace.ttft is not None:
+        observe("chatbot_ttft_seconds", trace.ttft)
+    inc("chatbot_turns_total", status="error" if error else "ok")
+    inc("chatbot_stream_chunks_total", trace.chunks)
+    if trace.tokens:
+        inc("chatbot_stream_tokens_total", trace.tokens)
+    record = trace.to_dict(total, error)
+    if JSONL_PATH:
+        with open(JSONL_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    if TRACES is not None:
+        TRACES.save(record)
+
+
+def trace_turn(thread_id, stream):
+    """Pass a (message_chunk, metadata) stream through, recording the turn's trace and milestones."""
+    if REGISTRY is None:
+        return stream
+    return _traced(thread_id, stream)
+
+
+def _traced(thread_id, stream):
+    trace = TurnTrace(thread_id)
+    token = _current_trace.set(trace)
+    error = None
+    try:
+        for message_chunk, metadata in stream:
+            trace.chunk(message_chunk, metadata)
+            yield message_chunk, metadata
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        _finish(trace, error)
+
+
+def atrace_turn(thread_id, stream):
+    """Async variant of trace_turn."""
+    if REGISTRY is None:
+        return stream
+    return _atraced(thread_id, stream)
+
+
+async def _atraced(thread_id, stream):
+    trace = TurnTrace(thread_id)
+    token = _current_trace.set(trace)
+    error = None
+    try:
+        async for message_chunk, metadata in stream:
+            trace.chunk(message_chunk, metadata)
+            yield message_chunk, metadata
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        # the trace row / JSON line is written off the event loop
+        await asyncio.to_thread(_finish, trace, error)
+
+
+# ----------------------------------------------------------------------- export
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, kind = json.dumps(snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, kind = prometheus_text().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", kind)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_server = None
+
+
+def from_env(db=None):
+    """Turn metrics on from CHAT_METRICS / CHAT_METRICS_PORT / CHAT_METRICS_JSONL / CHAT_TRACES."""
+    global REGISTRY, TRACES, JSONL_PATH, _server
+    if os.getenv("CHAT_METRICS") != "1":
+        return None
+    REGISTRY = REGISTRY or Registry()
+    JSONL_PATH = os.getenv("CHAT_METRICS_JSONL") or None
+    if os.getenv("CHAT_TRACES") == "1" and db is not None and TRACES is None:
+        TRACES = TraceStore(db)
+    port = os.getenv("CHAT_METRICS_PORT")
+    if port and _server is None:
+        try:
+            _server = serve(int(port))
+        except OSError:
+            pass  # already served by another backend in this process / port taken
+    return REGISTRY
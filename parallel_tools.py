@@ -0,0 +1,143 @@
+"""Tool-execution node that runs the tool calls of one AIMessage concurrently.
+
+Drop-in for `ToolNode(tools)` in chat_graph.build_graph:
+
+- every call of the last AIMessage is started at once, on a bounded thread pool
+  shared by the whole process (sync graph) or as asyncio tasks (async graph)
+- per-tool concurrency limits (e.g. at most 2 DuckDuckGo searches in flight across
+  all sessions) and per-tool timeouts
+- a call that raises or times out becomes an error ToolMessage (status="error"), the
+  other results are still returned, so the model can answer with partial data
+- each ToolMessage carries its latency in `response_metadata["latency_ms"]`
+
+A turn with several tool calls therefore takes about as long as its slowest tool.
+A sync call that times out can't be killed: its thread finishes in the background
+(and holds its concurrency slot until then), but the turn no longer waits for it.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import nullcontext
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+import metrics
+
+# seconds; anything not listed gets TOOL_TIMEOUT (default 30)
+DEFAULT_TIMEOUTS = {
+    "calculator": 5,
+    "duckduckgo_results_json": 15,
+    "get_stock_price": 25,
+}
+
+# max calls in flight per tool, across all sessions of this process
+DEFAULT_LIMITS = {
+    "duckduckgo_results_json": 2,
+    "get_stock_price": 4,
+}
+
+
+def _error_message(call, text, latency):
+    metrics.observe("chatbot_tool_seconds", latency, tool=call["name"], status="error")
+    return ToolMessage(
+        content=f"Error: {text}",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+        response_metadata={"latency_ms": round(latency * 1000, 1)},
+    )
+
+
+def _with_latency(message, latency):
+    metrics.observe("chatbot_tool_seconds", latency, tool=message.name, status=message.status)
+    message.response_metadata = {**message.response_metadata, "latency_ms": round(latency * 1000, 1)}
+    return message
+
+
+def _tool_calls(state):
+    messages = state["messages"] if isinstance(state, dict) else state
+    last = messages[-1] if messages else None
+    if not isinstance(last, AIMessage):
+        raise ValueError("tool node expects the last message to be an AIMessage with tool calls")
+    return last.tool_calls
+
+
+def make_tool_node(tools, max_workers=None, timeouts=None, limits=None, default_timeout=None):
+    """Runnable 'tools' node (sync + async) running the pending tool calls in parallel."""
+    tools_by_name = {t.name: t for t in tools}
+    max_workers = max_workers or int(os.getenv("TOOL_WORKERS", "8"))
+    timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    default_timeout = default_timeout or float(os.getenv("TOOL_TIMEOUT", "30"))
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-call")
+    slots = {name: threading.BoundedSemaphore(n) for name, n in limits.items()}
+    aslots = {}
+
+    def timeout_for(name):
+        return timeouts.get(name, default_timeout)
+
+    # ------------------------------------------------------------------ sync
+    def call_tool(call, config):
+        slot = slots.get(call["name"])
+        if slot is not None:
+            slot.acquire()
+        try:
+            started = time.perf_counter()
+            return _with_latency(tools_by_name[call["name"]].invoke(call, config), time.perf_counter() - started)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    def run(state, config):
+        calls = _tool_calls(state)
+        started = time.perf_counter()
+        futures = {}
+        for call in calls:
+            if call["name"] in tools_by_name:
+                # copied context: callbacks and the metrics turn trace follow the call into the pool
+                futures[call["id"]] = pool.submit(contextvars.copy_context().run, call_tool, call, config)
+        results = []
+        for call in calls:
+            if call["name"] not in tools_by_name:
+                results.append(_error_message(call, f"unknown tool '{call['name']}'", 0))
+                continue
+            timeout = timeout_for(call["name"])
+            try:
+                results.append(futures[call["id"]].result(timeout=max(0, started + timeout - time.perf_counter())))
+            except FutureTimeout:
+                results.append(_error_message(call, f"'{call['name']}' timed out after {timeout:g}s", time.perf_counter() - started))
+            except Exception as e:
+                results.append(_error_message(call, f"{type(e).__name__}: {e}", time.perf_counter() - started))
+        return {"messages": results}
+
+    # ------------------------------------------------------------------ async
+    async def acall_tool(call, config):
+        name = call["name"]
+        if name not in tools_by_name:
+            return _error_message(call, f"unknown tool '{name}'", 0)
+        if name in limits and name not in aslots:
+            aslots[name] = asyncio.Semaphore(limits[name])
+        started = time.perf_counter()
+
+        async def guarded():
+            async with aslots.get(name) or nullcontext():
+                return await tools_by_name[name].ainvoke(call, config)
+
+        try:
+            # like the sync path, the timeout includes waiting for a concurrency slot
+            message = await asyncio.wait_for(guarded(), timeout_for(name))
+            return _with_latency(message, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            return _error_message(call, f"'{name}' timed out after {timeout_for(name):g}s", time.perf_counter() - started)
+        except Exception as e:
+            return _error_message(call, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+
+    async def arun(state, config):
+        calls = _tool_calls(state)
+        return {"messages": list(await asyncio.gather(*(acall_tool(call, config) for call in calls)))}
+
+    return RunnableLambda(run, afunc=arun, name="tools")
@@ -0,0 +1,260 @@
+"""Process-wide rate limiting and admission control for Gemini calls.
+
+All Streamlit sessions share the model objects of the backend, so a burst of users
+turns straight into provider 429s / 503s. `RateLimiter` is a token bucket on requests
+per minute and (estimated) tokens per minute for one model; every chat, title and
+summary call goes through it via `RateLimitedChatModel`.
+
+- fair FIFO: each call reserves the next free slot under a lock (GCRA / "virtual
+  scheduling"), so callers are served in arrival order, then sleeps until its slot
+- admission control: if the slot is more than `max_wait` seconds away the call is
+  rejected at once with `BusyError` (nothing is reserved), the UI shows "busy"
+  instead of waiting for a slow failure
+- tokens are estimated from the prompt (chars / 4) and corrected with the
+  response's usage_metadata once the call is done
+- `stats()`: admitted / rejected, queue depth, wait-time percentiles
+
+Limits are opt-in, per model, from the environment:
+
+    LLM_RATE_LIMITS="gemini-2.5-flash=10/250000,gemini-2.0-flash=15/1000000"   # model=rpm/tpm
+    LLM_MAX_QUEUE_WAIT=10    # seconds a chat turn may queue before it gets "busy"
+
+Background calls (titles, history summaries) use `max_wait=BACKGROUND_MAX_WAIT`.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.constants import TAG_NOSTREAM
+
+from llm_cache import _model_name
+
+
+class BusyError(RuntimeError):
+    """The call would have to queue longer than allowed."""
+
+    def __init__(self, model, retry_after):
+        super().__init__(f"{model} is busy, try again in {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """Token bucket kept as a theoretical arrival time.
+
+    A bucket of `limit` refilled at `limit` per period would let twice the quota
+    through in one sliding period; here the burst is `burst` of the limit and the
+    refill the rest, so no window of `period` seconds goes over `limit`.
+    """
+
+    def __init__(self, limit, period=60.0, burst=0.25):
+        self.capacity = max(1.0, limit * burst)
+        self.interval = period / max(limit - self.capacity, 1.0)
+        self.tat = 0.0
+
+    def start(self, cost, now):
+        """Earliest start time for `cost` units, and the new arrival time if reserved."""
+        cost = min(cost, self.capacity)  # a single huge request must still fit eventually
+        tat = max(self.tat, now) + cost * self.interval
+        return max(now, tat - self.capacity * self.interval), tat
+
+
+class RateLimiter:
+    def __init__(self, name, rpm=None, tpm=None, max_wait=10.0, period=60.0):
+        # period: length of the quota window in seconds (a minute for real providers)
+        self.name = name
+        self.max_wait = max_wait
+        self.requests = _Bucket(rpm, period) if rpm else None
+        self.tokens = _Bucket(tpm, period) if tpm else None
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.waiting = 0
+        self.max_waiting = 0
+        self._waits = deque(maxlen=1000)
+
+    def reserve(self, tokens=0, max_wait=None):
+        """Reserve capacity for one call; returns seconds to wait or raises BusyError."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            now = time.monotonic()
+            start, request_tat = self.requests.start(1, now) if self.requests else (now, None)
+            if self.tokens and tokens:
+                token_start, token_tat = self.tokens.start(tokens, now)
+                start = max(start, token_start)
+            wait = start - now
+            if wait > max_wait:
+                self.counters["rejected"] += 1
+                raise BusyError(self.name, wait)
+            if self.requests:
+                self.requests.tat = request_tat
+            if self.tokens and tokens:
+                self.tokens.tat = token_tat
+            self.counters["admitted"] += 1
+            self.counters["reserved_tokens"] += tokens
+            self._waits.append(wait)
+            if wait > 0:
+                self.counters["queued"] += 1
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+            return wait
+
+    def _done_waiting(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def acquire(self, tokens=0, max_wait=None):
+        wait = self.reserve(tokens, max_wait)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._done_waiting()
+
+    async def aacquire(self, tokens=0, max_wait=None):
+        wait = self.reserve(tokens, max_wait)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._done_waiting()
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage of a call is known."""
+        if not self.tokens or actual is None:
+            return
+        with self._lock:
+            self.tokens.tat += (actual - estimated) * self.tokens.interval
+            self.counters["tokens"] += actual
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = dict(self.counters)
+            stats["queue_depth"] = self.waiting
+            stats["max_queue_depth"] = self.max_waiting
+        if waits:
+            stats["wait_p50_ms"] = round(waits[len(waits) // 2] * 1000, 1)
+            stats["wait_p95_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1)
+            stats["wait_max_ms"] = round(waits[-1] * 1000, 1)
+        return stats
+
+
+def parse_limits(text):
+    """"model=rpm/tpm,..." -> {model: (rpm, tpm)}; tpm is optional."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition("/")
+        limits[model.strip()] = (float(rpm) if rpm else None, float(tpm) if tpm else None)
+    return limits
+
+
+BACKGROUND_MAX_WAIT = 120.0
+
+# one limiter per model name for the whole process
+LIMITERS = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model_name):
+    """Shared limiter for `model_name` from LLM_RATE_LIMITS, or None if the model has no limits."""
+    with _limiters_lock:
+        if model_name not in LIMITERS:
+            rpm, tpm = parse_limits(os.getenv("LLM_RATE_LIMITS")).get(model_name, (None, None))
+            max_wait = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+            LIMITERS[model_name] = RateLimiter(model_name, rpm, tpm, max_wait) if rpm or tpm else None
+        return LIMITERS[model_name]
+
+
+def rate_limit_stats():
+    return {name: limiter.stats() for name, limiter in LIMITERS.items() if limiter is not None}
+
+
+def estimate_tokens(messages):
+    """Rough prompt size, ~4 characters per token."""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(getattr(m, "content", m))) for m in messages) // 4 + 1
+
+
+def _usage(message):
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class RateLimitedChatModel(BaseChatModel):
+    inner: Any
+    limiter: Any
+    model_name: str = ""
+    # per-wrapper queue limit (background title / summary calls may wait longer than a chat turn)
+    max_wait: Optional[float] = None
+
+    @property
+    def _llm_type(self):
+        return "rate-limited-" + self.model_name
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"inner": self.inner.bind_tools(tools, **kwargs)})
+
+    @staticmethod
+    def _config():
+        return {"tags": [TAG_NOSTREAM]}
+
+    @staticmethod
+    def _stop(stop):
+        return {"stop": stop} if stop else {}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages)
+        self.limiter.acquire(estimated, self.max_wait)
+        message = self.inner.invoke(messages, config=self._config(), **self._stop(stop))
+        self.limiter.settle(estimated, _usage(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages)
+        self.limiter.acquire(estimated, self.max_wait)
+        usage = 0
+        for chunk in self.inner.stream(messages, config=self._config(), **self._stop(stop)):
+            # streamed chunks carry usage deltas
+            usage += _usage(chunk) or 0
+            if run_manager:
+                run_manager.on_llm_new_token(
+                    chunk.content if isinstance(chunk.content, str) else "", chunk=ChatGenerationChunk(message=chunk)
+                )
+            yield ChatGenerationChunk(message=chunk)
+        self.limiter.settle(estimated, usage or None)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages)
+        await self.limiter.aacquire(estimated, self.max_wait)
+        message = await self.inner.ainvoke(messages, config=self._config(), **self._stop(stop))
+        self.limiter.settle(estimated, _usage(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages)
+        await self.limiter.aacquire(estimated, self.max_wait)
+        usage = 0
+        async for chunk in self.inner.astream(messages, config=self._config(), **self._stop(stop)):
+            usage += _usage(chunk) or 0
+            if run_manager:
+                await run_manager.on_llm_new_token(
+                    chunk.content if isinstance(chunk.content, str) else "", chunk=ChatGenerationChunk(message=chunk)
+                )
+            yield ChatGenerationChunk(message=chunk)
+        self.limiter.settle(estimated, usage or None)
+
+
+def rate_limited(model, limiter=None, max_wait=None):
+    """`model` behind its process-wide limiter (LLM_RATE_LIMITS); the model itself if it has no limits."""
+    name = _model_name(model)
+    limiter = limiter or limiter_for(name)
+    if limiter is None:
+        return model
+    return RateLimitedChatModel(inner=model, limiter=limiter, model_name=name, max_wait=max_wait)
@@ -0,0 +1,473 @@
+"""Resilient LLM calls for chat_node: retries, hedging and a fallback model.
+
+chat_node used to catch `ServiceUnavailable` and answer with a *HumanMessage* holding
+the error text, which was then checkpointed and sent back to Gemini on every later
+turn. Now the model handed to chat_node is a `ResilientChatModel`:
+
+- retryable errors (429 / 5xx status codes / timeouts / connection errors) are retried with
+  jittered exponential backoff, as long as the latency budget (time to first token,
+  across all attempts) allows
+- optional hedging: if the primary hasn't produced a first token after
+  `hedge_after` seconds, the same request is also sent to the hedge model (llm1) and
+  whichever streams first wins; the other one is dropped
+- when retries are exhausted the request goes to a cheaper fallback model
+- every retry / hedge / fallback / failure is recorded out of band (`llm_failures`
+  table + counters), never in ChatState.messages; if everything fails the call raises
+  `LLMUnavailableError` and the frontend shows the error without persisting it
+
+Tokens are streamed from whichever model wins; the inner runs are tagged nostream
+so LangGraph only streams them once, through this model.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import httpx
+import requests
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    GatewayTimeout,
+    InternalServerError,
+    ResourceExhausted,
+    ServiceUnavailable,
+    TooManyRequests,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.constants import TAG_NOSTREAM
+
+from llm_cache import _model_name as _name
+from rate_limiter import BusyError
+
+logger = logging.getLogger(__name__)
+
+LLM_FAILURES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_failures (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    thread_id TEXT,
+    model TEXT,
+    kind TEXT NOT NULL,
+    attempt INTEGER,
+    error TEXT,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_failures_ts ON llm_failures (ts);
+"""
+
+RETRYABLE_ERRORS = (
+    ServiceUnavailable,
+    ResourceExhausted,
+    TooManyRequests,
+    DeadlineExceeded,
+    GatewayTimeout,
+    InternalServerError,
+    TimeoutError,
+    ConnectionError,
+    requests.ConnectionError,
+    requests.Timeout,
+    httpx.TransportError,
+)
+
+# HTTP status codes / API status names worth another attempt; langchain-google-genai re-raises
+# API errors as ChatGoogleGenerativeAIError(text) `from` the google-genai error, which has both
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+RETRYABLE_STATUSES = frozenset({"UNAVAILABLE", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "INTERNAL"})
+
+
+class LLMUnavailableError(RuntimeError):
+    """Every attempt (retries, hedge, fallback) failed."""
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    for code in (getattr(error, "code", None), getattr(error, "status_code", None), getattr(response, "status_code", None)):
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(error):
+    """By exception type or status code, on the error and the errors it was raised from.
+
+    Not by message text: "500" or "429" also turn up in unrelated errors (a tool result,
+    a token count, an id)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        if _status_code(error) in RETRYABLE_STATUS_CODES or getattr(error, "status", None) in RETRYABLE_STATUSES:
+            return True
+        error = error.__cause__
+    return False
+
+
+def _thread_id():
+    try:
+        from langgraph.config import get_config
+
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None  # called outside a graph
+
+
+class FailureLog:
+    """Out-of-band record of LLM trouble: counters, plus the llm_failures table when given a Database."""
+
+    def __init__(self, db=None):
+        self.db = db
+        self.counters = Counter()
+        if db is not None:
+            with db.write() as cur:
+                cur.executescript(LLM_FAILURES_SCHEMA)
+
+    def record(self, kind, model, error=None, attempt=None, latency=None, thread_id=None):
+        self.counters[kind] += 1
+        error_text = f"{type(error).__name__}: {error}"[:500] if error is not None else None
+        logger.warning("llm %s model=%s attempt=%s error=%s", kind, model, attempt, error_text)
+        if self.db is None:
+            return
+        try:
+            with self.db.write() as cur:
+                cur.execute(
+                    "INSERT INTO llm_failures (ts, thread_id, model, kind, attempt, error, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        datetime.now(timezone.utc).isoformat(),
+                        thread_id,
+                        model,
+                        kind,
+                        attempt,
+                        error_text,
+                        round(latency * 1000, 1) if latency is not None else None,
+                    ),
+                )
+        except Exception:
+            logger.exception("could not record llm failure")
+
+    def stats(self):
+        return dict(self.counters)
+
+
+_DONE = object()
+
+
+class ResilientChatModel(BaseChatModel):
+    primary: Any
+    hedge: Optional[Any] = None
+    fallback: Optional[Any] = None
+    tools: Optional[list] = None
+    failures: Any = None
+    model_name: str = ""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 4.0
+    # seconds to the first token, across attempts (fallback gets its own budget)
+    budget: float = 30.0
+    # seconds without a first token before the hedge request starts (None: no hedging)
+    hedge_after: Optional[float] = None
+    # max seconds between two chunks once an answer is streaming
+    stall_timeout: float = 60.0
+
+    @property
+    def _llm_type(self):
+        return "resilient-" + self.model_name
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools": list(tools)})
+
+    def _bound(self, model):
+        return model.bind_tools(self.tools) if self.tools else model
+
+    def _record(self, kind, model, error=None, attempt=None, latency=None):
+        if self.failures is not None:
+            self.failures.record(kind, _name(model), error, attempt, latency, _thread_id())
+
+    def _delay(self, attempt):
+        # "equal jitter": half fixed, half random, so retries from many sessions spread out
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def _config():
+        return {"tags": [TAG_NOSTREAM]}
+
+    @staticmethod
+    def _stop(stop):
+        return {"stop": stop} if stop else {}
+
+    @staticmethod
+    def _served_by(chunk, model):
+        # which model answered (primary, hedge or fallback), on the first chunk of the answer;
+        # the LLM cache only keeps answers from the model it is keyed on
+        return chunk.model_copy(update={"response_metadata": {**chunk.response_metadata, "served_by": _name(model)}})
+
+    # ------------------------------------------------------------------ sync
+    def _race(self, messages, stop, deadline):
+        """Chunks from the primary, or from the hedge if it starts streaming first."""
+        items = queue.Queue()
+        dropped = set()
+
+        def pump(source, model):
+            try:
+                for chunk in self._bound(model).stream(messages, config=self._config(), **self._stop(stop)):
+                    if source in dropped:
+                        return
+                    items.put((source, chunk, None))
+                items.put((source, _DONE, None))
+            except Exception as e:
+                items.put((source, None, e))
+
+        def start(source, model):
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(pump, source, model), daemon=True).start()
+
+        started = time.monotonic()
+        start("primary", self.primary)
+        hedge_at = started + self.hedge_after if self.hedge is not None and self.hedge_after is not None else None
+        active, errors, winner = {"primary"}, {}, None
+        while True:
+            now = time.monotonic()
+            if winner is not None:
+                timeout = self.stall_timeout
+            elif hedge_at is not None:
+                timeout = max(0, min(hedge_at, deadline) - now)
+            else:
+                timeout = max(0, deadline - now)
+            try:
+                source, chunk, error = items.get(timeout=timeout)
+            except queue.Empty:
+                if winner is None and hedge_at is not None and time.monotonic() < deadline:
+                    self._record("hedge", self.hedge, latency=time.monotonic() - started)
+                    start("hedge", self.hedge)
+                    active.add("hedge")
+                    hedge_at = None
+                    continue
+                dropped.update(active)
+                raise TimeoutError("no answer within the latency budget" if winner is None else "answer stream stalled")
+            if winner is not None and source != winner:
+                continue
+            if error is not None:
+                if source == winner:
+                    raise error
+                errors[source] = error
+                active.discard(source)
+                if not active:
+                    raise errors.get("primary") or error
+                continue
+            if winner is None:
+                winner = source
+                dropped.update(active - {source})
+                if source == "hedge":
+                    self._record("hedge_won", self.hedge, latency=time.monotonic() - started)
+                if chunk is not _DONE:
+                    chunk = self._served_by(chunk, self.hedge if source == "hedge" else self.primary)
+            if chunk is _DONE:
+                return
+            yield chunk
+
+    def _chunks(self, messages, stop):
+        """Retries + hedging on the primary, then the fallback model."""
+        deadline = time.monotonic() + self.budget
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            streamed = False
+            started = time.monotonic()
+            try:
+                for chunk in self._race(messages, stop, deadline):
+                    streamed = True
+                    yield chunk
+                return
+            except Exception as e:
+                if streamed:
+                    # tokens are already on screen, can't transparently retry
+                    self._record("failed_mid_stream", self.primary, e, attempt, time.monotonic() - started)
+                    raise
+                last_error = e
+                if not is_retryable(e):
+                    # BusyError: our own rate limiter is full, the UI gets "busy" right away
+                    self._record("busy" if isinstance(e, BusyError) else "error", self.primary, e, attempt, time.monotonic() - started)
+                    raise
+                self._record("retry", self.primary, e, attempt, time.monotonic() - started)
+                delay = self._delay(attempt)
+                if attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+        if self.fallback is None:
+            self._record("exhausted", self.primary, last_error)
+            raise LLMUnavailableError(str(last_error)) from last_error
+        self._record("fallback", self.fallback, last_error)
+        started = time.monotonic()
+        try:
+            yield from self.model_copy(update={"primary": self.fallback, "hedge": None})._race(
+                messages, stop, time.monotonic() + self.budget
+            )
+        except Exception as e:
+            self._record("exhausted", self.fallback, e, latency=time.monotonic() - started)
+            raise LLMUnavailableError(str(e)) from e
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self._chunks(messages, stop):
+            chunk = chunk.model_copy(update={"id": None})
+            if run_manager:
+                run_manager.on_llm_new_token(
+                    chunk.content if isinstance(chunk.content, str) else "", chunk=ChatGenerationChunk(message=chunk)
+                )
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        full = None
+        for chunk in self._chunks(messages, stop):
+            full = chunk if full is None else full + chunk
+        if full is None:
+            raise LLMUnavailableError("the model returned an empty response")
+        message = message_chunk_to_message(full).model_copy(update={"id": None})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # ------------------------------------------------------------------ async
+    async def _arace(self, messages, stop, deadline):
+        items = asyncio.Queue()
+
+        async def pump(source, model):
+            try:
+                async for chunk in self._bound(model).astream(messages, config=self._config(), **self._stop(stop)):
+                    await items.put((source, chunk, None))
+                await items.put((source, _DONE, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await items.put((source, None, e))
+
+        started = time.monotonic()
+        tasks = {"primary": asyncio.create_task(pump("primary", self.primary))}
+        hedge_at = started + self.hedge_after if self.hedge is not None and self.hedge_after is not None else None
+        errors, winner = {}, None
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is not None:
+                    timeout = self.stall_timeout
+                elif hedge_at is not None:
+                    timeout = max(0, min(hedge_at, deadline) - now)
+                else:
+                    timeout = max(0, deadline - now)
+                try:
+                    source, chunk, error = await asyncio.wait_for(items.get(), timeout)
+                except asyncio.TimeoutError:
+                    if winner is None and hedge_at is not None and time.monotonic() < deadline:
+                        await asyncio.to_thread(self._record, "hedge", self.hedge, None, None, time.monotonic() - started)
+                        tasks["hedge"] = asyncio.create_task(pump("hedge", self.hedge))
+                        hedge_at = None
+                        continue
+                    raise TimeoutError("no answer within the latency budget" if winner is None else "answer stream stalled")
+                if winner is not None and source != winner:
+                    continue
+                if error is not None:
+                    if source == winner:
+                        raise error
+                    errors[source] = error
+                    if all(s in errors for s in tasks):
+                        raise errors.get("primary") or error
+                    continue
+                if winner is None:
+                    winner = source
+                    for other, task in tasks.items():
+                        if other != source:
+                            task.cancel()
+                    if source == "hedge":
+                        await asyncio.to_thread(self._record, "hedge_won", self.hedge, None, None, time.monotonic() - started)
+                    if chunk is not _DONE:
+                        chunk = self._served_by(chunk, self.hedge if source == "hedge" else self.primary)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _achunks(self, messages, stop):
+        deadline = time.monotonic() + self.budget
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            streamed = False
+            started = time.monotonic()
+            try:
+                async for chunk in self._arace(messages, stop, deadline):
+                    streamed = True
+                    yield chunk
+                return
+            except Exception as e:
+                if streamed:
+                    await asyncio.to_thread(self._record, "failed_mid_stream", self.primary, e, attempt, time.monotonic() - started)
+                    raise
+                last_error = e
+                if not is_retryable(e):
+                    kind = "busy" if isinstance(e, BusyError) else "error"
+                    await asyncio.to_thread(self._record, kind, self.primary, e, attempt, time.monotonic() - started)
+                    raise
+                await asyncio.to_thread(self._record, "retry", self.primary, e, attempt, time.monotonic() - started)
+                delay = self._delay(attempt)
+                if attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    break
+                await asyncio.sleep(delay)
+        if self.fallback is None:
+            await asyncio.to_thread(self._record, "exhausted", self.primary, last_error)
+            raise LLMUnavailableError(str(last_error)) from last_error
+        await asyncio.to_thread(self._record, "fallback", self.fallback, last_error)
+        started = time.monotonic()
+        try:
+            async for chunk in self.model_copy(update={"primary": self.fallback, "hedge": None})._arace(
+                messages, stop, time.monotonic() + self.budget
+            ):
+                yield chunk
+        except Exception as e:
+            await asyncio.to_thread(self._record, "exhausted", self.fallback, e, None, time.monotonic() - started)
+            raise LLMUnavailableError(str(e)) from e
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async for chunk in self._achunks(messages, stop):
+            chunk = chunk.model_copy(update={"id": None})
+            if run_manager:
+                await run_manager.on_llm_new_token(
+                    chunk.content if isinstance(chunk.content, str) else "", chunk=ChatGenerationChunk(message=chunk)
+                )
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        full = None
+        async for chunk in self._achunks(messages, stop):
+            full = chunk if full is None else full + chunk
+        if full is None:
+            raise LLMUnavailableError("the model returned an empty response")
+        message = message_chunk_to_message(full).model_copy(update={"id": None})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def resilient_model(primary, hedge=None, fallback=None, failures=None, **policy):
+    """ResilientChatModel around `primary`; bind tools on the result (or via cached_model)."""
+    return ResilientChatModel(
+        primary=primary, hedge=hedge, fallback=fallback, failures=failures, model_name=_name(primary), **policy
+    )
+
+
+def resilient_model_from_env(primary, hedge=None, fallback=None, failures=None):
+    """LLM_MAX_ATTEMPTS, LLM_BUDGET (s), LLM_HEDGE_AFTER (s, unset = no hedging)."""
+    hedge_after = os.getenv("LLM_HEDGE_AFTER")
+    return resilient_model(
+        primary,
+        hedge=hedge,
+        fallback=fallback,
+        failures=failures,
+        max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+        budget=float(os.getenv("LLM_BUDGET", "30")),
+        hedge_after=float(hedge_after) if hedge_after else None,
+    )
@@ -0,0 +1,311 @@
+"""Checkpoint retention / compaction for chatbot.db.
+
+Every super-step of the graph adds a checkpoint row and nothing removed them except
+deleting a whole chat. A retention pass keeps, per thread, the latest `keep_last`
+checkpoints plus anything newer than `max_age`, drops `writes` rows whose checkpoint
+is gone, then checkpoints the WAL and runs an incremental VACUUM.
+
+Passes work in small batches of threads, each in its own short transaction on the
+saver's cursor, so a foreground turn never waits for more than one batch.
+
+Deleting chats hands the last step (WAL checkpoint + incremental VACUUM) to a
+`SpaceReclaimer` thread, so the delete itself returns right after its transaction.
+
+    python retention.py --keep-last 20 --max-age-days 30
+    python retention.py --enable-incremental-vacuum   # one-time, rewrites the file
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# 100ns intervals between the UUID (gregorian) epoch and the unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+@dataclass
+class RetentionPolicy:
+    keep_last: int = 20
+    max_age: timedelta | None = None
+    batch_size: int = 20  # threads per transaction
+    pause: float = 0.05  # seconds between batches, lets foreground writes in
+    vacuum_pages: int = 1000  # pages freed per incremental_vacuum step
+
+    @classmethod
+    def from_env(cls):
+        """Build a policy from CHECKPOINT_KEEP_LAST / CHECKPOINT_MAX_AGE_DAYS (None if unset)."""
+        keep_last = os.getenv("CHECKPOINT_KEEP_LAST")
+        max_age_days = os.getenv("CHECKPOINT_MAX_AGE_DAYS")
+        if not keep_last and not max_age_days:
+            return None
+        return cls(
+            keep_last=int(keep_last) if keep_last else 1,
+            max_age=timedelta(days=float(max_age_days)) if max_age_days else None,
+        )
+
+
+def checkpoint_id_before(moment):
+    """Smallest uuid6 checkpoint id for `moment`; ids sort by creation time as strings."""
+    ts = int(moment.timestamp() * 10_000_000) + _UUID_EPOCH_OFFSET
+    time_high = (ts >> 28) & 0xFFFFFFFF
+    time_mid = (ts >> 12) & 0xFFFF
+    time_low = ts & 0x0FFF
+    value = (time_high << 96) | (time_mid << 80) | (0x6 << 76) | (time_low << 64) | (0x8 << 60)
+    return str(uuid.UUID(int=value))
+
+
+def prune_thread(cur, thread_id, keep_last, cutoff_id=None):
+    """Delete old checkpoints of one thread; returns (checkpoints, writes) deleted."""
+    keep_last = max(keep_last, 1)  # never drop the latest checkpoint
+    query = """
+        DELETE FROM checkpoints
+        WHERE thread_id = ? AND checkpoint_ns = ''
+          AND checkpoint_id NOT IN (
+              SELECT checkpoint_id FROM checkpoints
+              WHERE thread_id = ? AND checkpoint_ns = ''
+              ORDER BY checkpoint_id DESC LIMIT ?
+          )
+    """
+    params = [thread_id, thread_id, keep_last]
+    if cutoff_id is not None:
+        query += " AND checkpoint_id < ?"
+        params.append(cutoff_id)
+    checkpoints = cur.execute(query, params).rowcount
+    writes = 0
+    if checkpoints:
+        writes = cur.execute(
+            """
+            DELETE FROM writes
+            WHERE thread_id = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM checkpoints c
+                  WHERE c.thread_id = writes.thread_id
+                    AND c.checkpoint_ns = writes.checkpoint_ns
+                    AND c.checkpoint_id = writes.checkpoint_id
+              )
+            """,
+            (thread_id,),
+        ).rowcount
+    return checkpoints, writes
+
+
+def orphan_write_threads(cur):
+    """Threads that still have writes but no checkpoint at all any more (a read, fine on a reader)."""
+    return [
+        row[0] for row in cur.execute(
+            "SELECT DISTINCT thread_id FROM writes WHERE thread_id NOT IN (SELECT thread_id FROM checkpoints)"
+        )
+    ]
+
+
+def prune_orphan_writes(cur, thread_ids):
+    """Delete the writes of these orphan threads; returns rows deleted."""
+    # checked again here: a thread may have got a new checkpoint since it was listed
+    return cur.execute(
+        f"""
+        DELETE FROM writes
+        WHERE thread_id IN ({','.join('?' * len(thread_ids))})
+          AND NOT EXISTS (SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id)
+        """,
+        thread_ids,
+    ).rowcount
+
+
+def database_size(cur):
+    page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+    page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+    freelist = cur.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"file_bytes": page_size * page_count, "free_bytes": page_size * freelist}
+
+
+def _wal_bytes(cur):
+    path = cur.execute("PRAGMA database_list").fetchone()[2]
+    if not path or not os.path.exists(path + "-wal"):
+        return 0
+    return os.path.getsize(path + "-wal")
+
+
+def run_retention_pass(checkpointer, policy, stop_event=None):
+    """Run one incremental pass and report what it reclaimed."""
+    started = time.perf_counter()
+    with checkpointer.cursor(transaction=False) as cur:
+        before = database_size(cur)
+        before_wal = _wal_bytes(cur)
+        thread_ids = [row[0] for row in cur.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+
+    cutoff_id = None
+    if policy.max_age is not None:
+        cutoff_id = checkpoint_id_before(datetime.now(timezone.utc) - policy.max_age)
+
+    report = {"threads": len(thread_ids), "checkpoints_deleted": 0, "writes_deleted": 0}
+    for start in range(0, len(thread_ids), policy.batch_size):
+        if stop_event is not None and stop_event.is_set():
+            break
+        with checkpointer.cursor() as cur:
+            for thread_id in thread_ids[start:start + policy.batch_size]:
+                checkpoints, writes = prune_thread(cur, thread_id, policy.keep_last, cutoff_id)
+                report["checkpoints_deleted"] += checkpoints
+                report["writes_deleted"] += writes
+        time.sleep(policy.pause)
+
+    # orphan writes in the same small batches, not one DELETE over the whole table
+    with checkpointer.cursor(transaction=False) as cur:
+        orphans = orphan_write_threads(cur)
+    for start in range(0, len(orphans), policy.batch_size):
+        if stop_event is not None and stop_event.is_set():
+            break
+        with checkpointer.cursor() as cur:
+            report["writes_deleted"] += prune_orphan_writes(cur, orphans[start:start + policy.batch_size])
+        time.sleep(policy.pause)
+
+    reclaim_space(checkpointer, policy, stop_event)
+
+    with checkpointer.cursor(transaction=False) as cur:
+        after = database_size(cur)
+        after_wal = _wal_bytes(cur)
+    report["bytes_reclaimed"] = (before["file_bytes"] + before_wal) - (after["file_bytes"] + after_wal)
+    report["free_bytes"] = after["free_bytes"]
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def reclaim_space(checkpointer, policy=None, stop_event=None):
+    """Fold the WAL back into the main file and hand free pages back to the OS."""
+    policy = policy or RetentionPolicy()
+    # maintenance pragmas have to run on the writer connection, hence cursor() everywhere
+    with checkpointer.cursor() as cur:
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        incremental = cur.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if not incremental:
+        return
+    while stop_event is None or not stop_event.is_set():
+        with checkpointer.cursor() as cur:
+            if cur.execute("PRAGMA freelist_count").fetchone()[0] == 0:
+                break
+            # incremental_vacuum frees one page per step, fetchall() drives it to the end
+            cur.execute(f"PRAGMA incremental_vacuum({int(policy.vacuum_pages)})").fetchall()
+        time.sleep(policy.pause)
+    with checkpointer.cursor() as cur:
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def enable_incremental_vacuum(conn):
+    """One-time switch to auto_vacuum=INCREMENTAL (needs a full VACUUM, run it offline)."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+class RetentionWorker(threading.Thread):
+    """Daemon thread running a retention pass every `interval` seconds."""
+
+    def __init__(self, checkpointer, policy, interval=600):
+        super().__init__(name="checkpoint-retention", daemon=True)
+        self.checkpointer = checkpointer
+        self.policy = policy
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.last_report = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.last_report = run_retention_pass(self.checkpointer, self.policy, self.stop_event)
+                logger.info("checkpoint retention pass: %s", self.last_report)
+            except Exception:
+                logger.exception("checkpoint retention pass failed")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class SpaceReclaimer(threading.Thread):
+    """Daemon thread running `reclaim_space` a little after deletes, off the UI thread.
+
+    Requests that arrive while it waits or runs are folded into one more pass, so deleting
+    chats one after the other doesn't queue a vacuum per chat. Without auto_vacuum=INCREMENTAL
+    freed pages stay in the file and are reused by later writes (only the WAL shrinks).
+    """
+
+    def __init__(self, checkpointer, policy=None, delay=2.0):
+        super().__init__(name="space-reclaimer", daemon=True)
+        self.checkpointer = checkpointer
+        self.policy = policy or RetentionPolicy()
+        self.delay = delay  # seconds to let a burst of deletes settle
+        self.requested = threading.Event()
+        self.stop_event = threading.Event()
+        self.last_report = None
+
+    def request(self):
+        self.requested.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.requested.wait()
+            if self.stop_event.wait(self.delay):
+                break
+            self.requested.clear()
+            try:
+                self.last_report = self.reclaim()
+                logger.info("space reclaimed: %s", self.last_report)
+            except Exception:
+                logger.exception("space reclamation failed")
+
+    def reclaim(self):
+        started = time.perf_counter()
+        with self.checkpointer.cursor(transaction=False) as cur:
+            before = database_size(cur)["file_bytes"] + _wal_bytes(cur)
+        reclaim_space(self.checkpointer, self.policy, self.stop_event)
+        with self.checkpointer.cursor(transaction=False) as cur:
+            after = database_size(cur)
+            after_bytes = after["file_bytes"] + _wal_bytes(cur)
+        return {
+            "bytes_reclaimed": before - after_bytes,
+            "free_bytes": after["free_bytes"],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        self.requested.set()
+
+
+def start_space_reclaimer(checkpointer, policy=None):
+    reclaimer = SpaceReclaimer(checkpointer, policy)
+    reclaimer.start()
+    return reclaimer
+
+
+def start_retention_worker(checkpointer, policy, interval=None):
+    if interval is None:
+        interval = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL", "600"))
+    worker = RetentionWorker(checkpointer, policy, interval)
+    worker.start()
+    return worker
+
+
+if __name__ == "__main__":
+    import argparse
+    from chat_saver import ChatSaver
+    from db import Database
+
+    parser = argparse.ArgumentParser(description="Prune old checkpoints from chatbot.db")
+    parser.add_argument("--db", default="chatbot.db")
+    parser.add_argument("--keep-last", type=int, default=20)
+    parser.add_argument("--max-age-days", type=float, default=None)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.enable_incremental_vacuum:
+        print("auto_vacuum=INCREMENTAL enabled" if enable_incremental_vacuum(db.writer) else "already incremental")
+    saver = ChatSaver(db=db)
+    max_age = timedelta(days=args.max_age_days) if args.max_age_days is not None else None
+    print(run_retention_pass(saver, RetentionPolicy(keep_last=args.keep_last, max_age=max_age, pause=0)))
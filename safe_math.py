@@ -0,0 +1,153 @@
+"""Restricted arithmetic evaluator for the calculator tool (no `eval`).
+
+Expressions are parsed with `ast` and only numbers, + - * / // % **, unary +/-,
+parentheses, a small set of math functions / constants and previously assigned names
+are evaluated; anything else (attributes, calls to other names, subscripts, strings,
+comprehensions ...) is rejected. Sizes are bounded so "9**9**9" can't hang a worker.
+
+A batch is evaluated in order and may assign names for later expressions:
+
+    evaluate_batch(["cost = 150.25 * 10 + 4.95", "value = 165.1 * 10", "(value - cost) / cost * 100"])
+"""
+import ast
+import math
+import operator
+
+MAX_LENGTH = 500
+MAX_NODES = 200
+MAX_EXPONENT = 1000
+MAX_MAGNITUDE = 1e300
+
+BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: None,  # checked, see _pow
+}
+
+UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def _pow(base, exponent):
+    if abs(exponent) > MAX_EXPONENT:
+        raise ValueError(f"exponent too large (max {MAX_EXPONENT})")
+    return operator.pow(base, exponent)
+
+
+def _round(x, ndigits=0):
+    return round(x, int(ndigits))
+
+
+FUNCTIONS = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "pow": _pow,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+class CalculatorError(ValueError):
+    pass
+
+
+def _check_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise CalculatorError("only numbers are supported")
+    if isinstance(value, float) and (math.isnan(value) or abs(value) > MAX_MAGNITUDE):
+        raise CalculatorError("result out of range")
+    if isinstance(value, int) and value.bit_length() > 1000:
+        raise CalculatorError("result out of range")
+    return value
+
+
+def _eval(node, names):
+    if isinstance(node, ast.Constant):
+        return _check_number(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY:
+        left, right = _eval(node.left, names), _eval(node.right, names)
+        if isinstance(node.op, ast.Pow):
+            return _check_number(_pow(left, right))
+        return _check_number(BINARY[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY:
+        return UNARY[type(node.op)](_eval(node.operand, names))
+    if isinstance(node, ast.Name):
+        if node.id in names:
+            return names[node.id]
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        raise CalculatorError(f"unknown name '{node.id}'")
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        func = FUNCTIONS.get(node.func.id)
+        if func is None:
+            raise CalculatorError(f"unsupported function '{node.func.id}'")
+        return _check_number(func(*[_eval(arg, names) for arg in node.args]))
+    raise CalculatorError(f"unsupported syntax: {type(node).__name__}")
+
+
+def _parse(text):
+    text = text.strip().replace("^", "**").replace("×", "*").replace("÷", "/")
+    if not text:
+        raise CalculatorError("empty expression")
+    if len(text) > MAX_LENGTH:
+        raise CalculatorError(f"expression too long (max {MAX_LENGTH} characters)")
+    target = None
+    # `name = expression` assigns a value usable by later expressions of a batch
+    head, sep, rest = text.partition("=")
+    if sep and head.strip().isidentifier() and not rest.startswith("="):
+        target, text = head.strip(), rest
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise CalculatorError(f"invalid expression: {e.msg}") from None
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise CalculatorError("expression too complex")
+    return target, tree.body
+
+
+def evaluate(text, names=None):
+    """Value of one expression (names: variables from earlier expressions)."""
+    target, node = _parse(text)
+    names = {} if names is None else names
+    if target in FUNCTIONS or target in CONSTANTS:
+        raise CalculatorError(f"can't assign to '{target}'")
+    try:
+        value = _eval(node, names)
+    except ZeroDivisionError:
+        raise CalculatorError("division by zero") from None
+    except (OverflowError, ValueError, TypeError) as e:
+        if isinstance(e, CalculatorError):
+            raise
+        raise CalculatorError(str(e)) from None
+    if target:
+        names[target] = value
+    return value
+
+
+def evaluate_batch(expressions):
+    """[{"expression", "result"} or {"expression", "error"}] in order, sharing assigned names."""
+    names = {}
+    results = []
+    for text in expressions:
+        try:
+            value = evaluate(text, names)
+            if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+                value = int(value)
+            results.append({"expression": text, "result": value})
+        except CalculatorError as e:
+            results.append({"expression": text, "error": str(e)})
+    return results
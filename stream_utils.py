@@ -0,0 +1,130 @@
+"""Token coalescing between the graph's message stream and `st.write_stream`.
+
+Gemini streams many tiny chunks; handed to `st.write_stream` one by one, each becomes
+its own websocket delta and a re-render of the whole markdown message in the browser.
+`coalesce` re-chunks the text:
+
+- the first text goes out at once (time to first token is unchanged)
+- afterwards text is buffered and flushed at a sentence end / line end (inside a code
+  block: a line end or the closing fence) once `interval` has passed, or regardless of
+  boundaries once `max_delay` has passed or `max_chars` are buffered
+- backpressure: the window grows with the time the consumer needs to render a flush,
+  so a slow browser / server gets fewer, larger deltas instead of a growing backlog
+- empty and non-text chunks are dropped without a round trip; `FLUSH` (e.g. a tool
+  starts running) pushes out whatever is buffered
+
+`StreamStats` keeps chunks / flushes per second and render lag (time the consumer held
+the stream per flush); with CHAT_METRICS=1 flushes and render lag also go to metrics.py.
+
+STREAM_FLUSH_MS (default 50) sets the window, STREAM_FLUSH_MS=0 turns coalescing off.
+"""
+import os
+import re
+import time
+
+import metrics
+
+FLUSH = object()
+
+# end of a sentence (optionally followed by a closing quote / bracket) or of a line
+_BOUNDARY = re.compile(r"(?:[.!?:;][\"')\]]*\s*|\n)$")
+
+
+class StreamStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chunks = 0  # text chunks received
+        self.skipped = 0  # empty / non-text chunks dropped
+        self.flushes = 0  # pieces handed to the consumer
+        self.chars = 0
+        self.first_flush = None
+        self.render = 0.0  # total time the consumer held the stream
+        self.max_render = 0.0
+        self.last_render = 0.0
+
+    def rendered(self, seconds):
+        self.render += seconds
+        self.last_render = seconds
+        self.max_render = max(self.max_render, seconds)
+        metrics.observe("chatbot_stream_render_seconds", seconds)
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "chunks": self.chunks,
+            "skipped": self.skipped,
+            "flushes": self.flushes,
+            "chars": self.chars,
+            "chunks_per_sec": round(self.chunks / elapsed, 1),
+            "flushes_per_sec": round(self.flushes / elapsed, 1),
+            "first_flush_ms": round(self.first_flush * 1000, 1) if self.first_flush is not None else None,
+            "render_ms": round(self.render * 1000, 1),
+            "render_lag_max_ms": round(self.max_render * 1000, 1),
+        }
+
+
+def coalesce(pieces, interval=0.05, max_delay=0.25, max_chars=800, render_factor=2.0, stats=None):
+    """Re-chunk an iterable of text pieces (str, None or FLUSH) into fewer, larger pieces."""
+    stats = stats if stats is not None else StreamStats()
+    buffer, size = [], 0
+    in_code, tail = False, ""  # inside a ``` block / last characters (fences split across chunks)
+    last_flush = None
+
+    def flush():
+        nonlocal buffer, size, last_flush
+        text = "".join(buffer)
+        buffer, size = [], 0
+        stats.flushes += 1
+        stats.chars += len(text)
+        if stats.first_flush is None:
+            stats.first_flush = time.perf_counter() - stats.started
+        handed = time.perf_counter()
+        yield text
+        last_flush = time.perf_counter()
+        stats.rendered(last_flush - handed)
+
+    try:
+        for piece in pieces:
+            if piece is FLUSH:
+                if buffer:
+                    yield from flush()
+                continue
+            if not piece or not isinstance(piece, str):
+                stats.skipped += 1
+                continue
+            stats.chunks += 1
+            buffer.append(piece)
+            size += len(piece)
+
+            closed_fence = False
+            fences = (tail + piece).count("```") - tail.count("```")
+            if fences % 2:
+                in_code = not in_code
+                closed_fence = not in_code
+            tail = (tail + piece)[-2:]
+
+            if last_flush is None:  # first text: no waiting
+                yield from flush()
+                continue
+            waited = time.perf_counter() - last_flush
+            # backpressure: don't hand out pieces faster than the consumer renders them
+            window = max(interval, render_factor * stats.last_render)
+            if in_code:
+                boundary = piece.endswith("\n")
+            else:
+                boundary = closed_fence or bool(_BOUNDARY.search(piece))
+            if size >= max_chars or waited >= max(max_delay, window) or (boundary and waited >= window):
+                yield from flush()
+        if buffer:
+            yield from flush()
+    finally:
+        # incoming chunks are already counted per turn (chatbot_stream_chunks_total, metrics.py)
+        metrics.inc("chatbot_stream_flushes_total", stats.flushes)
+
+
+def coalesce_from_env(pieces, stats=None):
+    """`coalesce` with STREAM_FLUSH_MS (0: pass every text chunk through as it comes)."""
+    interval = float(os.getenv("STREAM_FLUSH_MS", "50")) / 1000
+    if interval <= 0:
+        return coalesce(pieces, interval=0, max_delay=0, render_factor=0, stats=stats)
+    return coalesce(pieces, interval=interval, max_delay=max(interval * 5, 0.25), stats=stats)
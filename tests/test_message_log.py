@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from chat_saver import ChatSaver
+
+
+class FlakyConnection:
+    """sqlite3 connection whose next commit fails like a locked database (and rolls back)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.fail_commit = False
+
+    def commit(self):
+        if self.fail_commit:
+            self.fail_commit = False
+            self.conn.rollback()
+            raise sqlite3.OperationalError("database is locked")
+        self.conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def put(saver, messages):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": messages}
+    checkpoint["channel_versions"] = {"messages": len(messages)}
+    config = {"configurable": {"thread_id": "t", "checkpoint_ns": ""}}
+    return saver.put(config, checkpoint, {}, {"messages": len(messages)})
+
+
+def load(saver):
+    return saver.get_tuple({"configurable": {"thread_id": "t", "checkpoint_ns": ""}}).checkpoint["channel_values"]["messages"]
+
+
+def turn(i):
+    return [HumanMessage(content=f"question {i}", id=f"h{i}"), AIMessage(content=f"answer {i}", id=f"a{i}")]
+
+
+@pytest.fixture
+def saver(tmp_path):
+    conn = FlakyConnection(sqlite3.connect(str(tmp_path / "log.db"), check_same_thread=False))
+    saver = ChatSaver(conn, message_log=True)
+    saver.setup()
+    return saver
+
+
+def test_failed_log_commit_does_not_leave_dangling_refs(saver):
+    messages = turn(0)
+    put(saver, messages)
+    messages = messages + turn(1)
+    saver.conn.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        put(saver, messages)
+    # the rows of turn 1 were rolled back; the next put must write them again
+    messages = messages + turn(2)
+    put(saver, messages)
+    assert [m.content for m in load(saver)] == [m.content for m in messages]
+
+
+def test_failed_insert_does_not_leave_dangling_refs(saver):
+    messages = turn(0)
+    put(saver, messages)
+    messages = messages + turn(1)
+
+    class FailingCursor:
+        def execute(self, *args):
+            return saver.conn.execute(*args)
+
+        def executemany(self, *args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    with pytest.raises(sqlite3.OperationalError):
+        saver.message_log.append(FailingCursor(), "t", messages)
+    put(saver, messages)
+    assert [m.content for m in load(saver)] == [m.content for m in messages]
@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from tool_cache import ToolCache
+
+
+class FailingInserts:
+    """sqlite3 connection whose INSERTs fail like a locked database."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if sql.lstrip().startswith("INSERT"):
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def failing_cache(tmp_path, **kwargs):
+    cache = ToolCache(path=str(tmp_path / "tools.db"), **kwargs)
+    cache.conn = FailingInserts(cache.conn)
+    return cache
+
+
+def test_failed_db_write_still_returns_the_value(tmp_path):
+    cache = failing_cache(tmp_path)
+    assert cache.get_or_call("quote", {"symbol": "AAPL"}, 60, lambda: {"price": 1}) == {"price": 1}
+    stats = cache.stats()
+    assert stats["inflight"] == 0
+    assert stats["db_errors"] == 1
+
+
+def test_failed_db_write_frees_the_key_after_expiry(tmp_path):
+    cache = failing_cache(tmp_path)
+    cache.get_or_call("quote", {"symbol": "AAPL"}, 0.01, lambda: 1)
+    time.sleep(0.02)
+    calls = []
+    # used to block forever on the future left in _inflight
+    assert cache.get_or_call("quote", {"symbol": "AAPL"}, 60, lambda: calls.append(1) or 2) == 2
+    assert calls == [1]
+
+
+def test_waiters_get_the_value_when_the_db_write_fails(tmp_path):
+    cache = failing_cache(tmp_path)
+    started, results = threading.Event(), []
+
+    def slow():
+        started.set()
+        time.sleep(0.1)
+        return "value"
+
+    first = threading.Thread(target=lambda: results.append(cache.get_or_call("search", {"q": "x"}, 60, slow)))
+    first.start()
+    started.wait()
+    results.append(cache.get_or_call("search", {"q": "x"}, 60, lambda: "second call"))
+    first.join()
+    assert results == ["value", "value"]
+    assert cache.stats()["shared"] == 1
+
+
+def test_async_waiter_gets_the_value_when_the_db_write_fails(tmp_path):
+    cache = failing_cache(tmp_path)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(
+            cache.aget_or_call("search", {"q": "x"}, 60, slow),
+            cache.aget_or_call("search", {"q": "x"}, 60, slow),
+        )
+
+    assert asyncio.run(main()) == ["value", "value"]
+    assert cache.stats()["inflight"] == 0
+
+
+def test_sync_waiter_is_bounded(tmp_path):
+    cache = ToolCache(wait_timeout=0.05)
+    release = threading.Event()
+    first = threading.Thread(target=lambda: cache.get_or_call("search", {"q": "x"}, 60, release.wait))
+    first.start()
+    while not cache.stats()["inflight"]:
+        time.sleep(0.001)
+    try:
+        cache.get_or_call("search", {"q": "x"}, 60, lambda: None)
+        raise AssertionError("expected a timeout")
+    except TimeoutError:
+        pass
+    finally:
+        release.set()
+        first.join()
@@ -0,0 +1,221 @@
+"""Thread registry: one row per conversation, kept next to the checkpoints.
+
+Listing threads used to mean walking `checkpointer.list(None)` and decoding every
+checkpoint of every thread. The registry keeps the few fields the sidebar needs
+(created_at, last_activity, message_count, title) in a small indexed table that
+is updated on every checkpoint write.
+
+All helpers take a sqlite3 cursor (or connection) so callers decide which lock /
+transaction they run under.
+
+Titles live in the same table (they used to be in chat_titles.json, rewritten in full
+by every session on every rename): `set_title` is a single-row upsert and deleting a
+thread drops its title in the same transaction.
+
+Run `python thread_registry.py` to (re)build the registry from chatbot.db.
+"""
+import json
+import os
+
+# legacy title store, imported once by `migrate_titles_json`
+TITLES_JSON = os.getenv("CHAT_TITLES_JSON", "chat_titles.json")
+
+REGISTRY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_registry (
+    thread_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    last_activity TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_thread_registry_last_activity
+    ON thread_registry (last_activity);
+"""
+
+
+def setup_registry(cur):
+    # executescript commits any open transaction, so only call this at startup
+    cur.executescript(REGISTRY_SCHEMA)
+
+
+# PRAGMA user_version of a database whose registry has been backfilled from its checkpoints;
+# set in the backfill's own transaction, so an interrupted backfill runs again on the next start
+REGISTRY_VERSION = 1
+
+
+def registry_backfilled(cur):
+    return cur.execute("PRAGMA user_version").fetchone()[0] >= REGISTRY_VERSION
+
+
+# shared with the async saver, which runs it through aiosqlite
+TOUCH_THREAD_SQL = """
+INSERT INTO thread_registry (thread_id, created_at, last_activity, message_count)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (thread_id) DO UPDATE SET
+    last_activity = MAX(last_activity, excluded.last_activity),
+    message_count = excluded.message_count
+"""
+
+REMOVE_THREAD_SQL = "DELETE FROM thread_registry WHERE thread_id = ?"
+
+
+def touch_thread(cur, thread_id, ts, message_count):
+    """Record activity on a thread (insert on first write, bump afterwards)."""
+    cur.execute(TOUCH_THREAD_SQL, (str(thread_id), ts, ts, message_count))
+
+
+SET_TITLE_SQL = """
+INSERT INTO thread_registry (thread_id, created_at, last_activity, title)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (thread_id) DO UPDATE SET title = excluded.title
+"""
+
+
+def set_title(cur, thread_id, title, ts):
+    """Set one thread's title (a thread renamed before its first checkpoint gets a row too)."""
+    cur.execute(SET_TITLE_SQL, (str(thread_id), ts, ts, title))
+
+
+# same, but never over a title the thread already has (e.g. one the user gave it)
+SET_TITLE_IF_MISSING_SQL = SET_TITLE_SQL.rstrip() + " WHERE thread_registry.title IS NULL"
+
+
+def set_title_if_missing(cur, thread_id, title, ts):
+    """Set the title only if the thread has none yet; returns whether it was set."""
+    cur.execute(SET_TITLE_IF_MISSING_SQL, (str(thread_id), ts, ts, title))
+    return cur.rowcount == 1
+
+
+def replace_title(cur, thread_id, expected, title):
+    """Set the title only if it is still `expected` (e.g. a placeholder the user hasn't renamed)."""
+    cur.execute(
+        "UPDATE thread_registry SET title = ? WHERE thread_id = ? AND title IS ?",
+        (title, str(thread_id), expected),
+    )
+    return cur.rowcount == 1
+
+
+def titles_query(count):
+    return f"SELECT thread_id, title FROM thread_registry WHERE title IS NOT NULL AND thread_id IN ({','.join('?' * count)})"
+
+
+def get_titles(cur, thread_ids):
+    """{thread_id: title} for the given threads (e.g. the visible sidebar page)."""
+    thread_ids = [str(t) for t in thread_ids]
+    titles = {}
+    # stay under SQLite's host parameter limit
+    for i in range(0, len(thread_ids), 500):
+        chunk = thread_ids[i:i + 500]
+        titles.update(cur.execute(titles_query(len(chunk)), chunk).fetchall())
+    return titles
+
+
+def migrate_titles_json(cur, path=TITLES_JSON):
+    """Copy titles from the old chat_titles.json into the registry.
+
+    Titles already in the table win; threads that no longer have checkpoints are skipped.
+    Returns the number of titles copied (None when there is no file).
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        titles = json.load(f)
+    cur.executemany(
+        "UPDATE thread_registry SET title = ? WHERE thread_id = ? AND title IS NULL",
+        [(title, str(tid)) for tid, title in titles.items() if title],
+    )
+    return cur.rowcount
+
+
+def _title_filter(query):
+    """WHERE clause + params for a case-insensitive "title contains" search (LIKE wildcards escaped)."""
+    if not query:
+        return "", ()
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return " WHERE title LIKE ? ESCAPE '\\'", (pattern,)
+
+
+def list_threads(cur, limit=None, offset=0, query=None):
+    """Threads ordered by recency (most recently active first), optionally only titles containing `query`."""
+    where, params = _title_filter(query)
+    sql = f"""
+        SELECT thread_id, created_at, last_activity, message_count, title
+        FROM thread_registry{where}
+        ORDER BY last_activity DESC
+    """
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += (limit, offset)
+    return [
+        {
+            "thread_id": thread_id,
+            "created_at": created_at,
+            "last_activity": last_activity,
+            "message_count": message_count,
+            "title": title,
+        }
+        for thread_id, created_at, last_activity, message_count, title in cur.execute(sql, params)
+    ]
+
+
+def count_threads(cur, query=None):
+    where, params = _title_filter(query)
+    return cur.execute(f"SELECT COUNT(*) FROM thread_registry{where}", params).fetchone()[0]
+
+
+def remove_thread(cur, thread_id):
+    cur.execute(REMOVE_THREAD_SQL, (str(thread_id),))
+
+
+def backfill_registry(checkpointer):
+    """One-shot migration: build registry rows from the existing checkpoints table.
+
+    Only the first and the latest checkpoint of each thread are decoded (instead of
+    every checkpoint), which is enough for created_at / last_activity / message_count.
+    """
+    with checkpointer.cursor(transaction=False) as cur:
+        threads = cur.execute(
+            """
+            SELECT thread_id, MIN(checkpoint_id), MAX(checkpoint_id)
+            FROM checkpoints
+            WHERE checkpoint_ns = ''
+            GROUP BY thread_id
+            """
+        ).fetchall()
+
+    rows = []
+    for thread_id, first_id, last_id in threads:
+        first = checkpointer.get_tuple(_config(thread_id, first_id))
+        latest = checkpointer.get_tuple(_config(thread_id, last_id))
+        if first is None or latest is None:
+            continue
+        messages = latest.checkpoint["channel_values"].get("messages", [])
+        rows.append((thread_id, first.checkpoint["ts"], latest.checkpoint["ts"], len(messages)))
+
+    with checkpointer.cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO thread_registry (thread_id, created_at, last_activity, message_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (thread_id) DO UPDATE SET
+                created_at = MIN(created_at, excluded.created_at),
+                last_activity = MAX(last_activity, excluded.last_activity),
+                message_count = excluded.message_count
+            """,
+            rows,
+        )
+        cur.execute(f"PRAGMA user_version = {REGISTRY_VERSION}")
+    return len(rows)
+
+
+def _config(thread_id, checkpoint_id):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+
+
+if __name__ == "__main__":
+    from chat_saver import ChatSaver
+    from db import Database
+
+    saver = ChatSaver(db=Database())
+    saver.setup()
+    print(f"Backfilled {backfill_registry(saver)} threads into thread_registry")
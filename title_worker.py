@@ -0,0 +1,143 @@
+"""Background, batched chat title generation.
+
+The frontend used to call `llm1.invoke` right after streaming the first answer of a
+chat, so the user waited one more LLM round trip before the app reran. Now:
+
+1. the thread gets an instant local placeholder (keywords of the first user message),
+2. the thread is queued on a `TitleWorker` thread,
+3. the worker batches every untitled thread waiting in the queue into ONE `llm1`
+   request that returns a JSON object {id: title},
+4. each title is written back with `save(thread_id, placeholder, title)`, which only
+   replaces the placeholder, so a rename made in the meantime wins,
+5. `version` is bumped; the UI polls it and refreshes its titles when it changes.
+
+If the LLM call or its JSON fails, the placeholder simply stays.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from langchain_core.messages import HumanMessage
+
+from conversation import message_text
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = set("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers him his how i if in into is it its itself
+just me more most my no nor not now of off on once only or other our out over own please
+same she should so some such tell than that the their them then there these they this
+those through to too under until up very was we were what when where which while who
+whom why will with would you your hi hello hey thanks thank give show find get know want
+need help explain
+""".split())
+
+TITLE_PROMPT = """Write a short title (5 words or fewer) for each of these chats.
+Return ONLY a JSON object mapping each chat id to its title, e.g. {{"1": "Weather in Delhi"}}.
+
+{chats}"""
+
+
+def placeholder_title(text, max_words=5):
+    """Instant local title: the first few keywords of the user's first message."""
+    words = re.findall(r"[A-Za-z0-9][A-Za-z0-9'+.#-]*", text or "")
+    keywords = [w.strip(".'-") for w in words if w.lower().strip(".'-") not in STOPWORDS]
+    keywords = [w for w in keywords if w][:max_words] or [w for w in words[:max_words]]
+    if not keywords:
+        return "New Chat..."
+    return " ".join(w if w.isupper() else w.capitalize() for w in keywords)
+
+
+def parse_titles(text):
+    """{id: title} from the model's answer (tolerates ```json fences and chatter around it)."""
+    match = re.search(r"\{.*\}", text, re.S)
+    if not match:
+        return {}
+    try:
+        titles = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(titles, dict):
+        return {}
+    return {str(k): str(v).strip().strip('"').strip() for k, v in titles.items() if str(v).strip()}
+
+
+class TitleWorker(threading.Thread):
+    """Daemon thread turning queued (thread_id, first exchange) pairs into titles."""
+
+    def __init__(self, llm, save, batch_size=8, linger=0.5, max_chars=400):
+        super().__init__(name="chat-titles", daemon=True)
+        self.llm = llm
+        self.save = save
+        self.batch_size = batch_size
+        # wait this long after the first request for others to join the batch
+        self.linger = linger
+        self.max_chars = max_chars
+        self.queue = queue.Queue()
+        self.version = 0
+        self.stop_event = threading.Event()
+
+    def submit(self, thread_id, user_input, ai_message, placeholder):
+        self.queue.put((thread_id, user_input, ai_message, placeholder))
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _prompt(self, batch):
+        chats = "\n\n".join(
+            f"[{i}]\nUser: {user_input[:self.max_chars]}\nAssistant: {ai_message[:self.max_chars]}"
+            for i, (_, user_input, ai_message, _) in enumerate(batch, 1)
+        )
+        return [HumanMessage(content=TITLE_PROMPT.format(chats=chats))]
+
+    def process(self, batch):
+        response = self.llm.invoke(self._prompt(batch))
+        titles = parse_titles(message_text(response))
+        written = 0
+        for i, (thread_id, _, _, placeholder) in enumerate(batch, 1):
+            title = titles.get(str(i))
+            if title and self.save(thread_id, placeholder, title[:80]):
+                written += 1
+        if written:
+            self.version += 1
+        return written
+
+    def run(self):
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.process(batch)
+            except Exception:
+                logger.exception("title generation failed for %d chats", len(batch))
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def start_title_worker(llm, save, batch_size=None):
+    if batch_size is None:
+        batch_size = int(os.getenv("TITLE_BATCH_SIZE", "8"))
+    worker = TitleWorker(llm, save, batch_size=batch_size)
+    worker.start()
+    return worker
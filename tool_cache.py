@@ -0,0 +1,294 @@
+"""Shared TTL cache for tool results (stock quotes, web search).
+
+Many threads asking about the same symbol or query within seconds used to hit Alpha
+Vantage / DuckDuckGo once per tool call. `ToolCache` is one process-wide cache:
+
+- keys are (tool name, normalized args): strings are stripped, whitespace-collapsed
+  and case-folded, so "aapl " and "AAPL" share an entry
+- per-tool TTLs (tools without a TTL are not wrapped, e.g. the calculator)
+- size-bounded LRU eviction
+- single-flight: concurrent identical calls (sync or async, any session) wait for the
+  one call in flight (up to `wait_timeout` seconds) instead of all going to the API
+- optional SQLite persistence (TOOL_CACHE_DB), so restarts keep warm entries; failed
+  writes there are logged and counted (`db_errors`), the call still returns its value
+- `stats()` with hit / miss / shared / eviction counters
+
+Errors are never cached, and a per-tool `cacheable` check keeps e.g. Alpha Vantage
+rate-limit notes out of the cache.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, Counter
+from concurrent.futures import Future
+
+from langchain_core.tools import StructuredTool
+
+logger = logging.getLogger(__name__)
+
+TOOL_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_cache (
+    key TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tool_cache_expires_at ON tool_cache (expires_at);
+"""
+
+# seconds, per tool name
+DEFAULT_TTLS = {
+    "get_stock_price": 60,
+    "duckduckgo_results_json": 15 * 60,
+}
+
+# seconds an identical call waits for the one in flight before giving up
+WAIT_TIMEOUT = 60
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(tool_name, args):
+    return tool_name + ":" + json.dumps(_normalize(args), sort_keys=True, default=str)
+
+
+class ToolCache:
+    def __init__(self, max_entries=1024, path=None, wait_timeout=WAIT_TIMEOUT):
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.conn = None
+        if path:
+            from db import connect
+
+            self.conn = connect(path)
+            self.conn.executescript(TOOL_CACHE_SCHEMA)
+            self._db_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+            path=os.getenv("TOOL_CACHE_DB") or None,
+        )
+
+    # ------------------------------------------------------------------ storage
+    def _get_memory(self, key, now):
+        """(found, value) from memory. Caller holds self._lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            del self._entries[key]
+        return False, None
+
+    def _get_db(self, key, now):
+        """(found, value, expires_at) from SQLite; called without self._lock."""
+        with self._db_lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        if row is None:
+            return False, None, None
+        return True, json.loads(row[0]), row[1]
+
+    def _put_memory(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _store(self, tool_name, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+        if self.conn is not None:
+            try:
+                encoded = json.dumps(value)
+            except (TypeError, ValueError):
+                return  # memory only
+            # the SQLite tier is best effort: a locked / full database must not fail a call that worked
+            with self._db_lock:
+                try:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, tool_name, encoded, expires_at),
+                    )
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    self.counters["db_errors"] += 1
+                    logger.exception("could not persist tool cache entry for %s", tool_name)
+
+    # ------------------------------------------------------------------ lookups
+    def _lookup(self, tool_name, key):
+        """("hit", value), ("wait", future of the call in flight) or ("call", None)."""
+        now = time.time()
+        with self._lock:
+            found, value = self._get_memory(key, now)
+            if found:
+                self.counters["hits"] += 1
+                self.counters[f"{tool_name}.hits"] += 1
+                return "hit", value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["shared"] += 1
+                return "wait", future
+            future = self._inflight[key] = Future()
+        # SQLite tier outside the lock, so lookups of other keys don't queue behind its IO;
+        # identical lookups meanwhile wait on the future registered above
+        found = False
+        if self.conn is not None:
+            try:
+                found, value, expires_at = self._get_db(key, now)
+            except BaseException as e:
+                with self._lock:
+                    self._inflight.pop(key)
+                future.set_exception(e)
+                raise
+        with self._lock:
+            if found:
+                self._put_memory(key, value, expires_at)
+                self._inflight.pop(key)
+                self.counters["hits"] += 1
+                self.counters[f"{tool_name}.hits"] += 1
+            else:
+                self.counters["misses"] += 1
+                self.counters[f"{tool_name}.misses"] += 1
+        if found:
+            future.set_result(value)
+            return "hit", value
+        return "call", None
+
+    def _finish(self, tool_name, key, ttl, cacheable, value=None, error=None):
+        try:
+            if error is None and (cacheable is None or cacheable(value)):
+                self._store(tool_name, key, value, ttl)
+        finally:
+            # whatever storing did, the waiters get the result and the key is free again
+            with self._lock:
+                future = self._inflight.pop(key)
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+    def get_or_call(self, tool_name, args, ttl, fn, cacheable=None):
+        key = cache_key(tool_name, args)
+        state, value = self._lookup(tool_name, key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            return value.result(timeout=self.wait_timeout)
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(tool_name, key, ttl, cacheable, error=e)
+            raise
+        self._finish(tool_name, key, ttl, cacheable, value)
+        return value
+
+    async def aget_or_call(self, tool_name, args, ttl, afn, cacheable=None):
+        key = cache_key(tool_name, args)
+        state, value = self._lookup(tool_name, key)
+        if state == "hit":
+            return value
+        if state == "wait":
+            # shield: a cancelled or timed out waiter must not cancel the future the others share
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(value)), self.wait_timeout)
+        try:
+            value = await afn()
+        except BaseException as e:
+            self._finish(tool_name, key, ttl, cacheable, error=e)
+            raise
+        self._finish(tool_name, key, ttl, cacheable, value)
+        return value
+
+    # ------------------------------------------------------------------ housekeeping
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+        if self.conn is not None:
+            with self._db_lock:
+                self.conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (now,))
+                self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.conn is not None:
+            with self._db_lock:
+                self.conn.execute("DELETE FROM tool_cache")
+                self.conn.commit()
+
+
+def cached_tool(tool, cache, ttl, cacheable=None):
+    """Same name / description / args schema as `tool`, results served through `cache`."""
+    with_artifact = tool.response_format == "content_and_artifact"
+
+    def call(**kwargs):
+        if with_artifact:
+            # invoke with a ToolCall to get the artifact back as well
+            message = tool.invoke({"type": "tool_call", "name": tool.name, "args": kwargs, "id": "cache"})
+            return [message.content, message.artifact]
+        return tool.invoke(kwargs)
+
+    async def acall(**kwargs):
+        if with_artifact:
+            message = await tool.ainvoke({"type": "tool_call", "name": tool.name, "args": kwargs, "id": "cache"})
+            return [message.content, message.artifact]
+        return await tool.ainvoke(kwargs)
+
+    def func(**kwargs):
+        value = cache.get_or_call(tool.name, kwargs, ttl, lambda: call(**kwargs), cacheable)
+        return tuple(value) if with_artifact else value
+
+    async def coroutine(**kwargs):
+        value = await cache.aget_or_call(tool.name, kwargs, ttl, lambda: acall(**kwargs), cacheable)
+        return tuple(value) if with_artifact else value
+
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        func=func,
+        coroutine=coroutine,
+        response_format=tool.response_format,
+    )
+
+
+def wrap_tools(tools, cache, ttls=None, cacheable=None):
+    """Wrap every tool that has a TTL; the others (e.g. calculator) are returned as-is."""
+    ttls = DEFAULT_TTLS if ttls is None else ttls
+    cacheable = cacheable or {}
+    return [
+        cached_tool(t, cache, ttls[t.name], cacheable.get(t.name)) if t.name in ttls else t
+        for t in tools
+    ]